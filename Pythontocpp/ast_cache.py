@@ -0,0 +1,196 @@
+import gc
+import hashlib
+import inspect
+import marshal
+import os
+import struct
+import tempfile
+from array import array
+import ast_nodes
+from ast_nodes import Node, Program
+from compile_cache import COMPILER_VERSION
+
+# On-disk cache of parsed programs, in the spirit of __pycache__/*.pyc.
+#
+# prog.cpp is cached as __ppcache__/prog.cpp.ppc next to it.  A cache file is
+#
+#   header  magic, format version, build fingerprint, source mtime_ns,
+#           source size, SHA-256 of the source
+#   payload marshal of (ops, consts): the AST flattened in post-order, so
+#           that neither writing nor loading recurses however deep it is
+#
+# Every node is stored as its constructor fields followed by its line and
+# column.  The build fingerprint covers COMPILER_VERSION and the shape of
+# ast_nodes (every Node class and its fields), so editing either invalidates old
+# files.  A source whose mtime and size match is trusted; otherwise its hash
+# decides.  Files are written to a temporary name and os.replace()d into
+# place, so concurrent runs only ever see complete files.
+
+CACHE_DIR = '__ppcache__'
+MAGIC = b'PPAC'
+FORMAT_VERSION = 2
+
+_HEADER = struct.Struct('<4sH16sQQ32s')
+
+# Post-order opcodes; primitives are taken from `consts` in order
+_CONST, _LIST, _TUPLE, _NODE = range(4)
+
+_POSITION = ('line', 'col')
+
+def _fields(cls):
+    """Constructor fields of a Node class; they are also its attribute names."""
+    if cls.__init__ is object.__init__:
+        return ()
+    return tuple(inspect.signature(cls.__init__).parameters)[1:]
+
+NODE_CLASSES = tuple(sorted(
+    (cls for cls in vars(ast_nodes).values() if isinstance(cls, type) and issubclass(cls, Node)),
+    key=lambda cls: cls.__name__,
+))
+NODE_FIELDS = tuple(_fields(cls) + _POSITION for cls in NODE_CLASSES)
+_CLASS_IDS = {cls: i for i, cls in enumerate(NODE_CLASSES)}
+
+def _fingerprint():
+    shape = ';'.join(f"{cls.__name__}({','.join(fields)})" for cls, fields in zip(NODE_CLASSES, NODE_FIELDS))
+    return hashlib.sha256(f"{FORMAT_VERSION}|{COMPILER_VERSION}|{shape}".encode()).digest()[:16]
+
+BUILD_FINGERPRINT = _fingerprint()
+
+# ---------------- Serialization ----------------
+def dumps(program):
+    """Flatten an AST into the cache payload."""
+    ops = array('I')
+    consts = []
+    class_ids = _CLASS_IDS
+    stack = [(False, program)]
+    while stack:
+        closing, value = stack.pop()
+        if closing:
+            ops.extend(value)
+        elif isinstance(value, Node):
+            cls = type(value)
+            stack.append((True, (_NODE, class_ids[cls])))
+            stack.extend((False, getattr(value, name)) for name in reversed(NODE_FIELDS[class_ids[cls]]))
+        elif isinstance(value, list):
+            stack.append((True, (_LIST, len(value))))
+            stack.extend((False, item) for item in reversed(value))
+        elif isinstance(value, tuple):
+            stack.append((True, (_TUPLE, len(value))))
+            stack.extend((False, item) for item in reversed(value))
+        else:
+            ops.append(_CONST)
+            consts.append(value)
+    return marshal.dumps((ops.tobytes(), consts))
+
+def loads(payload):
+    """Rebuild the AST from a cache payload."""
+    raw_ops, consts = marshal.loads(payload)
+    ops = array('I')
+    ops.frombytes(raw_ops)
+    classes = NODE_CLASSES
+    fields = NODE_FIELDS
+    sizes = [len(names) for names in NODE_FIELDS]
+    new = object.__new__
+    setters = [[getattr(cls, name).__set__ for name in names] for cls, names in zip(classes, fields)]
+    next_const = iter(consts).__next__
+    stack = []
+    push = stack.append
+    it = iter(ops)
+    # the AST has no cycles, so keep the cyclic GC from rescanning it while
+    # hundreds of thousands of nodes are created
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for op in it:
+            if op == _CONST:
+                push(next_const())
+                continue
+            arg = next(it)
+            if op == _NODE:
+                n = sizes[arg]
+                node = new(classes[arg])
+                for setter, value in zip(setters[arg], stack[-n:]):
+                    setter(node, value)
+                del stack[-n:]
+                push(node)
+            elif arg:
+                items = stack[-arg:]
+                del stack[-arg:]
+                push(items if op == _LIST else tuple(items))
+            else:
+                push([] if op == _LIST else ())
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return stack.pop()
+
+# ---------------- Cache files ----------------
+def cache_path(source_path):
+    directory, name = os.path.split(os.path.abspath(source_path))
+    return os.path.join(directory, CACHE_DIR, name + '.ppc')
+
+def _source_hash(path):
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').digest()
+        return hashlib.sha256(f.read()).digest()
+
+def load(source_path):
+    """The cached Program for `source_path`, or None if there is no valid entry."""
+    try:
+        st = os.stat(source_path)
+        with open(cache_path(source_path), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, version, fingerprint, mtime_ns, size, digest = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION or fingerprint != BUILD_FINGERPRINT:
+        return None
+    if (mtime_ns, size) != (st.st_mtime_ns, st.st_size):
+        try:
+            if st.st_size != size or _source_hash(source_path) != digest:
+                return None
+        except OSError:
+            return None
+    try:
+        program = loads(data[_HEADER.size:])
+    except (ValueError, EOFError, TypeError, IndexError, StopIteration):
+        return None
+    return program if isinstance(program, Program) else None
+
+def store(source_path, program, parsed_stat=None):
+    """Write the cache entry for `source_path`; failures are silently ignored.
+
+    `parsed_stat` is the os.stat() taken before parsing: if the source has
+    changed since, the program may not match it and nothing is written.
+    """
+    try:
+        st = os.stat(source_path)
+        if parsed_stat is not None and (st.st_mtime_ns, st.st_size) != (parsed_stat.st_mtime_ns, parsed_stat.st_size):
+            return
+        header = _HEADER.pack(MAGIC, FORMAT_VERSION, BUILD_FINGERPRINT,
+                              st.st_mtime_ns, st.st_size, _source_hash(source_path))
+        target = cache_path(source_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.tmp-', suffix='.ppc')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                f.write(dumps(program))
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        pass
+
+def load_or_parse(source_path, parse):
+    """Return the Program for `source_path`, from the cache when it is valid."""
+    program = load(source_path)
+    if program is None:
+        st = os.stat(source_path)
+        program = parse(source_path)
+        store(source_path, program, st)
+    return program
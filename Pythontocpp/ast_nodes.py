@@ -1,64 +1,105 @@
+_UNSET_IS_NONE = frozenset(('line', 'col', 'slot', 'frame_size', 'impl'))
+
 class Node:
-    pass
+    """Base of all AST nodes.
+
+    Nodes are slotted: each class lists its fields in __slots__.  Every node
+    also has the 1-based `line` and `col` of the token it was parsed from;
+    they read as None on nodes built without a position.  The same goes for
+    the annotations resolver.py adds (`slot`, `frame_size`) and typechecker.py
+    adds (`impl`) until they have run.
+    """
+    __slots__ = ('line', 'col')
+
+    def __getattr__(self, name):
+        # only reached when a slot is unset
+        if name in _UNSET_IS_NONE:
+            return None
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
 
 # ---------------- Program & Functions ----------------
 class Program(Node):
+    __slots__ = ('functions',)
+
     def __init__(self, functions):
         self.functions = functions
 
 class FunctionDecl(Node):
-    def __init__(self, name, body, params=None):
+    __slots__ = ('name', 'body', 'params', 'ret_type', 'frame_size')
+
+    def __init__(self, name, body, params=None, ret_type=None):
         self.name = name
         self.body = body
         self.params = params or []
+        self.ret_type = ret_type
 
 class Block(Node):
+    __slots__ = ('stmts',)
+
     def __init__(self, stmts):
         self.stmts = stmts
 
 # ---------------- Variables & Arrays ----------------
 class VarDecl(Node):
+    __slots__ = ('vtype', 'name', 'init', 'slot')
+
     def __init__(self, vtype, name, init=None):
         self.vtype = vtype
         self.name = name
         self.init = init
 
 class ArrayDecl(Node):
+    __slots__ = ('vtype', 'name', 'dims', 'slot')
+
     def __init__(self, vtype, name, dims):
         self.vtype = vtype
         self.name = name
         self.dims = dims
 
 class Assignment(Node):
+    __slots__ = ('name', 'expr', 'slot')
+
     def __init__(self, name, expr):
         self.name = name
         self.expr = expr
 
 class ArrayRef(Node):
+    __slots__ = ('name', 'indices', 'slot')
+
     def __init__(self, name, indices):
         self.name = name
         self.indices = indices
 
 # ---------------- Expressions ----------------
 class PrintStmt(Node):
+    __slots__ = ('expr',)
+
     def __init__(self, expr):
         self.expr = expr
 
 class ReturnStmt(Node):
+    __slots__ = ('expr',)
+
     def __init__(self, expr):
         self.expr = expr
 
 class ExprStmt(Node):
+    __slots__ = ('expr',)
+
     def __init__(self, expr):
         self.expr = expr
 
 class BinaryOp(Node):
+    __slots__ = ('op', 'left', 'right', 'impl')
+
     def __init__(self, op, left, right):
         self.op = op
         self.left = left
         self.right = right
 
 class UnaryOp(Node):
+    __slots__ = ('op', 'operand', 'postfix')
+
     def __init__(self, op, operand, postfix=False):
         """
         op: 'PLUSPLUS', 'MINUSMINUS', etc.
@@ -69,40 +110,64 @@ class UnaryOp(Node):
         self.operand = operand
         self.postfix = postfix
 
+class Cast(Node):
+    """Conversion of a number to ctype 'int' or 'float', inserted by typechecker.py"""
+    __slots__ = ('expr', 'ctype')
+
+    def __init__(self, expr, ctype):
+        self.expr = expr
+        self.ctype = ctype
+
 class Number(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 class String(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 class Char(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
 class VarRef(Node):
+    __slots__ = ('name', 'slot')
+
     def __init__(self, name):
         self.name = name
 
 class Bool(Node):
     """Represents boolean literals: true or false"""
+    __slots__ = ('value',)
+
     def __init__(self, value: bool):
         self.value = value
 
 # ---------------- Control Flow ----------------
 class IfStmt(Node):
+    __slots__ = ('cond', 'then_block', 'else_block')
+
     def __init__(self, cond, then_block, else_block=None):
         self.cond = cond
         self.then_block = then_block
         self.else_block = else_block
 
 class WhileStmt(Node):
+    __slots__ = ('cond', 'body')
+
     def __init__(self, cond, body):
         self.cond = cond
         self.body = body
 
 class ForStmt(Node):
+    __slots__ = ('init', 'cond', 'update', 'body')
+
     def __init__(self, init, cond, update, body):
         self.init = init
         self.cond = cond
@@ -111,14 +176,16 @@ class ForStmt(Node):
 
 class BreakStmt(Node):
     """Represents 'break;' inside loops or switch"""
-    pass
+    __slots__ = ()
 
 class ContinueStmt(Node):
     """Represents 'continue;' inside loops"""
-    pass
+    __slots__ = ()
 
 # ---------------- Functions ----------------
 class FunctionCall(Node):
+    __slots__ = ('name', 'args')
+
     def __init__(self, name, args):
         self.name = name
         self.args = args
@@ -126,11 +193,15 @@ class FunctionCall(Node):
 # ---------------- Graph Support ----------------
 class GraphInit(Node):
     """Represents: graph g(5);"""
+    __slots__ = ('num_vertices',)
+
     def __init__(self, num_vertices):
         self.num_vertices = num_vertices
 
 class MethodCall(Node):
     """Represents: g.addEdge(0, 1);"""
+    __slots__ = ('obj', 'method', 'args')
+
     def __init__(self, obj, method, args):
         self.obj = obj
         self.method = method
@@ -139,6 +210,8 @@ class MethodCall(Node):
 # ---------------- Switch Statement ----------------
 class SwitchStmt(Node):
     """Represents a switch statement"""
+    __slots__ = ('expr', 'cases', 'default')
+
     def __init__(self, expr, cases, default=None):
         """
         expr: expression being switched on
@@ -151,11 +224,41 @@ class SwitchStmt(Node):
 
 class CaseStmt(Node):
     """Represents a case inside switch"""
+    __slots__ = ('value', 'body')
+
     def __init__(self, value, body):
         self.value = value
         self.body = body
 
 class DefaultStmt(Node):
     """Represents default case inside switch"""
+    __slots__ = ('body',)
+
     def __init__(self, body):
         self.body = body
+
+# ---------------- Traversal ----------------
+def walk(node):
+    """Yield `node` and every node below it, parents before children."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Node):
+            yield node
+            stack.extend(getattr(node, name, None) for name in reversed(type(node).__slots__))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+def rewrite(node, replace):
+    """`node` with every node below it that `replace` maps to another node
+    replaced by that node, outermost first; changes the tree in place."""
+    new = replace(node)
+    if new is not node:
+        return new
+    for name in type(node).__slots__:
+        value = getattr(node, name, None)
+        if isinstance(value, Node):
+            setattr(node, name, rewrite(value, replace))
+        elif isinstance(value, list):
+            value[:] = [rewrite(item, replace) if isinstance(item, Node) else item for item in value]
+    return node
@@ -0,0 +1,87 @@
+# Throughput benchmark for the lexer, in tokens/sec against the reference
+# scanner (the differential checks are in tests/test_lexer.py).
+#   python benchmarks/bench_lexer.py [--lines N] [--repeat N]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexer import tokenize, tokenize_batches, tokenize_charwise
+
+DENSE = '''int fib(int n) {
+    // recursive helper
+    if (n <= 1) { return n; }
+    return fib(n - 1) + fib(n - 2);
+}
+/* block
+   comment */
+int main() {
+    int arr[100];
+    float ratio = 3.75;
+    string s = "hello \\"world\\"";
+    char c = 'x';
+    for (int i = 0; i < 100; i = i + 1) {
+        arr[i] = i * 2 + fib(5);
+        if (arr[i] >= 10 && arr[i] != 42 || c == 'y') { i++; }
+    }
+    print(s);
+    return 0;
+}
+'''
+
+COMMENTED = '''int compute_checksum(int block_count, int seed_value) {
+    // Fold every block into a running checksum.
+    int running_total = seed_value;
+    for (int block_index = 0; block_index < block_count; block_index = block_index + 1) {
+        if (running_total > 1000000) {
+            running_total = running_total - 999983;   /* keep it bounded */
+        }
+        running_total = running_total * 31 + block_index;
+    }
+    print("checksum computed for all blocks");
+    return running_total;
+}
+'''
+
+def count_tokens(code):
+    return sum(1 for _ in tokenize(code))
+
+def count_charwise(code):
+    return sum(1 for _ in tokenize_charwise(code))
+
+def count_batches(code):
+    return sum(len(batch[0]) for batch in tokenize_batches(code))
+
+def throughput(fn, code, repeat):
+    best = float('inf')
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn(code)
+        best = min(best, time.perf_counter() - start)
+    return count, best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--lines', type=int, default=200_000, help='approximate source size in lines')
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    for label, snippet in (('dense', DENSE), ('commented', COMMENTED)):
+        code = snippet * max(1, args.lines // snippet.count('\n'))
+        if list(tokenize(code)) != list(tokenize_charwise(code)):
+            sys.exit(f"[{label}] the lexers disagree; run tests/test_lexer.py")
+        print(f"[{label}] {len(code):,} chars")
+        results = {}
+        for name, fn in (('charwise', count_charwise), ('tokenize', count_tokens),
+                         ('batches', count_batches)):
+            count, secs = throughput(fn, code, args.repeat)
+            results[name] = secs
+            print(f"  {name:>9}: {count} tokens in {secs:.3f}s  ({count / secs:,.0f} tokens/sec)")
+        print(f"  speedup vs charwise: tokenize {results['charwise'] / results['tokenize']:.1f}x, "
+              f"batches {results['charwise'] / results['batches']:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# How lexing, parsing and execution scale with program size.
+#   python benchmarks/bench_scaling.py [--sizes 100,200,...] [--depths 16,32,...]
+#                                      [--max-exponent 1.25] [--json curves.json]
+#
+# Two curves of generated programs (see program_gen.py):
+#   functions  more and more functions of the same shape
+#   nesting    a fixed number of functions with loops nested deeper and
+#              deeper; every loop runs once and there are no calls, so
+#              execution work stays proportional to size
+# Each point records the time and peak traced memory of every phase.  The
+# growth exponent of each series is fitted over log(lines), and anything
+# above --max-exponent (or a phase that fails, e.g. with RecursionError) is
+# reported as a regression and makes the script exit with status 1.
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from token_stream import TokenStream
+from parser.parser_functions import ParserWithParams
+from interpreter.interpreter_functions import InterpreterWithFunctions
+from program_gen import generate_program, parse_mix
+
+PHASES = ('lex', 'parse', 'execute')
+MIN_SECONDS = 0.005   # shorter timings are too noisy to fit
+
+def run_phases(code):
+    """Yield (phase, seconds) for one pass through the front end and interpreter."""
+    start = time.perf_counter()
+    tokens = TokenStream.from_source(code)
+    yield 'lex', time.perf_counter() - start
+    start = time.perf_counter()
+    program = ParserWithParams(tokens).parse_program()
+    yield 'parse', time.perf_counter() - start
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        InterpreterWithFunctions(program).run()
+    yield 'execute', time.perf_counter() - start
+
+def measure(code, repeat):
+    """{phase: {'seconds': best time, 'peak_mb': peak traced memory}}; 'error' on failure."""
+    point = {}
+    try:
+        for _ in range(repeat):
+            for phase, secs in run_phases(code):
+                best = point.setdefault(phase, {}).get('seconds', secs)
+                point[phase]['seconds'] = min(best, secs)
+        # peak Python allocations, from a second (traced, much slower) pass
+        tracemalloc.start()
+        phases = run_phases(code)
+        for phase in PHASES:
+            tracemalloc.reset_peak()
+            next(phases)
+            point[phase]['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+    except Exception as e:
+        point['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        tracemalloc.stop()
+    return point
+
+def exponent(xs, ys):
+    """Least-squares slope of log(y) over log(x), or None with fewer than two usable points."""
+    pairs = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if y > 0]
+    if len(pairs) < 2:
+        return None
+    mx = sum(x for x, _ in pairs) / len(pairs)
+    my = sum(y for _, y in pairs) / len(pairs)
+    var = sum((x - mx) ** 2 for x, _ in pairs)
+    return sum((x - mx) * (y - my) for x, y in pairs) / var if var else None
+
+def run_curve(name, programs, repeat, max_exponent):
+    """Measure a curve; returns (points, regressions)."""
+    print(f"{name}:")
+    print(f"  {'lines':>9}" + ''.join(f"  {p + ' s':>10}  {p + ' MB':>10}" for p in PHASES))
+    points = []
+    regressions = []
+    for label, code in programs:
+        lines = code.count('\n')
+        point = measure(code, repeat)
+        point['lines'] = lines
+        points.append(point)
+        if 'error' in point:
+            print(f"  {lines:>9}  FAILED ({label}): {point['error']}")
+            regressions.append(f"{name} at {label}: {point['error']}")
+            continue
+        print(f"  {lines:>9}" + ''.join(f"  {point[p]['seconds']:>10.3f}  {point[p]['peak_mb']:>10.1f}" for p in PHASES))
+
+    good = [p for p in points if 'error' not in p]
+    for phase in PHASES:
+        for key, unit, floor in (('seconds', 'time', MIN_SECONDS), ('peak_mb', 'memory', 0)):
+            usable = [p for p in good if p[phase][key] >= floor]
+            k = exponent([p['lines'] for p in usable], [p[phase][key] for p in usable])
+            if k is None:
+                continue
+            flag = k > max_exponent
+            print(f"  {phase:>7} {unit:<6} ~ lines^{k:.2f}{'   SUPER-LINEAR' if flag else ''}")
+            if flag:
+                regressions.append(f"{name}: {phase} {unit} grows as lines^{k:.2f}")
+    return points, regressions
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', default='100,200,400,800,1600',
+                    help='numbers of functions for the "functions" curve')
+    ap.add_argument('--depths', default='16,32,64,128',
+                    help='nesting depths for the "nesting" curve')
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--max-exponent', type=float, default=1.25,
+                    help='growth exponent above which a series counts as super-linear')
+    ap.add_argument('--json', help='also write the curves to this file')
+    args = ap.parse_args()
+
+    sizes = [int(n) for n in args.sizes.split(',') if n]
+    depths = [int(n) for n in args.depths.split(',') if n]
+    curves = {
+        'functions': ((f"{n} functions", generate_program(functions=n)) for n in sizes),
+        'nesting': ((f"depth {d}", generate_program(functions=20, statements=3, depth=d, loop_bound=1,
+                                                    mix=parse_mix('call=0,if=0,for=0,while=0'), spine=True))
+                    for d in depths),
+    }
+    results = {}
+    regressions = []
+    for name, programs in curves.items():
+        results[name], found = run_curve(name, programs, args.repeat, args.max_exponent)
+        regressions += found
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print("\nregressions:")
+        for r in regressions:
+            print(f"  {r}")
+        sys.exit(1)
+    print("\nall phases scale linearly")
+
+if __name__ == '__main__':
+    main()
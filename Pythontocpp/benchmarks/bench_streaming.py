@@ -0,0 +1,77 @@
+# Peak memory / time of the whole-file front end vs the streaming one.
+#   python benchmarks/bench_streaming.py [--functions N]
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from token_stream import TokenStream
+from parser.parser_functions import ParserWithParams
+from streaming import parse_file
+
+FUNCTION = '''int helper_{i}(int n) {{
+    // accumulate a few values
+    int total = 0;
+    for (int k = 0; k < n; k++) {{
+        if (k > {i} && total != 42) {{ total = total + k * 2; }}
+    }}
+    print("helper {i} done");
+    return total;
+}}
+'''
+
+MAIN = '''int main() {
+    print(helper_0(10));
+    return 0;
+}
+'''
+
+def write_program(path, functions):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(functions):
+            f.write(FUNCTION.format(i=i))
+        f.write(MAIN)
+
+def whole_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        code = f.read()
+    return len(ParserWithParams(TokenStream.from_source(code)).parse_program().functions)
+
+def streaming_check(path):
+    # syntax check only: each FunctionDecl is dropped once parsed
+    return sum(1 for _ in parse_file(path))
+
+def streaming_keep(path):
+    return len(list(parse_file(path)))
+
+def measure(fn, path):
+    start = time.perf_counter()
+    count = fn(path)
+    secs = time.perf_counter() - start
+    # peak Python allocations, from a second (traced, much slower) run
+    tracemalloc.start()
+    fn(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, secs, peak
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--functions', type=int, default=20_000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'big.cpp')
+        write_program(path, args.functions)
+        print(f"{os.path.getsize(path) / 1e6:.1f} MB, {args.functions + 1} functions")
+        for name, fn in (('whole file', whole_file), ('stream, check only', streaming_check),
+                         ('stream, keep ASTs', streaming_keep)):
+            count, secs, peak = measure(fn, path)
+            print(f"  {name:>18}: {count} functions in {secs:.2f}s, peak {peak / 1e6:.1f} MB")
+
+if __name__ == '__main__':
+    main()
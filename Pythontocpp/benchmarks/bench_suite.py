@@ -0,0 +1,121 @@
+# Guest-program benchmark suite with per-phase timings and a stored baseline.
+#   python benchmarks/bench_suite.py [names...] [--engine NAME] [--repeat N] [--tolerance 0.10] [--update]
+#
+# Every benchmarks/programs/*.cpp is run through compiler.compile_and_run
+# (without the program cache), and the best lex, parse and execute times
+# over --repeat runs are compared with benchmarks/baseline.json.  A phase
+# more than --tolerance slower than its baseline, or a program whose result
+# changed, is a regression and makes the script exit with status 1.
+# --update records the current numbers as the new baseline (only for the
+# programs that were run).  Engines other than the default tree walker keep
+# their baselines under "<program>:<engine>".  Baselines are only meaningful on the machine and
+# Python version they were recorded with; re-record them when either changes.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from compiler import compile_and_run, ENGINES
+
+PROGRAMS_DIR = os.path.join(HERE, 'programs')
+BASELINE = os.path.join(HERE, 'baseline.json')
+PHASES = ('lex', 'parse', 'execute')
+MIN_SECONDS = 0.002   # phases faster than this in both runs are not compared
+
+def program_names():
+    return sorted(name[:-4] for name in os.listdir(PROGRAMS_DIR) if name.endswith('.cpp'))
+
+def run_program(name, repeat, engine='tree'):
+    """{'result': main()'s value, phase: best seconds, ...} for one program."""
+    with open(os.path.join(PROGRAMS_DIR, name + '.cpp'), 'r', encoding='utf-8') as f:
+        code = f.read()
+    record = {}
+    for _ in range(repeat):
+        timings = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            record['result'] = compile_and_run(code, use_cache=False, timings=timings, engine=engine)
+        for phase in PHASES:
+            record[phase] = min(record.get(phase, timings[phase]), timings[phase])
+    for phase in PHASES:
+        record[phase] = round(record[phase], 6)
+    return record
+
+def load_baseline(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'python': None, 'programs': {}}
+
+def compare(name, current, base, tolerance):
+    """Lines describing `current` against `base`, and the regressions among them."""
+    notes, regressions = [], []
+    if current['result'] != base['result']:
+        regressions.append(f"{name}: result {current['result']!r}, baseline {base['result']!r}")
+    for phase in PHASES:
+        now, before = current[phase], base[phase]
+        if max(now, before) < MIN_SECONDS:
+            continue
+        ratio = now / before if before else float('inf')
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {phase} {ratio:.2f}x slower ({before:.4f}s -> {now:.4f}s)")
+        elif ratio < 1 / (1 + tolerance):
+            notes.append(f"{name}: {phase} {1 / ratio:.2f}x faster ({before:.4f}s -> {now:.4f}s)")
+    return notes, regressions
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('names', nargs='*', help='programs to run (default: all)')
+    ap.add_argument('--engine', choices=sorted(ENGINES), default='tree')
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--tolerance', type=float, default=0.10,
+                    help='allowed slowdown per phase, as a fraction of the baseline')
+    ap.add_argument('--baseline', default=BASELINE)
+    ap.add_argument('--update', action='store_true', help='record the results as the new baseline')
+    args = ap.parse_args()
+
+    names = args.names or program_names()
+    baseline = load_baseline(args.baseline)
+    python = platform.python_version()
+    if baseline['python'] not in (None, python):
+        print(f"warning: baseline was recorded with Python {baseline['python']}, this is {python}")
+
+    print(f"{'program':>14}  {'result':>10}" + ''.join(f"  {p + ' s':>10}" for p in PHASES) + "  vs baseline")
+    results, notes, regressions = {}, [], []
+    suffix = '' if args.engine == 'tree' else ':' + args.engine
+    for name in names:
+        current = results[name + suffix] = run_program(name, args.repeat, args.engine)
+        base = baseline['programs'].get(name + suffix)
+        if base is None:
+            verdict = 'new'
+        else:
+            found_notes, found = compare(name, current, base, args.tolerance)
+            notes += found_notes
+            regressions += found
+            verdict = 'REGRESSION' if found else 'ok'
+        print(f"{name:>14}  {current['result']!s:>10}" + ''.join(f"  {current[p]:>10.4f}" for p in PHASES)
+              + f"  {verdict}")
+
+    for note in notes:
+        print(f"  {note}")
+    if args.update:
+        baseline['python'] = python
+        baseline['programs'].update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"baseline written to {args.baseline}")
+    elif regressions:
+        print("\nregressions:")
+        for r in regressions:
+            print(f"  {r}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
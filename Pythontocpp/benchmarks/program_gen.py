@@ -0,0 +1,222 @@
+# Random valid programs in the compiler's C++ subset, at any size.
+#   python benchmarks/program_gen.py -o big.cpp [--functions N] [--statements N] [--depth N]
+#                                    [--loop-bound N] [--array-size N] [--mix kind=weight,...]
+#
+# Programs are built from a small grammar and are written to run cleanly on
+# InterpreterWithFunctions as it is: every function names its variables
+# after itself and declares them once at the top, loops count with
+# pre-declared counters, values are kept bounded with %, and calls only
+# go to "leaf" functions, so execution time grows linearly with the number
+# of functions.  The same arguments and seed always give the same program.
+import argparse
+import random
+import sys
+
+STATEMENT_KINDS = ('assign', 'array', 'incdec', 'string', 'print', 'call', 'if', 'for', 'while')
+COMPOUND_KINDS = frozenset(('if', 'for', 'while'))
+DEFAULT_MIX = {'assign': 6, 'array': 3, 'incdec': 1, 'string': 1, 'print': 0,
+               'call': 2, 'if': 3, 'for': 2, 'while': 1}
+LEAF_EVERY = 4      # functions 0, 4, 8, ... make no calls and may be called
+LOCALS = 3          # int locals per function
+WORDS = ('alpha', 'beta', 'gamma', 'delta')
+
+def parse_mix(text):
+    """'assign=4,if=0' -> DEFAULT_MIX with those weights replaced."""
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, text.split(',')):
+        kind, _, weight = item.partition('=')
+        if kind not in mix:
+            raise ValueError(f"unknown statement kind {kind!r}; expected one of {', '.join(STATEMENT_KINDS)}")
+        mix[kind] = int(weight)
+    return mix
+
+class FunctionGen:
+    """Emits the source of one function, `f<index>`."""
+    def __init__(self, index, rnd, statements, depth, loop_bound, array_size, mix, spine=False):
+        self.index = index
+        self.rnd = rnd
+        self.statements = statements
+        self.depth = depth
+        self.loop_bound = loop_bound
+        self.array_size = array_size
+        self.leaf = index % LEAF_EVERY == 0
+        self.callees = [] if self.leaf else list(range(index - index % LEAF_EVERY, -1, -LEAF_EVERY))[:4]
+        kinds = [k for k in STATEMENT_KINDS if mix[k] and (k != 'call' or self.callees)] or ['assign']
+        self.kinds, self.weights = kinds, [mix[k] or 1 for k in kinds]
+        simple = [k for k in kinds if k not in COMPOUND_KINDS] or ['assign']
+        self.simple, self.simple_weights = simple, [mix[k] or 1 for k in simple]
+        self.spine = spine
+        p = f"f{index}_"
+        self.param = p + 'p'
+        self.ints = [p + f"v{i}" for i in range(LOCALS)]
+        self.array = p + 'arr'
+        self.text = p + 's'
+        self.counters = [p + f"i{d}" for d in range(depth)]
+        self.lines = []
+
+    # ---------------- Expressions ----------------
+    def atom(self):
+        rnd = self.rnd
+        roll = rnd.random()
+        if roll < 0.3:
+            return str(rnd.randrange(1, 100))
+        if roll < 0.45:
+            return f"{self.array}[{self.index_expr()}]"
+        return rnd.choice(self.ints + [self.param])
+
+    def expr(self, depth=2):
+        rnd = self.rnd
+        if depth == 0 or rnd.random() < 0.3:
+            return self.atom()
+        left, right = self.expr(depth - 1), self.expr(depth - 1)
+        # '*' only on atoms, so values stay well inside 32 bits
+        op = rnd.choice(('+', '-', '*', '%', '/') if depth == 1 else ('+', '-', '%', '/'))
+        if op in '%/':
+            # a divisor in 1..7, whichever way % rounds
+            return f"({left} {op} (({right} % 7 + 7) % 7 + 1))"
+        if rnd.random() < 0.1:
+            return f"-({left} {op} {right})"
+        return f"({left} {op} {right})"
+
+    def index_expr(self):
+        # in range whether % rounds like Python or like C
+        n = self.array_size
+        return f"({self.rnd.choice(self.ints + [self.param])} % {n} + {n}) % {n}"
+
+    def cond(self):
+        rnd = self.rnd
+        c = f"{self.expr(1)} {rnd.choice(('<', '>', '<=', '>=', '==', '!='))} {self.expr(1)}"
+        roll = rnd.random()
+        if roll < 0.15:
+            return f"{c} && {self.atom()} != {rnd.randrange(100)}"
+        if roll < 0.3:
+            return f"{c} || {self.text} == \"{rnd.choice(WORDS)}\""
+        if roll < 0.35:
+            return f"!({c})"
+        return c
+
+    # ---------------- Statements ----------------
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def statement(self, indent, level, spine=False):
+        """One statement; a `spine` statement is a loop that carries the spine on."""
+        rnd = self.rnd
+        if spine:
+            kind = rnd.choice(('for', 'while'))
+        elif level < self.depth:
+            kind = rnd.choices(self.kinds, self.weights)[0]
+        else:
+            kind = rnd.choices(self.simple, self.simple_weights)[0]
+        target = rnd.choice(self.ints)
+        if kind == 'assign':
+            self.emit(indent, f"{target} = {self.expr()} % 1000;")
+        elif kind == 'array':
+            self.emit(indent, f"{self.array}[{self.index_expr()}] = {self.expr()} % 1000;")
+        elif kind == 'incdec':
+            self.emit(indent, f"{target}{rnd.choice(('++', '--'))};")
+        elif kind == 'string':
+            self.emit(indent, f"{self.text} = \"{rnd.choice(WORDS)}\";")
+        elif kind == 'print':
+            self.emit(indent, f"print({target});")
+        elif kind == 'call':
+            self.emit(indent, f"{target} = (f{rnd.choice(self.callees)}({self.expr(1)}) + {target}) % 1000;")
+        elif kind == 'if':
+            self.emit(indent, f"if ({self.cond()}) {{")
+            self.block(indent + 1, level + 1, spine=spine)
+            if rnd.random() < 0.3:
+                self.emit(indent, f"}} else if ({self.cond()}) {{")
+                self.block(indent + 1, level + 1)
+            if rnd.random() < 0.5:
+                self.emit(indent, "} else {")
+                self.block(indent + 1, level + 1)
+            self.emit(indent, "}")
+        elif kind == 'for':
+            i = self.counters[level]
+            self.emit(indent, f"for ({i} = 0; {i} < {self.loop_bound}; {i} = {i} + 1) {{")
+            self.block(indent + 1, level + 1, spine=spine)
+            self.emit(indent, "}")
+        else:
+            i = self.counters[level]
+            self.emit(indent, f"{i} = 0;")
+            self.emit(indent, f"while ({i} < {self.loop_bound}) {{")
+            self.block(indent + 1, level + 1, spine=spine)
+            self.emit(indent + 1, f"{i}++;")
+            self.emit(indent, "}")
+
+    def block(self, indent, level, count=None, spine=False):
+        count = count or self.rnd.randint(1, 3)
+        if spine and level < self.depth:
+            self.statement(indent, level, spine=True)
+            count -= 1
+        for _ in range(count):
+            self.statement(indent, level)
+
+    def source(self):
+        self.emit(0, f"int f{self.index}(int {self.param}) {{")
+        for name in self.ints:
+            self.emit(1, f"int {name} = {self.param} + {self.rnd.randrange(10)};")
+        self.emit(1, f"int {self.array}[{self.array_size}];")
+        self.emit(1, f"string {self.text} = \"{WORDS[0]}\";")
+        for name in self.counters:
+            self.emit(1, f"int {name} = 0;")
+        self.block(1, 0, self.statements, spine=self.spine)
+        self.emit(1, f"return ({' + '.join(self.ints)}) % 1000;")
+        self.emit(0, "}")
+        return '\n'.join(self.lines) + '\n'
+
+def generate(functions=100, statements=10, depth=3, loop_bound=4, array_size=16, mix=None,
+             seed=0, spine=False):
+    """Yield the program's source one function at a time (main last).
+
+    With `spine` each function has one chain of loops nested exactly
+    `depth` deep (see bench_scaling.py).
+    """
+    mix = DEFAULT_MIX if mix is None else mix
+    for index in range(functions):
+        rnd = random.Random(f"{seed}/{index}")
+        yield FunctionGen(index, rnd, statements, depth, loop_bound, array_size, mix, spine).source()
+    calls = ''.join(f"    total = (total + f{i}({i % 100})) % 1000003;\n" for i in range(functions))
+    yield f"int main() {{\n    int total = 0;\n{calls}    return total;\n}}\n"
+
+def generate_program(**options):
+    return ''.join(generate(**options))
+
+def write_program(path, **options):
+    """Write a generated program to `path`; returns its size in lines."""
+    lines = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in generate(**options):
+            f.write(chunk)
+            lines += chunk.count('\n')
+    return lines
+
+def add_arguments(ap):
+    ap.add_argument('--functions', type=int, default=100)
+    ap.add_argument('--statements', type=int, default=10, help='top-level statements per function')
+    ap.add_argument('--depth', type=int, default=3, help='maximum nesting of if/for/while')
+    ap.add_argument('--loop-bound', type=int, default=4, help='iterations of every loop')
+    ap.add_argument('--array-size', type=int, default=16)
+    ap.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                    help='statement weights, e.g. "print=1,while=0" (kinds: %s)' % ', '.join(STATEMENT_KINDS))
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--spine', action='store_true', help='nest loops in every function the full --depth')
+
+def options(args):
+    return dict(functions=args.functions, statements=args.statements, depth=args.depth,
+                loop_bound=args.loop_bound, array_size=args.array_size, mix=args.mix, seed=args.seed, spine=args.spine)
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a random valid program.")
+    ap.add_argument('-o', '--output', help='output file (default: stdout)')
+    add_arguments(ap)
+    args = ap.parse_args()
+    if args.output:
+        lines = write_program(args.output, **options(args))
+        print(f"{args.output}: {lines} lines", file=sys.stderr)
+    else:
+        for chunk in generate(**options(args)):
+            sys.stdout.write(chunk)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+// Naive recursive Fibonacci: call overhead and returns.
+int fib(int n) {
+    if (n < 2) {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+
+int main() {
+    return fib(20);
+}
@@ -0,0 +1,32 @@
+// Nested-loop matrix multiply on 2-D arrays; returns a checksum of the product.
+int main() {
+    int a[24][24];
+    int b[24][24];
+    int c[24][24];
+    int i = 0;
+    int j = 0;
+    int k = 0;
+    int sum = 0;
+    int checksum = 0;
+    for (i = 0; i < 24; i++) {
+        for (j = 0; j < 24; j++) {
+            a[i][j] = (i * 7 + j * 3) % 11;
+            b[i][j] = (i * 5 + j * 2) % 13;
+        }
+    }
+    for (i = 0; i < 24; i++) {
+        for (j = 0; j < 24; j++) {
+            sum = 0;
+            for (k = 0; k < 24; k++) {
+                sum = sum + a[i][k] * b[k][j];
+            }
+            c[i][j] = sum;
+        }
+    }
+    for (i = 0; i < 24; i++) {
+        for (j = 0; j < 24; j++) {
+            checksum = (checksum * 31 + c[i][j]) % 1000003;
+        }
+    }
+    return checksum;
+}
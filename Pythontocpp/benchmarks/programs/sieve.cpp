@@ -0,0 +1,20 @@
+// Sieve of Eratosthenes on a flat int array; returns the number of primes.
+int main() {
+    int composite[20000];
+    int i = 0;
+    int j = 0;
+    int count = 0;
+    for (i = 2; i * i < 20000; i++) {
+        if (composite[i] == 0) {
+            for (j = i * i; j < 20000; j = j + i) {
+                composite[j] = 1;
+            }
+        }
+    }
+    for (i = 2; i < 20000; i++) {
+        if (composite[i] == 0) {
+            count++;
+        }
+    }
+    return count;
+}
@@ -0,0 +1,54 @@
+// Bubble sort and insertion sort of pseudo-random arrays; returns a checksum.
+int main() {
+    int a[150];
+    int b[150];
+    int i = 0;
+    int j = 0;
+    int tmp = 0;
+    int key = 0;
+    int moving = 0;
+    int seed = 12345;
+    int checksum = 0;
+    for (i = 0; i < 150; i++) {
+        seed = (seed * 1103 + 12345) % 65536;
+        a[i] = seed % 1000;
+        b[i] = a[i];
+    }
+
+    // bubble sort
+    for (i = 0; i < 150; i++) {
+        for (j = 0; j < 149 - i; j++) {
+            if (a[j] > a[j + 1]) {
+                tmp = a[j];
+                a[j] = a[j + 1];
+                a[j + 1] = tmp;
+            }
+        }
+    }
+
+    // insertion sort (the scan stops on a flag: && evaluates both sides here)
+    for (i = 1; i < 150; i++) {
+        key = b[i];
+        j = i - 1;
+        moving = 1;
+        while (moving) {
+            if (j < 0) {
+                moving = 0;
+            } else if (b[j] <= key) {
+                moving = 0;
+            } else {
+                b[j + 1] = b[j];
+                j--;
+            }
+        }
+        b[j + 1] = key;
+    }
+
+    for (i = 0; i < 150; i++) {
+        if (a[i] != b[i]) {
+            return -1;
+        }
+        checksum = (checksum * 31 + a[i]) % 1000003;
+    }
+    return checksum;
+}
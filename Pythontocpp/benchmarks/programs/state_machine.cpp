@@ -0,0 +1,41 @@
+// Switch-driven state machine over a pseudo-random input stream.
+int main() {
+    int state = 0;
+    int input = 0;
+    int seed = 7;
+    int accepted = 0;
+    int step = 0;
+    for (step = 0; step < 24000; step++) {
+        seed = (seed * 75 + 74) % 65537;
+        input = seed % 4;
+        switch (state) {
+            case 0:
+                if (input == 0) { state = 1; } else { state = 0; }
+                break;
+            case 1:
+                if (input == 1) { state = 2; } else { state = 0; }
+                break;
+            case 2:
+                if (input == 2) { state = 3; } else { state = 1; }
+                break;
+            case 3:
+                accepted++;
+                state = input % 2;
+                break;
+            default:
+                state = 0;
+        }
+        switch (input) {
+            case 0:
+            case 1:
+                accepted = accepted + 0;
+                break;
+            case 2:
+                accepted = accepted * 1;
+                break;
+            default:
+                break;
+        }
+    }
+    return accepted * 10 + state;
+}
@@ -0,0 +1,32 @@
+// String and char comparison loops; returns the number of matches.
+int main() {
+    string words[8];
+    string probe = "";
+    char c = 'a';
+    int i = 0;
+    int j = 0;
+    int round = 0;
+    int matches = 0;
+    words[0] = "alpha";
+    words[1] = "beta";
+    words[2] = "gamma";
+    words[3] = "delta";
+    words[4] = "alpha";
+    words[5] = "epsilon";
+    words[6] = "beta";
+    words[7] = "zeta";
+    for (round = 0; round < 300; round++) {
+        for (i = 0; i < 8; i++) {
+            probe = words[(i + round) % 8];
+            for (j = 0; j < 8; j++) {
+                if (words[j] == probe) {
+                    matches++;
+                }
+                if (words[j] != probe && c == 'a') {
+                    matches = matches + 0;
+                }
+            }
+        }
+    }
+    return matches;
+}
@@ -0,0 +1,89 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Bump whenever the front end would build a different Program for the same
+# source (grammar, AST or lexer changes), so stale entries can never match.
+COMPILER_VERSION = '4'
+
+class CompileCache:
+    """Content-addressed LRU cache of parsed Programs.
+
+    Entries are keyed by a SHA-256 of the compiler version and the source
+    text, and evicted least-recently-used first once either `max_entries`
+    programs or `max_source_bytes` of source text are held.  Programs are
+    shared between runs, which is safe because the interpreter never
+    mutates the AST.  Failed compiles are not cached.
+    """
+    def __init__(self, max_entries=256, max_source_bytes=16 << 20):
+        self.max_entries = max_entries
+        self.max_source_bytes = max_source_bytes
+        self._entries = OrderedDict()   # key -> (program, source size)
+        self._source_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(data, variant=''):
+        """Cache key of the UTF-8 encoded source `data` compiled as `variant`."""
+        digest = hashlib.sha256(COMPILER_VERSION.encode())
+        digest.update(b'\0')
+        digest.update(variant.encode())
+        digest.update(b'\0')
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get_or_compile(self, source_code, compile_fn, variant=''):
+        """Return the cached Program for `source_code`, compiling it on a miss.
+
+        `variant` names the compile options, such as the optimization level,
+        that `compile_fn` applies; each variant is cached separately.
+        """
+        data = source_code.encode('utf-8', 'surrogatepass')
+        key = self.key(data, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # compile outside the lock; a concurrent miss on the same key just
+        # compiles twice and the later store wins
+        program = compile_fn(source_code)
+        size = len(data)
+        if size > self.max_source_bytes:
+            return program
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._source_bytes -= old[1]
+            self._entries[key] = (program, size)
+            self._source_bytes += size
+            while len(self._entries) > self.max_entries or self._source_bytes > self.max_source_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._source_bytes -= evicted_size
+                self.evictions += 1
+        return program
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._source_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "source_bytes": self._source_bytes,
+                "max_source_bytes": self.max_source_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
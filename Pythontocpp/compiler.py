@@ -1,50 +1,198 @@
+import argparse
 import sys
+import time
 import traceback
-from lexer import tokenize
+from functools import partial
+import ast_cache
+from token_stream import TokenStream
+from streaming import parse_file
+from parallel import parse_parallel
+from ast_nodes import Program
+from compile_cache import CompileCache
+from resolver import CompileError, resolve
+from typechecker import typecheck
+from optimizer import optimize, OPTIMIZATION_LEVELS
 from parser.parser_functions import ParserWithParams
 from interpreter.interpreter_functions import InterpreterWithFunctions
+from interpreter.closures import ClosureInterpreter
+from vm.machine import VM
+from transpile.to_python import PythonBackend, emit_python
+from transpile.to_cpp import emit_cpp
+from transpile.native import NativeBackend
 from interpreter.interpreter import RuntimeErrorWithLine
+from memo import format_stats
 
-def compile_and_run(source_code):
+# Execution engines, by name: the tree-walking interpreter, the program
+# compiled to Python closures first (see interpreter/closures.py), the
+# bytecode VM (see vm/), the program translated to Python source (see
+# transpile/to_python.py), or to C++ built with g++ (see transpile/native.py)
+ENGINES = {
+    'tree': InterpreterWithFunctions,
+    'closure': ClosureInterpreter,
+    'vm': VM,
+    'python': PythonBackend,
+    'native': NativeBackend,
+}
+
+# Parsed programs of recently run sources (see compile_cache.py)
+program_cache = CompileCache()
+
+def compile_source(source_code, timings=None, opt_level=2, report=None):
+    """Lex, parse, resolve, type-check and optimize `source_code` into a Program.
+
+    If `timings` is a dict, the seconds spent in each phase are stored in it
+    under 'lex', 'parse', 'resolve', 'check' and 'optimize'.  `opt_level` and
+    `report` are passed on to optimizer.optimize.
+    """
     # ---------------- Tokenize ----------------
-    tokens = list(tokenize(source_code))
-    tokens.append(('EOF', '', len(source_code), source_code.count('\n') + 1))
+    start = time.perf_counter()
+    tokens = TokenStream.from_source(source_code)
+    lexed = time.perf_counter()
 
     # ---------------- Parse ----------------
     parser = ParserWithParams(tokens)
     program = parser.parse_program()
+    parsed = time.perf_counter()
 
-    # ---------------- Interpret ----------------
-    interp = InterpreterWithFunctions(program)
-    return interp.run()
+    # ---------------- Resolve names to frame slots ----------------
+    resolve(program)
+    resolved = time.perf_counter()
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python compiler.py <source.cpp>")
-        return
+    # ---------------- Type-check ----------------
+    typecheck(program)
+    checked = time.perf_counter()
 
-    path = sys.argv[1]
+    # ---------------- Optimize ----------------
+    optimize(program, opt_level, report)
+    if timings is not None:
+        timings['lex'] = lexed - start
+        timings['parse'] = parsed - lexed
+        timings['resolve'] = resolved - parsed
+        timings['check'] = checked - resolved
+        timings['optimize'] = time.perf_counter() - checked
+    return program
 
-    # ---------------- Read source file ----------------
-    try:
+def compile_and_run(source_code, use_cache=True, timings=None, engine='tree', opt_level=2, report=None,
+                    memo=None):
+    """Compile and interpret `source_code`, returning main()'s result.
+
+    `engine` names the execution engine in ENGINES.  If `timings` is a dict,
+    it receives the seconds spent per phase: 'lex', 'parse', 'resolve',
+    'check', 'optimize' (all 0.0 when the Program came from the cache) and 'execute',
+    which includes the closure engine's translation.  If `report` is a list,
+    the optimizer's changes are appended to it, and the cache is bypassed.
+    If `memo` is a dict, pure functions are memoised (see memo.py) and it
+    receives the hits, calls and entries of each one's table after the run.
+    """
+    # ---------------- Tokenize + Parse (or reuse a cached Program) ----------------
+    if timings is not None:
+        timings.update(lex=0.0, parse=0.0, resolve=0.0, check=0.0, optimize=0.0)
+    compile = partial(compile_source, timings=timings, opt_level=opt_level, report=report)
+    if use_cache and report is None:
+        program = program_cache.get_or_compile(source_code, compile, variant=f"O{opt_level}")
+    else:
+        program = compile(source_code)
+
+    # ---------------- Interpret ----------------
+    start = time.perf_counter()
+    result = run_program(program, engine, memo)
+    if timings is not None:
+        timings['execute'] = time.perf_counter() - start
+    return result
+
+def run_program(program, engine='tree', memo=None):
+    """Run a compiled Program on `engine` and return main()'s result; `memo`
+    as for compile_and_run."""
+    interp = ENGINES[engine](program, memo=memo is not None)
+    result = interp.run()
+    if memo is not None:
+        memo.update(interp.memo_stats())
+    return result
+
+def parse_source_file(path, jobs=1):
+    if jobs != 1:
+        # ---------------- Tokenize + Parse (functions spread over worker processes) ----------------
         with open(path, 'r', encoding='utf-8') as f:
-            code = f.read()
-    except FileNotFoundError:
-        print(f"File not found: {path}")
-        return
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        return
+            return parse_parallel(f.read(), jobs or None)
+    # ---------------- Tokenize + Parse (mmap, one function at a time) ----------------
+    return Program(list(parse_file(path)))
+
+def load_file(path, use_cache=True, jobs=1, opt_level=2, report=None):
+    """The resolved, type-checked and optimized Program of a file on disk, parsed by the
+    streaming front end.
+
+    With `use_cache` the parsed program is kept in __ppcache__ next to the
+    source and reused while the source is unchanged (see ast_cache.py).
+    With `jobs` other than 1 big sources are parsed by that many worker
+    processes, 0 meaning one per CPU (see parallel.py).  `opt_level` and
+    `report` are passed on to optimizer.optimize.
+    """
+    parse = partial(parse_source_file, jobs=jobs)
+    if use_cache:
+        program = ast_cache.load_or_parse(path, parse)
+    else:
+        program = parse(path)
+    # __ppcache__ holds the bare AST, so resolve, check and optimize on every load
+    typecheck(resolve(program))
+    return optimize(program, opt_level, report)
+
+def print_report(report):
+    if report is not None:
+        for change in report:
+            print(f"optimizer: {change}", file=sys.stderr)
+        print(f"optimizer: {len(report)} change(s)", file=sys.stderr)
+
+def print_memo_stats(stats):
+    for line in format_stats(stats):
+        print(f"memo: {line}", file=sys.stderr)
+
+def main():
+    ap = argparse.ArgumentParser(description="Compile and run a C++ subset program.")
+    ap.add_argument('source', help="source file, e.g. prog.cpp")
+    ap.add_argument('--no-cache', action='store_true',
+                    help="always re-parse and do not read or write __ppcache__")
+    ap.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                    help="parse big sources with N worker processes (0: one per CPU)")
+    ap.add_argument('--engine', '--backend', choices=sorted(ENGINES), default='tree',
+                    help="execution engine (default: tree)")
+    ap.add_argument('--emit-python', action='store_true',
+                    help="print the program translated to Python instead of running it")
+    ap.add_argument('--emit-cpp', action='store_true',
+                    help="print the program translated to C++ instead of running it")
+    ap.add_argument('-O', dest='opt_level', type=int, choices=OPTIMIZATION_LEVELS, default=2,
+                    help="optimization level: -O0 runs the program as parsed, -O2 adds loop optimizations (default: -O2)")
+    ap.add_argument('--opt-report', action='store_true',
+                    help="list the optimizer's changes on stderr")
+    ap.add_argument('--memo', action='store_true',
+                    help="memoise calls to pure functions and list their hit rates on stderr")
+    args = ap.parse_args()
+    path = args.source
+    report = [] if args.opt_report else None
 
     # ---------------- Compile and Run ----------------
+    # The file is mapped and lexed lazily, so read errors surface from here.
     try:
-        result = compile_and_run(code)
+        program = load_file(path, not args.no_cache, args.jobs, args.opt_level, report)
+        print_report(report)
+        if args.emit_python or args.emit_cpp:
+            print(emit_python(program).source if args.emit_python else emit_cpp(program), end='')
+            return
+        memo = {} if args.memo else None
+        result = run_program(program, args.engine, memo)
+        if memo is not None:
+            print_memo_stats(memo)
         if result is not None:
             print(f"Program returned: {result}")
         else:
             print("Program completed without return value.")
+    except FileNotFoundError:
+        print(f"File not found: {path}")
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error reading file: {e}")
     except RuntimeErrorWithLine as e:
         print(f"Runtime Error: {e}")
+    except CompileError as e:
+        print(f"Compile Error: {e}")
     except SyntaxError as e:
         print(f"Syntax Error: {e}")
     except Exception as e:
@@ -0,0 +1,173 @@
+import re
+from bisect import bisect_right
+from ast_nodes import walk
+from lexer import Tok, tokenize
+from token_stream import TokenStream
+from parser.parser_functions import ParserWithParams
+from resolver import CompileError, resolve_function
+from typechecker import check_function
+
+# Incremental front end for live diagnostics.
+#
+# A Document splits its text into chunks, one per top-level function: a chunk
+# starts at the first token of a function and runs up to the first token of
+# the next one.  At a chunk start the lexer is always between tokens at brace
+# depth 0, so that offset plus its line number is the complete lexer state and
+# lexing can resume there.  Each chunk keeps its tokens (offsets and lines
+# relative to the chunk) and its parsed FunctionDecls, so an edit only
+# re-lexes from the damaged chunk until the token stream lines up with an old
+# chunk start again, and only those re-lexed chunks are re-parsed.
+
+_LINE_IN_MESSAGE = re.compile(r'at line (-?\d+)')
+
+class Chunk:
+    def __init__(self, start, line, tokens):
+        self.start = start        # absolute offset where the chunk begins
+        self.line = line          # line number at that offset
+        self.tokens = tokens      # TokenStream, offsets relative to `start`
+        self.functions = []
+        self.error = None
+        self.lex_error = False
+
+    def move(self, delta, line_delta):
+        self.start += delta
+        self.line += line_delta
+        self.tokens.line_offset += line_delta
+        if line_delta:
+            # the parsed nodes carry absolute lines (their columns do not
+            # depend on where the chunk is)
+            for fn in self.functions:
+                for node in walk(fn):
+                    if node.line is not None:
+                        node.line += line_delta
+
+    def parse(self):
+        self.functions = []
+        self.error = None
+        parser = ParserWithParams(self.tokens)
+        try:
+            while parser.peek_kind() != Tok.EOF:
+                self.functions.append(check_function(resolve_function(parser.parse_function())))
+        except (SyntaxError, CompileError) as e:
+            self.error = str(e)
+
+class Document:
+    def __init__(self, text=''):
+        self.text = text
+        self.chunks = []
+        self.relexed = 0   # chunks re-lexed by the last update, for diagnostics/benchmarks
+        self._relex_from(0, 0, 0)
+
+    # ---------------- Editing ----------------
+    def apply(self, start, end, text):
+        """Replace text[start:end] with `text` and re-check what it damaged."""
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError(f"Edit range {start}..{end} outside document of length {len(self.text)}")
+        line_delta = text.count('\n') - self.text.count('\n', start, end)
+        self.text = self.text[:start] + text + self.text[end:]
+        delta = len(text) - (end - start)
+        # the chunk holding the character before the edit: the skip/token that
+        # ends right at `start` may grow into the inserted text
+        starts = [chunk.start for chunk in self.chunks]
+        index = max(bisect_right(starts, max(start - 1, 0)) - 1, 0)
+        self._relex_from(index, start + len(text), delta, line_delta)
+
+    def apply_edits(self, edits):
+        for edit in edits:
+            self.apply(edit['start'], edit['end'], edit['text'])
+
+    # ---------------- Diagnostics ----------------
+    def diagnostics(self):
+        result = []
+        for chunk in self.chunks:
+            if chunk.error:
+                m = _LINE_IN_MESSAGE.search(chunk.error)
+                result.append({'line': int(m.group(1)) if m else chunk.line, 'message': chunk.error})
+        return result
+
+    def functions(self):
+        return [fn for chunk in self.chunks for fn in chunk.functions]
+
+    # ---------------- Re-lexing ----------------
+    def _relex_from(self, index, edit_end, delta, line_delta=0):
+        """Re-lex from chunk `index` until an old chunk start is reached again.
+
+        `edit_end` is the end of the inserted text (new coordinates), `delta`
+        the change in length and `line_delta` the change in newlines; old
+        chunks starting at or after the edit are reused once the new token
+        stream reaches their start, moved by as many lines as the edit
+        added.  (Token lines skip the newlines inside string literals, while
+        the final EOF line counts them, so a reused last chunk could
+        otherwise end on a stale line.)
+        """
+        old = self.chunks
+        if old:
+            start, line = old[index].start, old[index].line
+        else:
+            start, line = 0, 1
+        old_starts = {chunk.start: i for i, chunk in enumerate(old) if i > index}
+
+        self.chunks = chunks = old[:index]
+        self.relexed = 0
+        current = None
+        depth = 0
+        closed = False
+        try:
+            for kind, value, offset, tok_line in tokenize(self.text, start, line):
+                if current is None or closed:
+                    if current is not None:
+                        self._finish(current, offset, tok_line)
+                        reuse = old_starts.get(offset - delta) if offset >= edit_end else None
+                        if reuse is not None and tok_line - old[reuse].line == line_delta:
+                            self._reuse(old[reuse:], delta, line_delta)
+                            return
+                        start, line = offset, tok_line
+                    current = Chunk(start, line, TokenStream())
+                    current.tokens.line_offset = line - 1
+                    chunks.append(current)
+                    self.relexed += 1
+                    closed = False
+                if kind == 'LBRACE':
+                    depth += 1
+                elif kind == 'RBRACE':
+                    depth = max(depth - 1, 0)
+                    closed = depth == 0
+                current.tokens.append(kind, value, offset - current.start, tok_line - current.line + 1)
+        except SyntaxError as e:
+            if current is None and chunks:
+                # the error is the token after the last kept chunk, which a
+                # lex from the top would still be in
+                current = chunks[-1]
+            elif current is None:
+                current = Chunk(start, line, TokenStream())
+                chunks.append(current)
+                self.relexed += 1
+            current.functions = []
+            current.error = str(e)
+            current.lex_error = True
+            return
+
+        if current is None:
+            current = Chunk(start, line, TokenStream())
+            chunks.append(current)
+            self.relexed += 1
+        self._finish(current, len(self.text), self.text.count('\n') + 1)
+
+    def _finish(self, chunk, eof_offset, eof_line):
+        """Close a chunk with an EOF token (placed where the next token is) and parse it."""
+        chunk.tokens.append('EOF', '', eof_offset - chunk.start, eof_line - chunk.line + 1)
+        chunk.parse()
+
+    def _reuse(self, tail, delta, line_delta):
+        """Shift the undamaged old chunks into place after the re-lexed ones."""
+        for chunk in tail:
+            chunk.move(delta, line_delta)
+            self.chunks.append(chunk)
+            if chunk.error and line_delta:
+                if chunk.lex_error:
+                    # lexer errors carry absolute lines; re-lex the tail from here
+                    relexed = self.relexed
+                    self._relex_from(len(self.chunks) - 1, chunk.start, 0)
+                    self.relexed += relexed
+                    return
+                chunk.parse()
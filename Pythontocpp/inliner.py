@@ -0,0 +1,213 @@
+import copy
+from ast_nodes import *
+from optimizer import Optimizer, Pass, has_effects, located, size
+from typechecker import DECLARED_TYPES
+
+# Inliner, run by optimizer.optimize at -O2 before the loop optimizer.
+#
+# A call to a small function (at most INLINE_MAX_NODES nodes) that cannot
+# reach itself through calls, and whose body returns only in its last
+# statement, is replaced by the body itself.  The code goes just before the
+# statement making the call: one variable per parameter, initialized to its
+# argument, then the body, its final `return e;` becoming a variable holding
+# e that takes the call's place.  The callee's locals get slots past the
+# caller's frame.
+#
+# Moving the call ahead of its statement must not move it ahead of anything
+# observable, so only calls preceded in evaluation order by expressions that
+# can neither fail nor have effects are inlined (arguments are evaluated in
+# order, as before), and calls in loop conditions and updates never are.
+# Each caller grows by at most INLINE_MAX_GROWTH nodes.  Callers that
+# changed are optimized again (without reporting), so constant arguments
+# propagate, and functions no longer called are removed.  The report gets a line per
+# inlined call and per function not inlined, with the reason.
+
+INLINE_MAX_NODES = 48
+INLINE_MAX_GROWTH = 600
+
+def _operands(expr):
+    """The operands of `expr`, in the order they are evaluated."""
+    if isinstance(expr, BinaryOp):
+        return (expr.left, expr.right)
+    if isinstance(expr, UnaryOp):
+        return (expr.operand,)
+    if isinstance(expr, Cast):
+        return (expr.expr,)
+    if isinstance(expr, ArrayRef):
+        return tuple(expr.indices)
+    if isinstance(expr, (FunctionCall, MethodCall)):
+        return tuple(expr.args)
+    return ()
+
+class Inliner(Pass):
+    def __init__(self, program, report=None):
+        super().__init__(report)
+        self.functions = {fn.name: fn for fn in program.functions}
+        self.growth = 0
+        self.reasons = {}       # name -> why calls to it are not inlined
+        self.inlinable = {name for name, fn in self.functions.items() if self.check(fn)}
+
+    # ---------------- Candidates ----------------
+    def calls(self, name):
+        """Names of the functions `name` can reach through calls."""
+        reached, pending = set(), [name]
+        while pending:
+            for node in walk(self.functions[pending.pop()].body):
+                if isinstance(node, FunctionCall) and node.name in self.functions and node.name not in reached:
+                    reached.add(node.name)
+                    pending.append(node.name)
+        return reached
+
+    def check(self, fn):
+        returns = [node for node in walk(fn.body) if isinstance(node, ReturnStmt)]
+        if fn.name == 'main':
+            return False
+        if fn.name in self.calls(fn.name):
+            self.reasons[fn.name] = "it is recursive"
+        elif size(fn.body) > INLINE_MAX_NODES:
+            self.reasons[fn.name] = f"it is bigger than {INLINE_MAX_NODES} nodes"
+        elif returns and returns != fn.body.stmts[-1:]:
+            self.reasons[fn.name] = "it returns before its last statement"
+        elif returns and fn.ret_type not in DECLARED_TYPES:
+            self.reasons[fn.name] = "its return type is unknown"
+        else:
+            return True
+        return False
+
+    def value_of(self, fn):
+        """Whether `fn` returns a value a call can be replaced with."""
+        stmts = fn.body.stmts
+        return bool(stmts) and isinstance(stmts[-1], ReturnStmt) and stmts[-1].expr is not None
+
+    # ---------------- Functions ----------------
+    def inline(self, program):
+        changed = []
+        for fn in program.functions:
+            self.fn = fn
+            self.growth = 0
+            before = fn.frame_size
+            fn.body.stmts = self.block(fn.body.stmts)
+            if fn.frame_size != before:
+                changed.append(fn)
+        # the inlined code is optimized as part of the caller, quietly
+        for fn in changed:
+            Optimizer().function(fn)
+        Optimizer(self.report).remove_uncalled(program)
+        return program
+
+    # ---------------- Statements ----------------
+    def block(self, stmts):
+        """`stmts` with the calls they make inlined; the code added is
+        itself searched for calls to inline."""
+        out, pending = [], list(reversed(stmts))
+        while pending:
+            stmt = pending.pop()
+            code = self.stmt(stmt)
+            if code is None:
+                out.append(stmt)
+            else:
+                pending.extend(reversed(code))
+        return out
+
+    def stmt(self, stmt):
+        """The statements replacing `stmt` once the first call in it that is
+        inlined is, or None."""
+        if isinstance(stmt, IfStmt):
+            for block in (stmt.then_block, stmt.else_block):
+                if block is not None:
+                    block.stmts = self.block(block.stmts)
+            return self.expand(stmt, 'cond')
+        if isinstance(stmt, (WhileStmt, ForStmt)):
+            stmt.body.stmts = self.block(stmt.body.stmts)
+            return None
+        if isinstance(stmt, SwitchStmt):
+            for case in stmt.cases:
+                case.body.stmts = self.block(case.body.stmts)
+            if stmt.default is not None:
+                stmt.default.body.stmts = self.block(stmt.default.body.stmts)
+            return self.expand(stmt, 'expr')
+        if isinstance(stmt, VarDecl):
+            return self.expand(stmt, 'init')
+        if isinstance(stmt, Assignment):
+            # an indexed target may be evaluated before or after the value
+            if isinstance(stmt.name, ArrayRef) and any(has_effects(node) for node in walk(stmt.name.indices)):
+                return None
+            return self.expand(stmt, 'expr')
+        if isinstance(stmt, (PrintStmt, ReturnStmt, ExprStmt)):
+            return self.expand(stmt, 'expr')
+        return None
+
+    # ---------------- Calls ----------------
+    def expand(self, stmt, field):
+        root = getattr(stmt, field)
+        call = self.first_call(root)
+        if call is None:
+            return None
+        callee = self.functions[call.name]
+        discarded = isinstance(stmt, ExprStmt) and root is call
+        if not discarded and not self.value_of(callee):
+            return None
+        nodes = size(callee.body)
+        if self.growth + nodes > INLINE_MAX_GROWTH:
+            return None
+        self.growth += nodes
+        self.note(call, f"inlined {call.name}()")
+        code, value = self.instance(callee, call)
+        if discarded:
+            if value is not None and any(has_effects(node) for node in walk(value)):
+                code.append(located(ExprStmt(value), call))
+            return code
+        result = located(VarDecl(callee.ret_type, callee.name, value), value)
+        result.slot = self.fn.frame_size
+        self.fn.frame_size += 1
+        ref = located(VarRef(result.name), call)
+        ref.slot = result.slot
+        setattr(stmt, field, rewrite(root, lambda node: ref if node is call else node))
+        return code + [result, stmt]
+
+    def first_call(self, root):
+        """The first call in `root` (in evaluation order) to inline, or None
+        if something evaluated before it can fail or have effects."""
+        found = []
+        def visit(expr):
+            if (isinstance(expr, FunctionCall) and expr.name in self.inlinable
+                    and len(expr.args) == len(self.functions[expr.name].params)):
+                found.append(expr)
+                return False
+            for operand in _operands(expr):
+                if not visit(operand):
+                    return False
+            return not has_effects(expr)
+        if root is not None:
+            visit(root)
+        return found[0] if found else None
+
+    def instance(self, callee, call):
+        """(statements running `callee` on `call`'s arguments, the expression
+        it returns or None)."""
+        base = self.fn.frame_size
+        self.fn.frame_size += callee.frame_size
+        body = copy.deepcopy(callee.body.stmts)
+        for node in walk(body):
+            if isinstance(node, (VarDecl, ArrayDecl, Assignment, VarRef, ArrayRef)) and node.slot is not None:
+                node.slot += base
+        code = []
+        for slot, ((vtype, name), arg) in enumerate(zip(callee.params, call.args)):
+            param = located(VarDecl(vtype, name, arg), call)
+            param.slot = base + slot
+            code.append(param)
+        value = None
+        if body and isinstance(body[-1], ReturnStmt):
+            value = body.pop().expr
+        return code + body, value
+
+def inline_functions(program, report=None):
+    """Inline small functions into their callers in a resolved, type-checked
+    `program`, in place, and return it."""
+    inliner = Inliner(program, report)
+    called = {node.name for fn in program.functions for node in walk(fn.body) if isinstance(node, FunctionCall)}
+    for name, reason in inliner.reasons.items():
+        if name in called:
+            inliner.fn = inliner.functions[name]
+            inliner.note(inliner.fn, f"did not inline {name}(): {reason}")
+    return inliner.inline(program)
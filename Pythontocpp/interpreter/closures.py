@@ -0,0 +1,404 @@
+from ast_nodes import *
+from resolver import resolve, is_resolved, nesting_guard
+from memo import MISSING, memo_tables, table_stats
+from limits import MAX_CALL_DEPTH, deep_recursion
+from operators import BINARY_OPS
+from .interpreter import RuntimeErrorWithLine, BREAK, CONTINUE, jump_table
+
+# Closure-compiling execution engine.
+#
+# Instead of walking the AST on every visit, each function is translated
+# once into nested Python closures.  A node's closure has its children's
+# closures, its operator function and its frame slot bound as free
+# variables, so running it does no isinstance tests, attribute loads or
+# operator-name compares.  Expression closures take the frame and return a
+# value.  Statement closures take the frame and return the tree walker's
+# completion signals (see interpreter.py): None, BREAK, CONTINUE, or a
+# 1-tuple holding the value of a `return` that is unwinding to the call.
+#
+# The results match InterpreterWithFunctions, quirks included: && and ||
+# evaluate both operands, and calls to missing functions or with the wrong
+# argument count fail when reached.  Runtime errors are reported at the
+# innermost statement with a position.
+
+DEFAULT_VALUES = {'INT': 0, 'LONG': 0, 'DOUBLE': 0.0, 'FLOAT': 0.0, 'LONG LONG': 0,
+                  'CHAR': '\0', 'STRING': "", 'BOOL': 0}
+
+def _out_of_bounds(i):
+    return RuntimeErrorWithLine(f"Array index {i} out of bounds")
+
+def _fail(error_type, message):
+    """A closure that raises error_type(message) when it runs."""
+    def run(env):
+        raise error_type(message)
+    return run
+
+def _new_array(dims, default=0):
+    if len(dims) == 1:
+        n = dims[0]
+        return lambda: [default] * n
+    inner, n = _new_array(dims[1:], default), dims[0]
+    return lambda: [inner() for _ in range(n)]
+
+class CompiledFunction:
+    """A function's compiled body plus the frame free-list its calls share."""
+    __slots__ = ('name', 'nparams', 'frame_size', 'body', 'free', 'blank', 'engine')
+
+    def __init__(self, fn, engine):
+        self.name = fn.name
+        self.nparams = len(fn.params)
+        self.frame_size = fn.frame_size
+        self.body = None
+        self.free = []
+        self.blank = (None,) * fn.frame_size   # what a returned frame is reset to
+        self.engine = engine
+
+    def __call__(self, arg_values):
+        engine = self.engine
+        if engine.depth >= MAX_CALL_DEPTH:
+            raise RuntimeErrorWithLine(f"Stack overflow: more than {MAX_CALL_DEPTH} nested calls")
+        free = self.free
+        frame = free.pop() if free else [None] * self.frame_size
+        frame[:self.nparams] = arg_values
+        engine.depth += 1
+        try:
+            returned = self.body(frame)
+        finally:
+            engine.depth -= 1
+            frame[:] = self.blank   # keeps no arrays alive while free
+            free.append(frame)
+        return None if returned is None else returned[0]
+
+class MemoizedFunction(CompiledFunction):
+    """A pure function whose calls go through its MemoTable (see memo.py)."""
+    __slots__ = ('table',)
+
+    def __init__(self, fn, engine, table):
+        super().__init__(fn, engine)
+        self.table = table
+
+    def __call__(self, arg_values):
+        key = tuple(arg_values)
+        value = self.table.lookup(key)
+        if value is MISSING:
+            value = self.table.store(key, CompiledFunction.__call__(self, arg_values))
+        return value
+
+class ClosureInterpreter:
+    """Runs a program by compiling it to closures first; a drop-in for InterpreterWithFunctions."""
+    def __init__(self, program, memo=False):
+        if not is_resolved(program):
+            resolve(program)
+        self.program = program
+        self.depth = 0
+        # pure function name -> MemoTable, with `memo`
+        self.memo_tables = memo_tables(program) if memo else {}
+        self.functions = {fn.name: MemoizedFunction(fn, self, self.memo_tables[fn.name])
+                          if fn.name in self.memo_tables else CompiledFunction(fn, self)
+                          for fn in program.functions}
+        if 'main' not in self.functions:
+            raise RuntimeError("No main() function found")
+        # bodies last, so calls can bind any function, including later ones
+        with nesting_guard():
+            for fn in program.functions:
+                self.functions[fn.name].body = self.block(fn.body)
+
+    def run(self):
+        with deep_recursion():
+            result = self.functions['main'](())
+        return 0 if result is None else result
+
+    def memo_stats(self):
+        return table_stats(self.memo_tables)
+
+    # ---------------- Statements ----------------
+    def block(self, block):
+        steps = tuple((stmt, self.stmt(stmt)) for stmt in block.stmts)
+        steps = tuple((stmt, step) for stmt, step in steps if step is not None)
+
+        def run(env):
+            try:
+                for stmt, step in steps:
+                    returned = step(env)
+                    if returned is not None:
+                        return returned
+            except RuntimeErrorWithLine as e:
+                # report the innermost statement that has a position
+                if e.line is not None or stmt.line is None:
+                    raise
+                raise RuntimeErrorWithLine(e.message, stmt) from None
+            except Exception as e:
+                raise RuntimeErrorWithLine(str(e), stmt) from e
+        return run
+
+    def stmt(self, stmt):
+        """The statement's closure, or None for a statement that does nothing."""
+        if stmt is None:
+            return None
+        compile_stmt = getattr(self, 'stmt_' + type(stmt).__name__, None)
+        return compile_stmt(stmt) if compile_stmt else None
+
+    def stmt_VarDecl(self, stmt):
+        slot = stmt.slot
+        if stmt.init is None:
+            value = DEFAULT_VALUES.get(stmt.vtype)
+            def run(env):
+                env[slot] = value
+        else:
+            init = self.expr(stmt.init)
+            def run(env):
+                env[slot] = init(env)
+        return run
+
+    def stmt_ArrayDecl(self, stmt):
+        slot, new_array = stmt.slot, _new_array(stmt.dims, DEFAULT_VALUES.get(stmt.vtype))
+        def run(env):
+            env[slot] = new_array()
+        return run
+
+    def stmt_Assignment(self, stmt):
+        value = self.expr(stmt.expr)
+        if isinstance(stmt.name, ArrayRef):
+            store = self.array_store(stmt.name)
+            def run(env):
+                store(env, value(env))
+        else:
+            slot = stmt.slot
+            def run(env):
+                env[slot] = value(env)
+        return run
+
+    def stmt_PrintStmt(self, stmt):
+        value = self.expr(stmt.expr)
+        def run(env):
+            print(value(env))
+        return run
+
+    def stmt_ReturnStmt(self, stmt):
+        value = self.expr(stmt.expr)
+        def run(env):
+            return (value(env),)
+        return run
+
+    def stmt_ExprStmt(self, stmt):
+        return self.discard(stmt.expr)
+
+    def stmt_UnaryOp(self, stmt):
+        return self.discard(stmt)
+
+    def discard(self, expr):
+        """A statement closure evaluating `expr` for its effects."""
+        value = self.expr(expr)
+        def run(env):
+            value(env)
+        return run
+
+    def stmt_IfStmt(self, stmt):
+        cond = self.expr(stmt.cond)
+        then = self.block(stmt.then_block)
+        if stmt.else_block is None:
+            def run(env):
+                if cond(env):
+                    return then(env)
+        else:
+            other = self.block(stmt.else_block)
+            def run(env):
+                if cond(env):
+                    return then(env)
+                return other(env)
+        return run
+
+    def stmt_WhileStmt(self, stmt):
+        cond, body = self.expr(stmt.cond), self.block(stmt.body)
+        def run(env):
+            while cond(env):
+                returned = body(env)
+                if returned is not None and returned is not CONTINUE:
+                    if returned is BREAK:
+                        break
+                    return returned
+        return run
+
+    def stmt_ForStmt(self, stmt):
+        init = self.stmt(stmt.init)
+        cond = self.expr(stmt.cond) if stmt.cond is not None else (lambda env: True)
+        if isinstance(stmt.update, (Assignment, UnaryOp, ExprStmt)):
+            update = self.stmt(stmt.update)
+        elif stmt.update is not None:
+            update = self.expr(stmt.update)
+        else:
+            update = None
+        update = update or (lambda env: None)
+        body = self.block(stmt.body)
+        def run(env):
+            if init is not None:
+                init(env)
+            while cond(env):
+                returned = body(env)
+                if returned is not None and returned is not CONTINUE:
+                    if returned is BREAK:
+                        break
+                    return returned
+                update(env)
+        return run
+
+    def stmt_SwitchStmt(self, stmt):
+        value = self.expr(stmt.expr)
+        stmts, entries, default = jump_table(stmt)
+        steps = tuple((inner, self.stmt(inner) or (lambda env: None)) for inner in stmts)
+        end = len(steps)
+        def run(env):
+            start = entries.get(value(env), default)
+            try:
+                # from the matching case on, falling through into the next
+                for i in range(start, end):
+                    inner, step = steps[i]
+                    returned = step(env)
+                    if returned is not None:
+                        # a continue is for the loop around the switch
+                        return None if returned is BREAK else returned
+            except RuntimeErrorWithLine as e:
+                if e.line is not None or inner.line is None:
+                    raise
+                raise RuntimeErrorWithLine(e.message, inner) from None
+            except Exception as e:
+                raise RuntimeErrorWithLine(str(e), inner) from e
+        return run
+
+    def stmt_BreakStmt(self, stmt):
+        return lambda env: BREAK
+
+    def stmt_ContinueStmt(self, stmt):
+        return lambda env: CONTINUE
+
+    # ---------------- Arrays ----------------
+    def array_store(self, ref):
+        """A closure (env, value) storing into the element `ref` names."""
+        slot = ref.slot
+        indices = tuple(self.expr(index) for index in ref.indices)
+        if len(indices) == 1:
+            index, = indices
+            def store(env, value):
+                array = env[slot]
+                i = index(env)
+                if i < 0 or i >= len(array):
+                    raise _out_of_bounds(i)
+                array[i] = value
+            return store
+        outer, last = indices[:-1], indices[-1]
+        def store(env, value):
+            array = env[slot]
+            for index in outer:
+                i = index(env)
+                if i < 0 or i >= len(array):
+                    raise _out_of_bounds(i)
+                array = array[i]
+            i = last(env)
+            if i < 0 or i >= len(array):
+                raise _out_of_bounds(i)
+            array[i] = value
+        return store
+
+    # ---------------- Expressions ----------------
+    def expr(self, expr):
+        if expr is None:
+            return lambda env: 0
+        compile_expr = getattr(self, 'expr_' + type(expr).__name__, None)
+        if compile_expr is None:
+            return _fail(RuntimeErrorWithLine, f"Unknown expression {expr} of type {type(expr)}")
+        return compile_expr(expr)
+
+    def expr_Number(self, expr):
+        value = expr.value
+        return lambda env: value
+
+    expr_String = expr_Char = expr_Number
+
+    def expr_VarRef(self, expr):
+        slot = expr.slot
+        if slot is None:   # TRUE / FALSE
+            value = 1 if expr.name == 'TRUE' else 0
+            return lambda env: value
+        return lambda env: env[slot]
+
+    def expr_ArrayRef(self, expr):
+        slot = expr.slot
+        indices = tuple(self.expr(index) for index in expr.indices)
+        if len(indices) == 1:
+            index, = indices
+            def run(env):
+                array = env[slot]
+                i = index(env)
+                if i < 0 or i >= len(array):
+                    raise _out_of_bounds(i)
+                return array[i]
+            return run
+        def run(env):
+            value = env[slot]
+            for index in indices:
+                i = index(env)
+                if i < 0 or i >= len(value):
+                    raise _out_of_bounds(i)
+                value = value[i]
+            return value
+        return run
+
+    def expr_BinaryOp(self, expr):
+        # typechecker.py picks the operator function for the operand types
+        op = expr.impl or BINARY_OPS.get(expr.op)
+        if op is None:
+            return _fail(RuntimeErrorWithLine, f"Unknown binary operator {expr.op}")
+        left, right = self.expr(expr.left), self.expr(expr.right)
+        if isinstance(expr.right, Number):
+            constant = expr.right.value
+            return lambda env: op(left(env), constant)
+        return lambda env: op(left(env), right(env))
+
+    def expr_UnaryOp(self, expr):
+        if expr.op in ('PLUSPLUS', 'MINUSMINUS'):
+            step = 1 if expr.op == 'PLUSPLUS' else -1
+            postfix = bool(expr.postfix)
+            operand = expr.operand
+            if isinstance(operand, VarRef):
+                slot = operand.slot
+                def run(env):
+                    old = env[slot]
+                    env[slot] = new = old + step
+                    return old if postfix else new
+                return run
+            if isinstance(operand, ArrayRef):
+                load, store = self.expr(operand), self.array_store(operand)
+                def run(env):
+                    old = load(env)
+                    new = old + step
+                    store(env, new)
+                    return old if postfix else new
+                return run
+            return _fail(RuntimeErrorWithLine, f"Invalid unary operation {expr.op}")
+        operand = self.expr(expr.operand)
+        if expr.op == 'PLUS':
+            return lambda env: +operand(env)
+        if expr.op == 'MINUS':
+            return lambda env: -operand(env)
+        if expr.op == 'NOT':
+            return lambda env: int(not operand(env))
+        return _fail(RuntimeErrorWithLine, f"Unknown unary operator {expr.op}")
+
+    def expr_Cast(self, expr):
+        value, convert = self.expr(expr.expr), int if expr.ctype == 'int' else float
+        return lambda env: convert(value(env))
+
+    def expr_FunctionCall(self, expr):
+        function = self.functions.get(expr.name)
+        if function is None:
+            return _fail(RuntimeError, f"Function '{expr.name}' not defined")
+        if function.nparams != len(expr.args):
+            return _fail(RuntimeError,
+                         f"Function '{expr.name}' expects {function.nparams} args, got {len(expr.args)}")
+        args = tuple(self.expr(arg) for arg in expr.args)
+        if not args:
+            return lambda env: function(())
+        if len(args) == 1:
+            arg, = args
+            return lambda env: function((arg(env),))
+        return lambda env: function([arg(env) for arg in args])
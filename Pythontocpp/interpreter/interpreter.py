@@ -1,17 +1,59 @@
 from ast_nodes import *
-import copy
+from resolver import CompileError, resolve, is_resolved, case_value
+from limits import MAX_CALL_DEPTH, deep_recursion
+from operators import BINARY_OPS
 
 # ---------------- Exceptions ----------------
 class RuntimeErrorWithLine(Exception):
-    pass
-
-class ReturnException(Exception):
-    def __init__(self, value):
-        self.value = value
+    def __init__(self, message, node=None):
+        self.message = message
+        self.line = getattr(node, 'line', None)
+        self.col = getattr(node, 'col', None)
+        if self.line is not None:
+            message = f"{message} at line {self.line}, col {self.col}"
+        super().__init__(message)
+
+# ---------------- Completion signals ----------------
+# A statement that completes normally returns None from exec_stmt.  One
+# that does not returns BREAK or CONTINUE, which the innermost loop (or
+# switch, for BREAK) acts on, or a 1-tuple holding the value of a `return`,
+# which call_function unpacks.  exec_block passes the signal of the first
+# statement that sends one on to its own caller; no exception is raised.
+BREAK = object()
+CONTINUE = object()
+
+# ---------------- Switch ----------------
+def jump_table(switch):
+    """(statements, entries, default) for a SwitchStmt: the statements of
+    all its cases in order, the default's last, the index in them where
+    each case value's statements start, and where the default's do (or
+    the end).  Running the statements from an entry falls through from
+    one case into the next, as in C."""
+    stmts, entries = [], {}
+    for case in switch.cases:
+        value = case_value(case.value)
+        if value in entries:
+            raise CompileError(f"duplicate case value {value!r}", case)
+        entries[value] = len(stmts)
+        stmts.extend(case.body.stmts)
+    default = len(stmts)
+    if switch.default is not None:
+        stmts.extend(switch.default.body.stmts)
+    return stmts, entries, default
 
 # ---------------- Interpreter ----------------
 class Interpreter:
+    """Tree-walking interpreter.
+
+    Programs are resolved first (see resolver.py), so an `env` here is a call
+    frame: a list indexed by the `slot` of each variable node, holding only
+    that call's parameters and locals.  Frames are recycled through a
+    free-list per frame size: a returning call resets its frame to None, so
+    that a free frame keeps no arrays alive, and hands it back.
+    """
     def __init__(self, program):
+        if not is_resolved(program):
+            resolve(program)
         self.program = program
         # Collect functions
         self.functions = {fn.name: fn for fn in getattr(program, 'functions', [])}
@@ -20,113 +62,171 @@ class Interpreter:
         self.functions.setdefault('dfs', None)
         if 'main' not in self.functions:
             raise RuntimeError("No main() function found")
+        self.free_frames = {}    # frame size -> (all-None tuple of that size, frames of returned calls)
+        self.depth = 0
+        # SwitchStmt -> jump_table(), so a switch dispatches with one lookup
+        self.switches = {node: jump_table(node) for fn in program.functions
+                         for node in walk(fn.body) if isinstance(node, SwitchStmt)}
 
     # ---------------- Run Program ----------------
     def run(self):
-        return self.exec_function(self.functions['main'])
-
-    def exec_function(self, fn, env=None):
-        local_env = copy.deepcopy(env) if env else {}
+        # every guest call nests a few Python frames; allow MAX_CALL_DEPTH of them
+        with deep_recursion():
+            return self.exec_function(self.functions['main'])
+
+    def exec_function(self, fn):
+        result = self.call_function(fn, ())
+        return 0 if result is None else result
+
+    # ---------------- Call Frames ----------------
+    def call_function(self, fn, arg_values):
+        """Run `fn` in a frame of its own; returns its return value, or None."""
+        if self.depth >= MAX_CALL_DEPTH:
+            raise RuntimeErrorWithLine(f"Stack overflow: more than {MAX_CALL_DEPTH} nested calls")
+        pool = self.free_frames.get(fn.frame_size)
+        if pool is None:
+            pool = self.free_frames[fn.frame_size] = ((None,) * fn.frame_size, [])
+        blank, free = pool
+        frame = free.pop() if free else list(blank)
+        # parameters take the first slots
+        frame[:len(arg_values)] = arg_values
+        self.depth += 1
         try:
-            self.exec_block(fn.body, local_env)
-        except ReturnException as re:
-            return re.value
-        return 0
+            returned = self.exec_block(fn.body, frame)
+        finally:
+            self.depth -= 1
+            frame[:] = blank
+            free.append(frame)
+        return None if returned is None else returned[0]
 
     # ---------------- Block ----------------
     def exec_block(self, block, env):
-        for stmt in block.stmts:
-            self.exec_stmt(stmt, env)
+        """Run the statements of `block`; returns the first completion signal
+        one of them sends, or None."""
+        stmt = None
+        try:
+            for stmt in block.stmts:
+                signal = self.exec_stmt(stmt, env)
+                if signal is not None:
+                    return signal
+        except RuntimeErrorWithLine as e:
+            # report the innermost statement that has a position
+            if e.line is not None or getattr(stmt, 'line', None) is None:
+                raise
+            raise RuntimeErrorWithLine(e.message, stmt) from None
+        except Exception as e:
+            raise RuntimeErrorWithLine(str(e), stmt) from e
+        return None
 
     # ---------------- Statements ----------------
     def exec_stmt(self, stmt, env):
+        """Run `stmt`; returns its completion signal, or None.  Errors get
+        their position from the enclosing exec_block."""
         if stmt is None: return
-        try:
-            # Variable declaration
-            if isinstance(stmt, VarDecl):
-                if stmt.name in env:
-                    raise RuntimeErrorWithLine(f"Variable '{stmt.name}' redeclared")
-                val = self.eval_expr(stmt.init, env) if stmt.init else self.default_value(stmt.vtype)
-                env[stmt.name] = (stmt.vtype, val)
-                return
-
-            # Array declaration
-            if isinstance(stmt, ArrayDecl):
-                if stmt.name in env:
-                    raise RuntimeErrorWithLine(f"Array '{stmt.name}' redeclared")
-                val = self.init_array(stmt.dims)
-                env[stmt.name] = (stmt.vtype, val)
-                return
-
-            # Assignment
-            if isinstance(stmt, Assignment):
-                if isinstance(stmt.name, ArrayRef):
-                    self.assign_array(stmt.name, self.eval_expr(stmt.expr, env), env)
-                else:
-                    if stmt.name not in env:
-                        raise RuntimeErrorWithLine(f"Variable '{stmt.name}' not declared")
-                    vtype, _ = env[stmt.name]
-                    val = self.eval_expr(stmt.expr, env)
-                    env[stmt.name] = (vtype, val)
-                return
-
-            # Print
-            if isinstance(stmt, PrintStmt):
-                val = self.eval_expr(stmt.expr, env)
-                print(val)
-                return
-
-            # Unary operation
-            if isinstance(stmt, UnaryOp):
-                self.eval_expr(stmt, env)
-                return
-
-            # Return
-            if isinstance(stmt, ReturnStmt):
-                val = self.eval_expr(stmt.expr, env)
-                raise ReturnException(val)
-
-            # Expression statement
-            if isinstance(stmt, ExprStmt):
-                self.eval_expr(stmt.expr, env)
-                return
-
-            # If statement
-            if isinstance(stmt, IfStmt):
-                cond = self.eval_expr(stmt.cond, env)
-                if cond:
-                    self.exec_block(stmt.then_block, env)
-                elif stmt.else_block:
-                    self.exec_block(stmt.else_block, env)
-                return
-
-            # While loop
-            if isinstance(stmt, WhileStmt):
-                while self.eval_expr(stmt.cond, env):
-                    self.exec_block(stmt.body, env)
-                return
-
-            # For loop
-            if isinstance(stmt, ForStmt):
-                if stmt.init:
-                    self.exec_stmt(stmt.init, env)
-                while True:
-                    cond_val = True
-                    if stmt.cond:
-                        cond_val = self.eval_expr(stmt.cond, env)
-                    if not cond_val:
-                        break
-                    self.exec_block(stmt.body, env)
-                    if stmt.update:
-                        self.eval_stmt_or_expr(stmt.update, env)
-                return
 
+        # Variable declaration
+        if isinstance(stmt, VarDecl):
+            env[stmt.slot] = self.eval_expr(stmt.init, env) if stmt.init else self.default_value(stmt.vtype)
+            return
+
+        # Assignment
+        if isinstance(stmt, Assignment):
+            if isinstance(stmt.name, ArrayRef):
+                self.assign_array(stmt.name, self.eval_expr(stmt.expr, env), env)
+            else:
+                env[stmt.slot] = self.eval_expr(stmt.expr, env)
+            return
+
+        # If statement
+        if isinstance(stmt, IfStmt):
+            if self.eval_expr(stmt.cond, env):
+                return self.exec_block(stmt.then_block, env)
+            if stmt.else_block:
+                return self.exec_block(stmt.else_block, env)
+            return
+
+        # Return
+        if isinstance(stmt, ReturnStmt):
+            return (self.eval_expr(stmt.expr, env),)
+
+        # Unary operation
+        if isinstance(stmt, UnaryOp):
+            self.eval_expr(stmt, env)
+            return
+
+        # Expression statement
+        if isinstance(stmt, ExprStmt):
+            self.eval_expr(stmt.expr, env)
+            return
+
+        # While loop
+        if isinstance(stmt, WhileStmt):
+            while self.eval_expr(stmt.cond, env):
+                signal = self.exec_block(stmt.body, env)
+                if signal is not None and signal is not CONTINUE:
+                    if signal is BREAK:
+                        break
+                    return signal
+            return
+
+        # For loop
+        if isinstance(stmt, ForStmt):
+            if stmt.init:
+                self.exec_stmt(stmt.init, env)
+            while True:
+                cond_val = True
+                if stmt.cond:
+                    cond_val = self.eval_expr(stmt.cond, env)
+                if not cond_val:
+                    break
+                signal = self.exec_block(stmt.body, env)
+                if signal is not None and signal is not CONTINUE:
+                    if signal is BREAK:
+                        break
+                    return signal
+                if stmt.update:
+                    self.eval_stmt_or_expr(stmt.update, env)
+            return
+
+        # Print
+        if isinstance(stmt, PrintStmt):
+            val = self.eval_expr(stmt.expr, env)
+            print(val)
+            return
+
+        # Array declaration
+        if isinstance(stmt, ArrayDecl):
+            env[stmt.slot] = self.init_array(stmt.dims, self.default_value(stmt.vtype))
+            return
+
+        # Switch: jump to the matching case, fall through to the end or a break
+        if isinstance(stmt, SwitchStmt):
+            return self.exec_switch(stmt, env)
+
+        # Break and continue
+        if isinstance(stmt, BreakStmt):
+            return BREAK
+        if isinstance(stmt, ContinueStmt):
+            return CONTINUE
+
+    def exec_switch(self, switch, env):
+        stmts, entries, default = self.switches[switch]
+        start = entries.get(self.eval_expr(switch.expr, env), default)
+        stmt = None
+        try:
+            for i in range(start, len(stmts)):
+                stmt = stmts[i]
+                signal = self.exec_stmt(stmt, env)
+                if signal is not None:
+                    # a continue is for the loop around the switch
+                    return None if signal is BREAK else signal
         except RuntimeErrorWithLine as e:
-            raise RuntimeErrorWithLine(f"{e} at statement {stmt}")
-        except ReturnException:
-            raise
+            if e.line is not None or getattr(stmt, 'line', None) is None:
+                raise
+            raise RuntimeErrorWithLine(e.message, stmt) from None
         except Exception as e:
-            raise RuntimeErrorWithLine(f"{e} at statement {stmt}")
+            raise RuntimeErrorWithLine(str(e), stmt) from e
+        return None
 
     # ---------------- Helpers ----------------
     def eval_stmt_or_expr(self, stmt_or_expr, env):
@@ -136,19 +236,19 @@ class Interpreter:
             self.eval_expr(stmt_or_expr, env)
 
     def default_value(self, vtype):
-        if vtype in ('INT','LONG','DOUBLE','FLOAT','LONG LONG'): return 0
+        if vtype in ('INT','LONG','LONG LONG'): return 0
+        if vtype in ('DOUBLE','FLOAT'): return 0.0
         if vtype=='CHAR': return '\0'
         if vtype=='STRING': return ""
         if vtype=='BOOL': return 0
         return None
 
-    def init_array(self, dims):
-        if not dims: return 0
-        return [self.init_array(dims[1:]) for _ in range(dims[0])]
+    def init_array(self, dims, default=0):
+        if not dims: return default
+        return [self.init_array(dims[1:], default) for _ in range(dims[0])]
 
     def assign_array(self, array_ref, value, env):
-        _, arr = env[array_ref.name]
-        ref = arr
+        ref = env[array_ref.slot]
         for idx in array_ref.indices[:-1]:
             i = self.eval_expr(idx, env)
             if i < 0 or i >= len(ref):
@@ -160,8 +260,7 @@ class Interpreter:
         ref[i] = value
 
     def eval_array_ref(self, array_ref, env):
-        _, arr = env[array_ref.name]
-        ref = arr
+        ref = env[array_ref.slot]
         for idx in array_ref.indices:
             i = self.eval_expr(idx, env)
             if i < 0 or i >= len(ref):
@@ -177,11 +276,9 @@ class Interpreter:
         if isinstance(expr, Char): return expr.value
 
         if isinstance(expr, VarRef):
-            if expr.name in ('TRUE','FALSE'):
+            if expr.slot is None:   # TRUE / FALSE
                 return 1 if expr.name=='TRUE' else 0
-            if expr.name not in env:
-                raise RuntimeErrorWithLine(f"Variable '{expr.name}' not declared")
-            return env[expr.name][1]
+            return env[expr.slot]
 
         if isinstance(expr, ArrayRef):
             return self.eval_array_ref(expr, env)
@@ -189,8 +286,15 @@ class Interpreter:
         if isinstance(expr, BinaryOp):
             l = self.eval_expr(expr.left, env)
             r = self.eval_expr(expr.right, env)
+            # typechecker.py picks the operator function for the operand types
+            if expr.impl is not None:
+                return expr.impl(l, r)
             return self._apply_binary_op(expr.op, l, r)
 
+        if isinstance(expr, Cast):
+            value = self.eval_expr(expr.expr, env)
+            return int(value) if expr.ctype == 'int' else float(value)
+
         if isinstance(expr, UnaryOp):
             return self._apply_unary(expr, env)
 
@@ -208,35 +312,17 @@ class Interpreter:
             raise RuntimeError(f"Function '{node.name}' expects {len(func.params)} args, got {len(node.args)}")
 
         # Evaluate arguments
-        arg_values = [self.eval_expr(arg, env or {}) for arg in node.args]
-
-        # Local environment
-        local_env = copy.deepcopy(env) if env else {}
-        for (p_type, p_name), val in zip(func.params, arg_values):
-            local_env[p_name] = (p_type, val)
+        arg_values = [self.eval_expr(arg, env) for arg in node.args]
 
         # Execute function
-        try:
-            self.exec_block(func.body, local_env)
-        except ReturnException as ret:
-            return ret.value
-        return None
+        return self.call_function(func, arg_values)
 
     # ---------------- Operators ----------------
     def _apply_binary_op(self, op, l, r):
-        if op=='PLUS': return l+r
-        if op=='MINUS': return l-r
-        if op=='MULT': return l*r
-        if op=='DIV': return l//r if isinstance(l,int) and isinstance(r,int) else l/r
-        if op=='EQ': return int(l==r)
-        if op=='NE': return int(l!=r)
-        if op=='GT': return int(l>r)
-        if op=='LT': return int(l<r)
-        if op=='GE': return int(l>=r)
-        if op=='LE': return int(l<=r)
-        if op=='AND': return int(bool(l) and bool(r))
-        if op=='OR': return int(bool(l) or bool(r))
-        raise RuntimeErrorWithLine(f"Unknown binary operator {op}")
+        operation = BINARY_OPS.get(op)
+        if operation is None:
+            raise RuntimeErrorWithLine(f"Unknown binary operator {op}")
+        return operation(l, r)
 
     def _apply_unary(self, expr, env):
         if expr.op in ('PLUSPLUS','MINUSMINUS'):
@@ -248,15 +334,17 @@ class Interpreter:
                 raise RuntimeErrorWithLine(f"Invalid unary operation {expr.op}")
         if expr.op=='PLUS': return +self.eval_expr(expr.operand, env)
         if expr.op=='MINUS': return -self.eval_expr(expr.operand, env)
+        if expr.op=='NOT': return int(not self.eval_expr(expr.operand, env))
         raise RuntimeErrorWithLine(f"Unknown unary operator {expr.op}")
 
     def _apply_unary_var(self, expr, env):
-        vtype, old = env[expr.operand.name]
+        slot = expr.operand.slot
+        old = env[slot]
         if expr.op=='PLUSPLUS':
-            env[expr.operand.name] = (vtype, old+1)
+            env[slot] = old+1
             return old if getattr(expr,'postfix',False) else old+1
         if expr.op=='MINUSMINUS':
-            env[expr.operand.name] = (vtype, old-1)
+            env[slot] = old-1
             return old if getattr(expr,'postfix',False) else old-1
 
     def _apply_unary_array(self, expr, env):
@@ -1,4 +1,8 @@
 ##bool  switch  break continue  not  work  hare  just  mantion
+import codecs
+import re
+from itertools import accumulate, islice
+
 # Tokenizer 
 KEYWORDS = {
     'int', 'float', 'double', 'long', 'char', 'string', 'bool',
@@ -10,7 +14,8 @@ OPERATORS = {
     '==': 'EQ', '!=': 'NE', '>=': 'GE', '<=': 'LE', 
     '>': 'GT', '<': 'LT', '&&': 'AND', '||': 'OR',
     '++': 'PLUSPLUS', '--': 'MINUSMINUS', '=': 'ASSIGN',
-    '+': 'PLUS', '-': 'MINUS', '*': 'MULT', '/': 'DIV'
+    '+': 'PLUS', '-': 'MINUS', '*': 'MULT', '/': 'DIV',
+    '%': 'MOD', '!': 'NOT'
 }
 
 DELIMITERS = {
@@ -18,9 +23,25 @@ DELIMITERS = {
     '[': 'LBRACKET', ']': 'RBRACKET', ';': 'SEMI', ',': 'COMMA', ':': 'COLON'
 }
 
-def tokenize(code):
-    i = 0
-    line_num = 1
+# ---------------- Token kind codes ----------------
+# Every kind gets a small integer code so the parser can compare ints.
+TOKEN_KINDS = (
+    ('EOF', 'ID', 'NUMBER', 'STRING_LIT', 'CHAR_LIT')
+    + tuple(sorted(kw.upper() for kw in KEYWORDS))
+    + tuple(OPERATORS.values())
+    + tuple(DELIMITERS.values())
+)
+KIND_CODES = {kind: code for code, kind in enumerate(TOKEN_KINDS)}
+
+class Tok:
+    """Integer kind codes as attributes: Tok.ID, Tok.ASSIGN, Tok.EOF, ..."""
+
+for _code, _kind in enumerate(TOKEN_KINDS):
+    setattr(Tok, _kind, _code)
+del _code, _kind
+
+def tokenize_charwise(code, i=0, line_num=1):
+    """Reference scanner: walks the source one character at a time."""
     length = len(code)
     
     while i < length:
@@ -136,3 +157,312 @@ def tokenize(code):
 
         # --- Unexpected character ---
         raise SyntaxError(f"Unexpected {ch!r} at line {line_num}")
+
+
+# ---------------- Table-driven lexer ----------------
+# One compiled master pattern splits the source into (skip, token) pairs:
+# `skip` is the whitespace/comments before a token, `token` its text.  Every
+# position matches something (a lone character at worst), so the pairs tile
+# the input and offsets/lines fall out of running sums over their lengths.
+#
+# The regex engine's fixed cost per match is the floor.  On dense code
+# (short names, an operator every other token) this lexes about 1.5-2x as
+# fast as tokenize_charwise, on commented code with longer names about
+# 2-3x; benchmarks/bench_lexer.py measures both.  Going further would
+# need fewer matches than tokens, which no single-pattern lexer gets.
+
+def _punct_re(symbols):
+    """A pattern for the longest of `symbols` (one or two characters each)
+    at a position: one character class for the symbols that start no longer
+    one, then a branch per first character of the others, so the engine
+    does not try every symbol in turn."""
+    by_first = {}
+    for symbol in symbols:
+        assert 1 <= len(symbol) <= 2, symbol
+        by_first.setdefault(symbol[0], set()).add(symbol[1:])
+    singles = ''.join(re.escape(c) for c, rests in sorted(by_first.items()) if rests == {''})
+    branches = [f'[{singles}]']
+    for c, rests in sorted(by_first.items()):
+        if rests != {''}:
+            seconds = sorted(re.escape(rest) for rest in rests if rest)
+            second = seconds[0] if len(seconds) == 1 else f"[{''.join(seconds)}]"
+            branches.append(re.escape(c) + second + ('?' if '' in rests else ''))
+    return '|'.join(branches)
+
+_PUNCT_RE = _punct_re({**OPERATORS, **DELIMITERS})
+
+_SKIP_RE = r'([ \t\n]*(?:(?://[^\n]*|/\*[\s\S]*?(?:\*/|\Z))[ \t\n]*)*)'
+_NUMBER_RE = r'[0-9]+(?:\.[0-9]*)?'
+_STRING_RE = r'"[^"\\]*(?:\\[\s\S][^"\\]*)*(?:"|\\?\Z)'   # literals run to the end
+                                                      # of input when unterminated
+_MASTER = re.compile(
+    _SKIP_RE +
+    r'([A-Za-z_]\w*'
+    r'|' + _PUNCT_RE +
+    r'|' + _NUMBER_RE + r'[^\x00-\x7f]?'       # maybe running into a non-ASCII char
+    r'|' + _STRING_RE +
+    r"|'(?:\\[\s\S]|[^'\\])?(?:'|\\?\Z)"
+    r'|[\s\S]|\Z)'
+)
+
+# The same pattern over UTF-8 bytes (e.g. an mmap of the source file).  A
+# character is a lead byte plus its continuation bytes, and identifiers take
+# in non-ASCII bytes so that the whole token goes to the reference scanner.
+# Files are not read through text mode's newline translation here, so '\r'
+# counts as whitespace to keep CRLF sources working.
+_MASTER_BYTES = re.compile((
+    _SKIP_RE.replace(r'[ \t\n]', r'[ \t\r\n]') +
+    r'([A-Za-z_][\w\x80-\xff]*'
+    r'|' + _PUNCT_RE +
+    r'|' + _NUMBER_RE + r'(?:[\x80-\xff][\x80-\xbf]*)?'
+    r'|' + _STRING_RE +
+    r"|'(?:\\[\s\S][\x80-\xbf]*|[^'\\][\x80-\xbf]*)?(?:'|\\?\Z)"
+    r'|[\s\S][\x80-\xbf]*|\Z)'
+).encode())
+
+_STRING = re.compile(r'"[^"\\]*(?:\\[\s\S][^"\\]*)*"')
+_CHAR = re.compile(r"'(?:\\[\s\S]|[^'\\])?'")
+
+_WINDOW = 1 << 16
+
+class _KindTable(dict):
+    """token text -> kind; unknown texts are classified once and cached.
+
+    None marks a token the table lexer cannot handle on its own: a lexical
+    error, or a non-ASCII character whose str.isalpha()/isdigit() semantics
+    are left to the reference scanner.
+    """
+    def __missing__(self, text):
+        c = text[0]
+        if c == '_' or ('a' <= c <= 'z') or ('A' <= c <= 'Z'):
+            kind = 'ID'
+        elif '0' <= c <= '9':
+            kind = 'NUMBER' if text[-1].isascii() else None
+        elif c == '"' and _STRING.fullmatch(text):
+            kind = 'STRING_LIT'
+        elif c == "'" and _CHAR.fullmatch(text):
+            kind = 'CHAR_LIT'
+        else:
+            kind = None
+        self[text] = kind
+        return kind
+
+class _ValueTable(dict):
+    """token text -> token value (the text itself, or the number it spells)."""
+    def __missing__(self, text):
+        if '0' <= text[0] <= '9' and text[-1].isascii():
+            value = float(text) if '.' in text else int(text)
+        else:
+            value = text
+        self[text] = value
+        return value
+
+class _NewlineTable(dict):
+    """skip text -> number of newlines in it (skips repeat, so this is cached)."""
+    def __init__(self, newline='\n'):
+        super().__init__()
+        self.newline = newline
+
+    def __missing__(self, skip):
+        count = self[skip] = skip.count(self.newline)
+        return count
+
+class _BytesKindTable(dict):
+    """UTF-8 token bytes -> kind, classified through a str _KindTable.
+
+    Non-ASCII tokens other than string/char literals give None so that they
+    are handed to the reference scanner, exactly as in str mode.
+    """
+    def __init__(self, kinds_of):
+        super().__init__()
+        self.kinds_of = kinds_of
+
+    def __missing__(self, raw):
+        text = raw.decode('utf-8')
+        if text.isascii() or text[0] in '"\'':
+            kind = self.kinds_of[text]
+        else:
+            kind = None
+        self[raw] = kind
+        return kind
+
+class _BytesValueTable(dict):
+    """UTF-8 token bytes -> token value, through a str _ValueTable."""
+    def __init__(self, values_of):
+        super().__init__()
+        self.values_of = values_of
+
+    def __missing__(self, raw):
+        value = self[raw] = self.values_of[raw.decode('utf-8')]
+        return value
+
+_BASE_KINDS = {**OPERATORS, **DELIMITERS, **{kw: kw.upper() for kw in KEYWORDS}}
+_TABLE_LIMIT = 1 << 14
+
+def _lookup_tables(binary):
+    """Fresh (kinds_of, values_of, newlines_in) caches for str or bytes input."""
+    kinds_of = _KindTable(_BASE_KINDS)
+    values_of = _ValueTable()
+    if binary:
+        return _BytesKindTable(kinds_of), _BytesValueTable(values_of), _NewlineTable(b'\n')
+    return kinds_of, values_of, _NewlineTable()
+
+def tokenize_batches(code, pos=0, line_num=1):
+    """Lex `code` into parallel (kinds, values, offsets, lines) list batches.
+
+    Lexing may start mid-source at `pos`, provided that is a token boundary
+    and `line_num` is the line there.
+
+    `code` may also be UTF-8 bytes or any bytes-like buffer such as an mmap,
+    which is scanned in place one window at a time.  Values are still str;
+    offsets are byte offsets (counted in characters from the fallback point
+    if the reference scanner has to take over).
+
+    Tokens are matched a window at a time; kinds and values come from
+    per-call lookup tables and offsets/lines from running sums, so the
+    per-token work stays in C.  Lexical errors and non-ASCII identifier or
+    digit characters are handed to tokenize_charwise so that messages and
+    str.isalpha()/isdigit() semantics are identical to the reference.
+    """
+    binary = not isinstance(code, str)
+    master = _MASTER_BYTES if binary else _MASTER
+    kinds_of, values_of, newlines_in = _lookup_tables(binary)
+    length = len(code)
+    window = _WINDOW
+
+    while pos < length:
+        if len(values_of) > _TABLE_LIMIT:
+            # keep memory bounded on huge inputs with many distinct names
+            kinds_of, values_of, newlines_in = _lookup_tables(binary)
+        endpos = pos + window
+        final = endpos >= length
+        # [between, skip, token, between, skip, token, ..., between]; every
+        # position matches, so the betweens are all empty
+        parts = master.split(code[pos:length if final else endpos])
+        while len(parts) > 1 and not parts[-2]:
+            del parts[-3:]
+        if not final:
+            # the last token may be cut short by endpos; re-lex it next round
+            if len(parts) > 1:
+                del parts[-3:]
+            if len(parts) == 1:
+                window *= 2
+                continue
+        if len(parts) == 1:
+            return
+
+        skips = parts[1::3]
+        texts = parts[2::3]
+        kinds = list(map(kinds_of.__getitem__, texts))
+        offsets = list(islice(accumulate(map(len, parts), initial=pos), 2, None, 3))
+        lines = list(accumulate(map(newlines_in.__getitem__, skips), initial=line_num))
+        del lines[0]
+
+        if None not in kinds:
+            yield kinds, list(map(values_of.__getitem__, texts)), offsets, lines
+            line_num = lines[-1]
+            pos = offsets[-1] + len(texts[-1])
+            window = _WINDOW
+            continue
+
+        stop = kinds.index(None)
+        if stop:
+            yield (kinds[:stop], list(map(values_of.__getitem__, texts[:stop])),
+                   offsets[:stop], lines[:stop])
+        text = texts[stop]
+        line_num = lines[stop]
+        start = offsets[stop]
+        if binary:
+            text = text.decode('utf-8')
+        if not text.isascii():
+            if binary:
+                yield from _decoded_batches(code, start, line_num)
+            else:
+                yield from _charwise_batches(code, start, line_num)
+            return
+        if text[0] == '"':
+            raise SyntaxError(f"Unterminated string literal at line {line_num}")
+        if text[0] == "'":
+            raise SyntaxError(f"Unterminated char literal at line {line_num}")
+        raise SyntaxError(f"Unexpected {text!r} at line {line_num}")
+
+def _charwise_batches(code, i, line_num):
+    """Finish a batch lex with the reference scanner, keeping its error order."""
+    tokens = []
+    try:
+        for tok in tokenize_charwise(code, i, line_num):
+            tokens.append(tok)
+    except Exception:
+        if tokens:
+            yield tuple(map(list, zip(*tokens)))
+        raise
+    if tokens:
+        yield tuple(map(list, zip(*tokens)))
+
+def _decoded_batches(code, start, line_num):
+    """Finish a batch lex of UTF-8 `code` from byte `start` with the reference
+    scanner, decoding a window at a time rather than the whole rest at once.
+
+    The last token of each window may be cut short, so it is held back and
+    lexed again with the next window; so is a lexical error, unless it
+    recurs at the same token with more text read, or the input is all read.  Offsets count
+    characters from `start`, after '\r\n' became '\n'.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    length = len(code)
+    pos = start
+    text = ''       # decoded and not yet yielded
+    offset = start  # where text starts
+    carry = ''      # a '\r' that may begin a '\r\n' in the next window
+    failed = failed_end = None
+    window = _WINDOW
+
+    while True:
+        end = min(length, pos + window)
+        final = end == length
+        new = carry + decoder.decode(code[pos:end], final)
+        pos = end
+        carry = new[-1:] if new.endswith('\r') and not final else ''
+        text += new[:len(new) - len(carry)].replace('\r\n', '\n')
+
+        tokens = []
+        error = None
+        try:
+            for tok in tokenize_charwise(text, 0, line_num):
+                tokens.append(tok)
+        except Exception as e:
+            error = e
+        if error is not None and not final:
+            # a token cut short fails differently once it is whole; other than
+            # a number, which names itself in the error, or an unterminated
+            # string, which only shows as such at the end of input, no token
+            # looks more than 3 characters ahead
+            failure = (offset + tokens[-1][2] if tokens else offset - 1,
+                       type(error), str(error))
+            if failure != failed:
+                failed, failed_end = failure, offset + len(text)
+            elif offset + len(text) > failed_end + 3 and not failure[2].startswith("Unterminated string"):
+                final = True
+        if final:
+            if tokens:
+                kinds, values, offsets, lines = map(list, zip(*tokens))
+                yield kinds, values, [offset + i for i in offsets], lines
+            if error is not None:
+                raise error
+            return
+        if len(tokens) < 2:
+            window *= 2
+            continue
+
+        kept = tokens.pop()
+        kinds, values, offsets, lines = map(list, zip(*tokens))
+        yield kinds, values, [offset + i for i in offsets], lines
+        text = text[kept[2]:]
+        offset += kept[2]
+        line_num = kept[3]
+        window = _WINDOW
+
+def tokenize(code, pos=0, line_num=1):
+    """Yield (kind, value, offset, line) tuples, identical to tokenize_charwise."""
+    for kinds, values, offsets, lines in tokenize_batches(code, pos, line_num):
+        yield from zip(kinds, values, offsets, lines)
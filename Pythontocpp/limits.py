@@ -0,0 +1,39 @@
+import sys
+import threading
+from contextlib import contextmanager
+
+# Limits shared by the compile-time passes and the engines.
+#
+# The tree walker and the closure engine nest Python frames for every guest
+# call, and every pass over the AST nests them for every level of nesting
+# in the program, so all of them run under one raised recursion limit.
+
+MAX_CALL_DEPTH = 5000        # nested guest calls before "stack overflow"
+PY_FRAMES_PER_CALL = 40      # generous bound on Python frames one guest call nests
+RECURSION_LIMIT = MAX_CALL_DEPTH * PY_FRAMES_PER_CALL
+
+_lock = threading.Lock()
+_active = 0         # deep_recursion() blocks running, in any thread
+_saved_limit = None
+
+@contextmanager
+def deep_recursion():
+    """Run the block with Python's recursion limit raised to RECURSION_LIMIT
+    (or left where it is, if that is higher).
+
+    The limit is process-wide, so blocks running in other threads share the
+    raised limit: the first block in raises it, and only the last one out
+    puts it back."""
+    global _active, _saved_limit
+    with _lock:
+        if _active == 0:
+            _saved_limit = sys.getrecursionlimit()
+            sys.setrecursionlimit(max(_saved_limit, RECURSION_LIMIT))
+        _active += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _active -= 1
+            if _active == 0:
+                sys.setrecursionlimit(_saved_limit)
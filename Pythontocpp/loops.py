@@ -0,0 +1,370 @@
+import copy
+import operator
+from ast_nodes import *
+from optimizer import Optimizer, Pass, LITERALS, UNARY_OPS, show, literal, located, is_pure, size
+from typechecker import TypeChecker, DECLARED_TYPES, INT
+
+# Loop optimizer, run by optimizer.optimize at -O2 after the -O1 passes.
+# Loops are visited innermost first, and for each one it
+#
+#   unrolls a for loop with a constant trip count of at most
+#       UNROLL_MAX_TRIPS whose copies stay within UNROLL_MAX_NODES: the body
+#       is repeated once per iteration with the loop variable replaced by
+#       its value, then folded again;
+#   hoists invariant expressions (none that optimizer.can_fail(): no
+#       calls, array reads, risky division or int arithmetic, and no
+#       variable the loop assigns) into new variables declared just before
+#       the loop;
+#   strength-reduces i * k, i being a for loop's induction variable
+#       (changed only by its update, by a constant step, between a literal
+#       start and a literal bound) and k an int literal, to a variable that
+#       grows by step * k at the top of each iteration, when it replaces at
+#       least REDUCE_MIN_USES products.
+#
+# The native engine's ints fail on 64-bit overflow, so nothing moves int
+# arithmetic ahead of where the loop would run it, and a running sum is only
+# used where its every value provably fits.
+#
+# A loop left by break, or whose iteration ends early by continue, is never
+# unrolled; hoisting and the running sum, kept at the top of the body, are
+# unaffected by either.  The new variables get slots past the function's
+# frame, so the program stays resolved, and the optimizer's report receives
+# a line per decision.
+
+UNROLL_MAX_TRIPS = 8
+UNROLL_MAX_NODES = 160      # nodes of all the copies of the body together
+REDUCE_MIN_USES = 2
+
+DECLARATIONS = {'int': 'INT', 'float': 'DOUBLE', 'char': 'CHAR', 'string': 'STRING'}
+CONDITIONS = {'LT': operator.lt, 'LE': operator.le, 'GT': operator.gt, 'GE': operator.ge, 'NE': operator.ne}
+STEPS = {'PLUSPLUS': 1, 'MINUSMINUS': -1}
+
+def _escapes(stmts):
+    """Whether a break or continue in `stmts`, a loop's body, leaves that loop
+    or ends its iteration early."""
+    stack = list(stmts)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (BreakStmt, ContinueStmt)):
+            return True
+        if isinstance(node, (WhileStmt, ForStmt)) or not isinstance(node, Node):
+            continue    # their own break and continue
+        if isinstance(node, SwitchStmt):
+            bodies = [case.body for case in node.cases] + ([node.default.body] if node.default else [])
+            if any(isinstance(inner, ContinueStmt) for body in bodies for inner in _outside_loops(body.stmts)):
+                return True
+            continue    # break leaves the switch
+        stack.extend(child for name in type(node).__slots__
+                      for child in _children(getattr(node, name, None)))
+    return False
+
+def _outside_loops(stmts):
+    """The nodes of `stmts` not inside a nested loop."""
+    stack = list(stmts)
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, Node):
+            continue
+        yield node
+        if not isinstance(node, (WhileStmt, ForStmt)):
+            stack.extend(child for name in type(node).__slots__
+                         for child in _children(getattr(node, name, None)))
+
+def _children(value):
+    if isinstance(value, Node):
+        return [value]
+    if isinstance(value, list):
+        return [item for item in value if isinstance(item, Node)]
+    return []
+
+def _assigned(node):
+    """The slots of the variables `node` declares or assigns."""
+    slots = set()
+    for inner in walk(node):
+        if isinstance(inner, (VarDecl, ArrayDecl)):
+            slots.add(inner.slot)
+        elif isinstance(inner, Assignment) and not isinstance(inner.name, ArrayRef):
+            slots.add(inner.slot)
+        elif isinstance(inner, UnaryOp) and inner.op in STEPS and isinstance(inner.operand, VarRef):
+            slots.add(inner.operand.slot)
+    return slots
+
+def _key(expr):
+    """Equal for expressions computing the same thing."""
+    return show(expr), tuple(node.slot for node in walk(expr) if isinstance(node, VarRef))
+
+class LoopOptimizer(Pass):
+    def __init__(self, report=None):
+        super().__init__(report)
+        self.checker = TypeChecker({})  # for the static types of new variables
+        self.temps = set()              # slots of the variables holding hoisted expressions
+
+    # ---------------- Functions ----------------
+    def optimize(self, program):
+        for fn in program.functions:
+            self.function(fn)
+        return program
+
+    def function(self, fn):
+        self.fn = fn
+        self.temps = set()
+        self.checker.fn = fn
+        self.checker.types = {slot: (DECLARED_TYPES.get(vtype), 0) for slot, (vtype, _) in enumerate(fn.params)}
+        fn.body.stmts = self.block(fn.body.stmts)
+
+    def declare(self, name, vtype, init, where):
+        """A declaration of a new variable initialized to `init`."""
+        decl = located(VarDecl(vtype, name, init), where)
+        decl.slot = self.fn.frame_size
+        self.fn.frame_size += 1
+        self.checker.types[decl.slot] = (DECLARED_TYPES[vtype], 0)
+        return decl
+
+    def ref(self, decl, where):
+        ref = located(VarRef(decl.name), where)
+        ref.slot = decl.slot
+        return ref
+
+    def typed(self, op, left, right, where):
+        """A new BinaryOp, typed and folded."""
+        expr = located(BinaryOp(op, left, right), where)
+        self.checker.expr(expr)
+        folder = Optimizer()
+        folder.fn = self.fn
+        return folder.expr(expr)
+
+    # ---------------- Statements ----------------
+    def block(self, stmts):
+        out = []
+        for stmt in stmts:
+            out.extend(self.stmt(stmt))
+        return out
+
+    def stmt(self, stmt):
+        handler = getattr(self, 'stmt_' + type(stmt).__name__, None)
+        return [stmt] if handler is None else handler(stmt)
+
+    def stmt_VarDecl(self, stmt):
+        self.checker.types[stmt.slot] = (DECLARED_TYPES.get(stmt.vtype), 0)
+        return [stmt]
+
+    def stmt_ArrayDecl(self, stmt):
+        self.checker.types[stmt.slot] = (DECLARED_TYPES.get(stmt.vtype), len(stmt.dims))
+        return [stmt]
+
+    def stmt_IfStmt(self, stmt):
+        stmt.then_block.stmts = self.block(stmt.then_block.stmts)
+        if stmt.else_block is not None:
+            stmt.else_block.stmts = self.block(stmt.else_block.stmts)
+        return [stmt]
+
+    def stmt_SwitchStmt(self, stmt):
+        for case in stmt.cases:
+            case.body.stmts = self.block(case.body.stmts)
+        if stmt.default is not None:
+            stmt.default.body.stmts = self.block(stmt.default.body.stmts)
+        return [stmt]
+
+    def stmt_WhileStmt(self, stmt):
+        stmt.body.stmts = self.block(stmt.body.stmts)
+        return self.hoist(stmt) + [stmt]
+
+    def stmt_ForStmt(self, stmt):
+        if stmt.init is not None:
+            self.stmt(stmt.init)
+        stmt.body.stmts = self.block(stmt.body.stmts)
+        hoisted = self.hoist(stmt)
+        unrolled = self.unroll(stmt)
+        if unrolled is not None:
+            return hoisted + unrolled
+        return hoisted + self.reduce(stmt) + [stmt]
+
+    # ---------------- Invariant hoisting ----------------
+    def hoist(self, loop):
+        """Declarations computing `loop`'s invariant expressions, which are
+        replaced by the declared variables."""
+        # variables hoisted out of inner loops may move further out
+        inner = [decl for decl in walk(loop.body) if isinstance(decl, VarDecl) and decl.slot in self.temps]
+        counts = {}
+        for decl in inner:
+            counts[decl.slot] = counts.get(decl.slot, 0) + 1
+        changed = _assigned(loop) - {decl.slot for decl in inner}
+        moved = [decl for decl in inner if counts[decl.slot] == 1 and self.invariant(decl.init, changed)]
+        if moved:
+            ids = {id(decl) for decl in moved}
+            for block in walk(loop.body):
+                if isinstance(block, Block):
+                    block.stmts = [stmt for stmt in block.stmts if id(stmt) not in ids]
+        changed |= {decl.slot for decl in inner} - {decl.slot for decl in moved}
+
+        hoisted = {}    # _key -> declaration
+        def replace(node):
+            if not self.worth_hoisting(node) or not self.invariant(node, changed):
+                return node
+            key = _key(node)
+            decl = hoisted.get(key)
+            if decl is None:
+                ctype = self.checker.expr(node)
+                if ctype not in DECLARATIONS:
+                    return node
+                decl = hoisted[key] = self.declare('hoisted', DECLARATIONS[ctype], node, node)
+                self.temps.add(decl.slot)
+                self.note(node, f"hoisted {show(node)} out of the loop at line {loop.line}")
+            return self.ref(decl, node)
+        for name in type(loop).__slots__:
+            value = getattr(loop, name, None)
+            if isinstance(value, Node) and not (isinstance(loop, ForStmt) and name == 'init'):
+                setattr(loop, name, rewrite(value, replace))
+        return moved + list(hoisted.values())
+
+    def worth_hoisting(self, node):
+        if isinstance(node, (BinaryOp, Cast)):
+            return True
+        return isinstance(node, UnaryOp) and node.op in UNARY_OPS and not isinstance(node.operand, LITERALS)
+
+    def invariant(self, expr, changed):
+        return is_pure(expr) and not any(isinstance(node, VarRef) and node.slot in changed for node in walk(expr))
+
+    # ---------------- Strength reduction ----------------
+    def induction(self, loop):
+        """(slot, step, start) of `loop`'s induction variable, or None."""
+        update, init = loop.update, loop.init
+        if isinstance(update, UnaryOp) and update.op in STEPS and isinstance(update.operand, VarRef):
+            slot, step = update.operand.slot, STEPS[update.op]
+        elif (isinstance(update, Assignment) and isinstance(update.expr, BinaryOp)
+                and update.expr.op in ('PLUS', 'MINUS') and isinstance(update.expr.left, VarRef)
+                and update.expr.left.slot == update.slot and isinstance(update.expr.right, Number)
+                and type(update.expr.right.value) is int):
+            slot, step = update.slot, update.expr.right.value * (1 if update.expr.op == 'PLUS' else -1)
+        else:
+            return None
+        if self.checker.types.get(slot) != (INT, 0):
+            return None
+        if isinstance(init, VarDecl) and init.slot == slot:
+            start = init.init
+        elif isinstance(init, Assignment) and init.slot == slot and not isinstance(init.name, ArrayRef):
+            start = init.expr
+        else:
+            return None
+        if start is None or not is_pure(start):
+            return None
+        if slot in _assigned(loop.body) | _assigned(loop.cond):
+            return None
+        return slot, step, start
+
+    def extent(self, loop, induction):
+        """The largest magnitude `loop`'s induction variable can reach, from
+        its literal start to the literal bound its condition holds it to,
+        or None."""
+        slot, step, start = induction
+        cond = loop.cond
+        if not (isinstance(start, Number) and type(start.value) is int and isinstance(cond, BinaryOp)
+                and isinstance(cond.left, VarRef) and cond.left.slot == slot
+                and isinstance(cond.right, Number) and type(cond.right.value) is int):
+            return None
+        if cond.op not in (('LT', 'LE') if step > 0 else ('GT', 'GE')):
+            return None
+        return max(abs(start.value), abs(cond.right.value)) + abs(step)
+
+    def reduce(self, loop):
+        """Declarations of running sums replacing the products of `loop`'s
+        induction variable in its body."""
+        induction = self.induction(loop)
+        if induction is None:
+            return []
+        slot, step, start = induction
+        extent = self.extent(loop, induction)
+        if extent is None:
+            return []
+
+        def factor(expr):
+            """The k of i * k or k * i, or None."""
+            if not (isinstance(expr, BinaryOp) and expr.op == 'MULT'):
+                return None
+            for ref, k in ((expr.left, expr.right), (expr.right, expr.left)):
+                if (isinstance(ref, VarRef) and ref.slot == slot and isinstance(k, Number)
+                        and type(k.value) is int and extent * abs(k.value) < 2**63):
+                    return k
+            return None
+
+        products = {}   # _key of k -> [k, uses]
+        for node in walk(loop.body):
+            k = factor(node)
+            if k is not None:
+                products.setdefault(_key(k), [k, 0])[1] += 1
+
+        decls = []
+        for key, (k, uses) in products.items():
+            if uses < REDUCE_MIN_USES:
+                continue
+            # sum = (start - step) * k before the loop, sum += step * k on entering the body
+            first = self.typed('MULT', self.typed('MINUS', copy.deepcopy(start), literal(step, loop), loop),
+                               copy.deepcopy(k), loop)
+            decl = self.declare('stride', 'INT', first, loop)
+            increment = self.typed('MULT', literal(step, loop), copy.deepcopy(k), loop)
+            bump = located(Assignment(decl.name, self.typed('PLUS', self.ref(decl, loop), increment, loop)), loop)
+            bump.slot = decl.slot
+            loop.body.stmts.insert(0, bump)
+            rewrite(loop.body, lambda node: self.ref(decl, node) if factor(node) is not None
+                    and _key(factor(node)) == key else node)
+            decls.append(decl)
+            self.note(loop, f"strength-reduced {uses} products by {show(k)} of the loop variable to a running sum")
+        return decls
+
+    # ---------------- Unrolling ----------------
+    def trips(self, loop):
+        """(slot, values the induction variable takes, value after the loop)
+        of a for loop running a constant number of times, or None."""
+        induction = self.induction(loop)
+        cond = loop.cond
+        if induction is None or not isinstance(cond, BinaryOp) or cond.op not in CONDITIONS:
+            return None
+        slot, step, start = induction
+        if not (isinstance(start, Number) and type(start.value) is int):
+            return None
+        if not (isinstance(cond.left, VarRef) and cond.left.slot == slot
+                and isinstance(cond.right, Number) and type(cond.right.value) is int):
+            return None
+        test, bound, value, values = CONDITIONS[cond.op], cond.right.value, start.value, []
+        while test(value, bound):
+            if len(values) == UNROLL_MAX_TRIPS:
+                return None
+            values.append(value)
+            value += step
+        return slot, values, value
+
+    def unroll(self, loop):
+        """The statements replacing `loop` unrolled, or None."""
+        trips = self.trips(loop)
+        if trips is None:
+            return None
+        slot, values, final = trips
+        if _escapes(loop.body.stmts):
+            self.note(loop, "did not unroll a constant-trip loop that has break or continue")
+            return None
+        if len(values) * size(loop.body.stmts) > UNROLL_MAX_NODES:
+            self.note(loop, f"did not unroll a loop of {len(values)} iterations: the body is too big")
+            return None
+        folder = Optimizer()
+        folder.fn = self.fn
+        out = []
+        for value in values:
+            body = located(Block(copy.deepcopy(loop.body.stmts)), loop.body)
+            rewrite(body, lambda node: literal(value, node) if isinstance(node, VarRef) and node.slot == slot else node)
+            stmts = folder.block(body)
+            if any(isinstance(stmt, (VarDecl, ArrayDecl)) for stmt in stmts):
+                # each copy keeps its declarations to itself
+                body.stmts = stmts
+                stmts = [IfStmt(literal(1, loop), body)]
+            out.extend(stmts)
+        if isinstance(loop.init, Assignment):
+            # the variable outlives the loop
+            last = located(Assignment(loop.init.name, literal(final, loop.init)), loop.init)
+            last.slot = slot
+            out.append(last)
+        self.note(loop, f"unrolled a loop of {len(values)} iterations")
+        return out
+
+def optimize_loops(program, report=None):
+    """Run the loop optimizer over a resolved, type-checked `program` in place and return it."""
+    return LoopOptimizer(report).optimize(program)
@@ -0,0 +1,94 @@
+from ast_nodes import *
+
+# Memoisation of pure functions, which the engines apply when asked to
+# (`memo=True`; `--memo` on the command line).
+#
+# A function is pure when its result depends on its arguments alone and a
+# call has no effect besides returning it: its parameters are all scalars,
+# it neither prints, writes an array element nor touches a graph, and every
+# function it calls is pure as well.  main() never is.  Each pure function
+# gets a MemoTable, and a call first looks its argument tuple up there: a
+# hit returns the stored result without running the body, a miss runs it
+# and stores what it returns.  A call that fails stores nothing.  Since a
+# hit makes no call, it does not count towards the call depth limit either.
+#
+# Tables stop growing at MEMO_MAX_ENTRIES results; later misses still run
+# the body, they are just not remembered.
+
+MEMO_MAX_ENTRIES = 100_000
+
+SCALAR_TYPES = frozenset(('INT', 'LONG', 'LONG LONG', 'BOOL', 'FLOAT', 'DOUBLE', 'CHAR', 'STRING'))
+
+MISSING = object()      # what MemoTable.lookup returns for a key it does not hold
+
+class MemoTable:
+    """Results of one pure function by argument tuple, with hit counts."""
+    __slots__ = ('name', 'limit', 'values', 'hits', 'calls')
+
+    def __init__(self, name, limit=MEMO_MAX_ENTRIES):
+        self.name = name
+        self.limit = limit
+        self.values = {}
+        self.hits = 0
+        self.calls = 0
+
+    def lookup(self, key):
+        """The result stored for `key`, or MISSING; counts a call."""
+        self.calls += 1
+        value = self.values.get(key, MISSING)
+        if value is not MISSING:
+            self.hits += 1
+        return value
+
+    def store(self, key, value):
+        """Remember `value` for `key` while there is room; returns `value`."""
+        if len(self.values) < self.limit:
+            self.values[key] = value
+        return value
+
+    def stats(self):
+        return {'hits': self.hits, 'calls': self.calls, 'entries': len(self.values)}
+
+def _writes(node):
+    """Whether `node` itself has an effect a pure function may not have."""
+    if isinstance(node, (PrintStmt, MethodCall, GraphInit)):
+        return True
+    if isinstance(node, Assignment):
+        return isinstance(node.name, ArrayRef)
+    if isinstance(node, UnaryOp):
+        return node.op in ('PLUSPLUS', 'MINUSMINUS') and isinstance(node.operand, ArrayRef)
+    return False
+
+def pure_functions(program):
+    """Names of the pure functions of a resolved `program`."""
+    functions = {fn.name: fn for fn in program.functions}
+    pure = {name for name, fn in functions.items()
+            if name != 'main' and all(vtype in SCALAR_TYPES for vtype, _ in fn.params)
+            and not any(_writes(node) for node in walk(fn.body))}
+    # a function calling one that is not pure is not pure either
+    changed = True
+    while changed:
+        changed = False
+        for name in sorted(pure):
+            if any(isinstance(node, FunctionCall) and node.name not in pure for node in walk(functions[name].body)):
+                pure.discard(name)
+                changed = True
+    return pure
+
+def memo_tables(program):
+    """A new MemoTable for each pure function of `program`, by name."""
+    return {name: MemoTable(name) for name in sorted(pure_functions(program))}
+
+def table_stats(tables):
+    """MemoTable.stats() of each table in `tables`, by function name."""
+    return {name: table.stats() for name, table in tables.items()}
+
+def format_stats(stats):
+    """One line per function of `stats` (see table_stats), with its hit rate."""
+    lines = []
+    for name, counts in stats.items():
+        calls = counts['calls']
+        rate = 100.0 * counts['hits'] / calls if calls else 0.0
+        lines.append(f"{name}(): {counts['hits']} hits in {calls} calls ({rate:.1f}%), "
+                     f"{counts['entries']} entries")
+    return lines
@@ -0,0 +1,34 @@
+import operator
+
+# The language's operators as Python functions, by operator kind.  The
+# engines run them, the type checker picks among them and the optimizer
+# folds constants with them, so all of them agree on what an operator does.
+#
+# / floors when both operands are ints; && and || take both operands,
+# already evaluated.
+
+def divide(l, r):
+    return l // r if isinstance(l, int) and isinstance(r, int) else l / r
+
+BINARY_OPS = {
+    'PLUS': operator.add,
+    'MINUS': operator.sub,
+    'MULT': operator.mul,
+    'DIV': divide,
+    'MOD': operator.mod,
+    'EQ': lambda l, r: int(l == r),
+    'NE': lambda l, r: int(l != r),
+    'GT': lambda l, r: int(l > r),
+    'LT': lambda l, r: int(l < r),
+    'GE': lambda l, r: int(l >= r),
+    'LE': lambda l, r: int(l <= r),
+    'AND': lambda l, r: int(bool(l) and bool(r)),
+    'OR': lambda l, r: int(bool(l) or bool(r)),
+}
+
+# all but ++ and --, which change their operand
+UNARY_OPS = {
+    'MINUS': lambda v: -v,
+    'PLUS': lambda v: +v,
+    'NOT': lambda v: int(not v),
+}
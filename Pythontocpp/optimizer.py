@@ -0,0 +1,368 @@
+from collections import Counter
+from ast_nodes import *
+from lexer import OPERATORS
+from resolver import resolve, is_resolved, nesting_guard
+from operators import BINARY_OPS, UNARY_OPS
+
+# AST optimizer, run after name resolution and before any engine sees the
+# program.  At -O1 it
+#
+#   folds operators whose operands are literals, with the engines' own
+#       operator functions (operators.py; an operation that would fail, like
+#       1 / 0, is left for the program to fail on when it gets there);
+#   propagates constants: a variable declared once with a literal of its
+#       declared type and never assigned after is replaced by the literal
+#       at every use, and its declaration is dropped;
+#   removes the branch an if with a constant condition never takes, loops
+#       whose condition is constantly false, and statements following a
+#       return, break or continue in the same block;
+#   removes functions that main() can never call.
+#
+# -O2 adds tail-call elimination (tailcalls.py), inlining (inliner.py) and
+# the loop optimizations of loops.py.
+#
+# Slots are kept, so the program stays resolved.  If `report` is a list it
+# receives one line per change, "<function>, line <n>: <what changed>".
+# Every pass runs under resolver.nesting_guard(), as they recurse once per
+# level of nesting.
+
+OPTIMIZATION_LEVELS = (0, 1, 2)
+
+LITERALS = (Number, String, Char)
+SYMBOLS = {kind: symbol for symbol, kind in OPERATORS.items()}
+# the literal type that matches a variable's declared type
+LITERAL_TYPES = {'INT': int, 'LONG': int, 'LONG LONG': int, 'BOOL': int,
+                 'FLOAT': float, 'DOUBLE': float, 'CHAR': str, 'STRING': str}
+
+def show(expr):
+    """`expr` as source text, for reports."""
+    if isinstance(expr, Number):
+        return repr(expr.value)
+    if isinstance(expr, String):
+        return f'"{expr.value}"'
+    if isinstance(expr, Char):
+        return f"'{expr.value}'"
+    if isinstance(expr, VarRef):
+        return expr.name
+    if isinstance(expr, ArrayRef):
+        return expr.name + ''.join(f"[{show(index)}]" for index in expr.indices)
+    if isinstance(expr, BinaryOp):
+        return f"{_operand(expr.left)} {SYMBOLS.get(expr.op, expr.op)} {_operand(expr.right)}"
+    if isinstance(expr, UnaryOp):
+        symbol = SYMBOLS.get(expr.op, expr.op)
+        operand = _operand(expr.operand)
+        return operand + symbol if expr.postfix else symbol + operand
+    if isinstance(expr, FunctionCall):
+        return f"{expr.name}({', '.join(show(arg) for arg in expr.args)})"
+    if isinstance(expr, Cast):
+        return f"({expr.ctype}) {_operand(expr.expr)}"
+    return type(expr).__name__
+
+def _operand(expr):
+    return f"({show(expr)})" if isinstance(expr, BinaryOp) else show(expr)
+
+def located(node, where):
+    """`node`, positioned at node `where`."""
+    node.line, node.col = where.line, where.col
+    return node
+
+def literal(value, where, kind=None):
+    """A literal node for `value`, positioned at node `where`; a String or a
+    Number unless `kind` gives the node class."""
+    if kind is None:
+        kind = String if isinstance(value, str) else Number
+    return located(kind(value), where)
+
+def size(node):
+    """The number of nodes in `node`, or in a list of them."""
+    return sum(1 for _ in walk(node))
+
+def _on_ints(expr):
+    """Whether BinaryOp `expr` may be int arithmetic: no operand is plainly
+    text or a float."""
+    for operand in (expr.left, expr.right):
+        if (isinstance(operand, (String, Char)) or (isinstance(operand, Cast) and operand.ctype != 'int')
+                or (isinstance(operand, Number) and isinstance(operand.value, float))):
+            return False
+    return True
+
+def can_fail(expr):
+    """Whether evaluating `expr` itself, apart from its operands, can fail: a
+    call, an array read, a division by anything but a nonzero literal, a
+    cast to int (of inf or nan), or arithmetic that can overflow the native
+    engine's 64-bit ints (runtime.hpp), which the other engines' ints never
+    do."""
+    if isinstance(expr, (FunctionCall, MethodCall, ArrayRef)):
+        return True
+    if isinstance(expr, BinaryOp):
+        if expr.op in ('PLUS', 'MINUS', 'MULT'):
+            return _on_ints(expr)
+        if expr.op in ('DIV', 'MOD'):
+            # by zero, or LLONG_MIN / -1 overflowing
+            divisor = expr.right.value if isinstance(expr.right, Number) else 0
+            return divisor == 0 or (expr.op == 'DIV' and divisor == -1)
+        return False
+    if isinstance(expr, UnaryOp):
+        return expr.op in ('MINUS', 'PLUSPLUS', 'MINUSMINUS')
+    return isinstance(expr, Cast) and expr.ctype == 'int'
+
+def has_effects(expr):
+    """Whether evaluating `expr` itself, apart from its operands, can fail or
+    change anything."""
+    return can_fail(expr) or (isinstance(expr, UnaryOp) and expr.op not in UNARY_OPS)
+
+def is_pure(expr):
+    """Whether evaluating `expr` can neither fail, change anything, nor read
+    anything but plain variables."""
+    return all(isinstance(node, LITERALS + (VarRef, Cast, BinaryOp, UnaryOp)) and not has_effects(node)
+               for node in walk(expr))
+
+def _declares(stmts):
+    return any(isinstance(stmt, (VarDecl, ArrayDecl)) for stmt in stmts)
+
+class Pass:
+    """Base of the optimizer's passes, which work one function (`fn`) at a
+    time and note their changes in `report`, as for optimize()."""
+    def __init__(self, report=None):
+        self.report = report
+        self.fn = None
+
+    def note(self, node, message):
+        if self.report is not None:
+            where = f", line {node.line}" if getattr(node, 'line', None) is not None else ''
+            self.report.append(f"{self.fn.name}{where}: {message}")
+
+class Optimizer(Pass):
+    def __init__(self, report=None):
+        super().__init__(report)
+        self.constants = {}         # slot -> literal replacing the variable
+        self.candidates = set()     # slots declared once and never assigned
+
+    # ---------------- Program ----------------
+    def optimize(self, program):
+        for fn in program.functions:
+            self.function(fn)
+        self.remove_uncalled(program)
+        return program
+
+    def remove_uncalled(self, program):
+        functions = {fn.name: fn for fn in program.functions}
+        if 'main' not in functions:
+            return
+        called, pending = {'main'}, ['main']
+        while pending:
+            for node in walk(functions[pending.pop()].body):
+                if isinstance(node, FunctionCall) and node.name in functions and node.name not in called:
+                    called.add(node.name)
+                    pending.append(node.name)
+        for fn in program.functions:
+            if fn.name not in called:
+                self.fn = fn
+                self.note(fn, f"removed {fn.name}(), which is never called")
+        program.functions = [fn for fn in program.functions if fn.name in called]
+
+    def function(self, fn):
+        self.fn = fn
+        self.constants = {}
+        declared, assigned = Counter(), set()
+        for node in walk(fn.body):
+            if isinstance(node, (VarDecl, ArrayDecl)):
+                declared[node.slot] += 1
+            elif isinstance(node, Assignment) and not isinstance(node.name, ArrayRef):
+                assigned.add(node.slot)
+            elif (isinstance(node, UnaryOp) and node.op in ('PLUSPLUS', 'MINUSMINUS')
+                    and isinstance(node.operand, VarRef)):
+                assigned.add(node.operand.slot)
+        self.candidates = {slot for slot, count in declared.items() if count == 1} - assigned
+        fn.body.stmts = self.block(fn.body)
+
+    # ---------------- Statements ----------------
+    def block(self, block):
+        """The optimized statements of `block`."""
+        out = []
+        stmts = block.stmts
+        for i, stmt in enumerate(stmts):
+            if stmt is None:
+                continue
+            out.extend(self.stmt(stmt))
+            if isinstance(stmt, (ReturnStmt, BreakStmt, ContinueStmt)) and i + 1 < len(stmts):
+                jump = type(stmt).__name__[:-len('Stmt')].lower()
+                self.note(stmts[i + 1], f"removed {len(stmts) - i - 1} unreachable statement(s) after {jump}")
+                break
+        return out
+
+    def stmt(self, stmt):
+        """The statements replacing `stmt`: none, itself, or others."""
+        handler = getattr(self, 'stmt_' + type(stmt).__name__, None)
+        if handler is None:
+            return [stmt]
+        return handler(stmt)
+
+    def root(self, expr):
+        """Optimize an expression that is not part of a larger one."""
+        if expr is None:
+            return None
+        before = show(expr) if self.report is not None else None
+        expr = self.expr(expr)
+        if before is not None and show(expr) != before:
+            self.note(expr, f"{before} -> {show(expr)}")
+        return expr
+
+    def stmt_VarDecl(self, stmt):
+        stmt.init = self.root(stmt.init)
+        init = stmt.init
+        if (stmt.slot in self.candidates and isinstance(init, LITERALS)
+                and type(init.value) is LITERAL_TYPES.get(stmt.vtype)):
+            self.constants[stmt.slot] = init
+            self.note(stmt, f"{stmt.name} is always {show(init)}")
+            return []
+        return [stmt]
+
+    def stmt_Assignment(self, stmt):
+        stmt.expr = self.root(stmt.expr)
+        if isinstance(stmt.name, ArrayRef):
+            self.indices(stmt.name)
+        return [stmt]
+
+    def stmt_PrintStmt(self, stmt):
+        stmt.expr = self.root(stmt.expr)
+        return [stmt]
+
+    stmt_ReturnStmt = stmt_ExprStmt = stmt_PrintStmt
+
+    def stmt_UnaryOp(self, stmt):
+        return [self.root(stmt)]
+
+    def stmt_IfStmt(self, stmt):
+        stmt.cond = self.root(stmt.cond)
+        stmt.then_block.stmts = self.block(stmt.then_block)
+        if stmt.else_block is not None:
+            stmt.else_block.stmts = self.block(stmt.else_block)
+        cond = stmt.cond
+        if not isinstance(cond, LITERALS):
+            return [stmt]
+        if cond.value:
+            if stmt.else_block is not None:
+                self.note(stmt, "removed the else branch, which is never taken")
+            stmt.else_block = None
+            if _declares(stmt.then_block.stmts):
+                return [stmt]
+            return stmt.then_block.stmts
+        self.note(stmt, "removed the if branch, which is never taken")
+        if stmt.else_block is None:
+            return []
+        if _declares(stmt.else_block.stmts):
+            stmt.cond, stmt.then_block, stmt.else_block = literal(1, cond), stmt.else_block, None
+            return [stmt]
+        return stmt.else_block.stmts
+
+    def stmt_WhileStmt(self, stmt):
+        stmt.cond = self.root(stmt.cond)
+        stmt.body.stmts = self.block(stmt.body)
+        if isinstance(stmt.cond, LITERALS) and not stmt.cond.value:
+            self.note(stmt, "removed a while loop that never runs")
+            return []
+        return [stmt]
+
+    def stmt_ForStmt(self, stmt):
+        if stmt.init is not None:
+            init = self.stmt(stmt.init)
+            stmt.init = init[0] if init else None
+        stmt.cond = self.root(stmt.cond)
+        if stmt.update is not None:
+            update = self.stmt(stmt.update)
+            stmt.update = update[0] if update else None
+        stmt.body.stmts = self.block(stmt.body)
+        if not (isinstance(stmt.cond, LITERALS) and not stmt.cond.value):
+            return [stmt]
+        init = stmt.init
+        if isinstance(init, VarDecl):
+            if not is_pure(init.init):
+                return [stmt]
+            init = None
+        self.note(stmt, "removed a for loop that never runs")
+        return [init] if init is not None else []
+
+    def stmt_SwitchStmt(self, stmt):
+        stmt.expr = self.root(stmt.expr)
+        for case in stmt.cases:
+            case.body.stmts = self.block(case.body)
+        if stmt.default is not None:
+            stmt.default.body.stmts = self.block(stmt.default.body)
+        return [stmt]
+
+    # ---------------- Expressions ----------------
+    def expr(self, expr):
+        handler = getattr(self, 'expr_' + type(expr).__name__, None)
+        return expr if handler is None else handler(expr)
+
+    def expr_VarRef(self, expr):
+        constant = self.constants.get(expr.slot)
+        if constant is None:
+            return expr
+        return literal(constant.value, expr, type(constant))
+
+    def indices(self, ref):
+        ref.indices = [self.expr(index) for index in ref.indices]
+        return ref
+
+    expr_ArrayRef = indices
+
+    def expr_BinaryOp(self, expr):
+        expr.left, expr.right = self.expr(expr.left), self.expr(expr.right)
+        left, right = expr.left, expr.right
+        operation = expr.impl or BINARY_OPS.get(expr.op)
+        if operation is None or not (isinstance(left, LITERALS) and isinstance(right, LITERALS)):
+            return expr
+        try:
+            value = operation(left.value, right.value)
+        except Exception:
+            return expr   # fails at run time, as written
+        return literal(value, expr)
+
+    def expr_UnaryOp(self, expr):
+        operand = expr.operand
+        if isinstance(operand, ArrayRef):
+            self.indices(operand)
+            return expr
+        if isinstance(operand, VarRef) and expr.op in ('PLUSPLUS', 'MINUSMINUS'):
+            return expr
+        expr.operand = operand = self.expr(operand)
+        operation = UNARY_OPS.get(expr.op)
+        if operation is None or not isinstance(operand, LITERALS):
+            return expr
+        try:
+            value = operation(operand.value)
+        except Exception:
+            return expr
+        return literal(value, expr)
+
+    def expr_Cast(self, expr):
+        expr.expr = self.expr(expr.expr)
+        if not isinstance(expr.expr, Number):
+            return expr
+        return literal(int(expr.expr.value) if expr.ctype == 'int' else float(expr.expr.value), expr)
+
+    def expr_FunctionCall(self, expr):
+        expr.args = [self.expr(arg) for arg in expr.args]
+        return expr
+
+def optimize(program, level=1, report=None):
+    """Optimize `program` in place at `level` (see OPTIMIZATION_LEVELS) and return it."""
+    if level not in OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown optimization level {level}")
+    if level == 0:
+        return program
+    if not is_resolved(program):
+        resolve(program)
+    # tailcalls.py, inliner.py and loops.py build on this module
+    from tailcalls import eliminate_tail_calls
+    from inliner import inline_functions
+    from loops import optimize_loops
+    with nesting_guard():
+        Optimizer(report).optimize(program)
+        if level >= 2:
+            eliminate_tail_calls(program, report)
+            inline_functions(program, report)
+            optimize_loops(program, report)
+    return program
@@ -0,0 +1,118 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import ast_cache
+from ast_nodes import Program
+from lexer import tokenize_batches
+from token_stream import TokenStream
+from parser.parser_functions import ParserWithParams
+
+# Parallel front end for big programs.
+#
+# The source is first cut at top-level function boundaries: a function ends
+# at the RBRACE that brings the brace depth back to 0.  Braces are matched by
+# a scanner that only recognises what can hide a brace from the lexer
+# (comments, string and char literals), so it runs in C over the whole text.
+# As in incremental.py, the lexer is between tokens at such a point, so
+# (offset, line) is all a worker needs to lex and parse from there.
+# Consecutive functions are packed into a few groups of similar size.  Each
+# group goes to a worker process as its slice of the source, and the
+# FunctionDecls come back in ast_cache's flat format to be stitched into a
+# Program in source order.
+#
+# Errors are not reported from the workers.  If any group fails to lex or
+# parse as whole functions, the source is parsed serially instead, so the
+# error (lexer errors first, then the first syntax error) is exactly the one
+# serial parsing raises.
+
+PARALLEL_THRESHOLD = 256 * 1024   # bytes of source below which parsing stays serial
+GROUPS_PER_WORKER = 4
+
+# Same comment/literal rules as lexer._MASTER; anything else is skipped in bulk
+_BRACES = re.compile(
+    r'//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)'
+    r'|"[^"\\]*(?:\\[\s\S][^"\\]*)*(?:"|\\?\Z)'
+    r"|'(?:\\[\s\S]|[^'\\])?(?:'|\\?\Z)"
+    r'|([{}])'
+    r'|[^{}"\'/]+|[\s\S]'
+)
+
+def split_functions(code):
+    """(offset, line) just after each top-level function in `code`, except at the end."""
+    cuts = []
+    depth = 0
+    line, counted = 1, 0
+    for m in _BRACES.finditer(code):
+        brace = m.group(1)
+        if brace == '{':
+            depth += 1
+        elif brace == '}' and depth:
+            depth -= 1
+            if not depth:
+                end = m.end()
+                line += code.count('\n', counted, end)
+                counted = end
+                cuts.append((end, line))
+    if cuts and not code[cuts[-1][0]:].strip(' \t\n'):
+        cuts.pop()
+    return cuts
+
+def _group(cuts, length, count):
+    """Pick among `cuts` the starts of at most `count` groups of similar size."""
+    target = length / count
+    groups = [(0, 1)]
+    for offset, line in cuts:
+        if offset - groups[-1][0] >= target:
+            groups.append((offset, line))
+    return groups
+
+def _parse_group(text, pos, line):
+    """Worker: parse text[pos:], a run of whole functions, into ast_cache's format.
+
+    `text` starts at the beginning of the line holding `pos`, so columns
+    come out as in the whole source.  Returns None if the group does not
+    lex or parse cleanly.
+    """
+    tokens = TokenStream(source=text)
+    try:
+        for batch in tokenize_batches(text, pos, line):
+            tokens.extend_batch(*batch)
+        tokens.append('EOF', '', len(text), line + text.count('\n', pos))
+        return ast_cache.dumps(Program(list(ParserWithParams(tokens).parse_functions())))
+    except SyntaxError:
+        return None
+
+def _parse_serial(code):
+    tokens = TokenStream.from_source(code)
+    return ParserWithParams(tokens).parse_program()
+
+def parse_parallel(code, workers=None, threshold=PARALLEL_THRESHOLD):
+    """Parse `code` like compiler.compile_source, spreading functions over `workers` processes.
+
+    `workers` defaults to one per CPU.  Sources under `threshold` bytes, a
+    single worker, or a source that does not split into at least two groups
+    are parsed serially.
+    """
+    workers = workers or os.cpu_count() or 1
+    if len(code) < threshold or workers < 2:
+        return _parse_serial(code)
+    groups = _group(split_functions(code), len(code), workers * GROUPS_PER_WORKER)
+    if len(groups) < 2:
+        return _parse_serial(code)
+
+    tasks = []
+    for (pos, line), end in zip(groups, [offset for offset, _ in groups[1:]] + [len(code)]):
+        line_start = code.rfind('\n', 0, pos) + 1
+        tasks.append((code[line_start:end], pos - line_start, line))
+    with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+        results = list(pool.map(_parse_group, *zip(*tasks)))
+    if None in results:
+        return _parse_serial(code)
+
+    functions = []
+    for payload in results:
+        functions.extend(ast_cache.loads(payload).functions)
+    program = Program(functions)
+    if functions:
+        program.line, program.col = functions[0].line, functions[0].col
+    return program
@@ -1,53 +1,55 @@
 from ast_nodes import *
+from lexer import TOKEN_KINDS, Tok
 
 class DeclarationParser:
     # ---------------- Variable Declaration ----------------
     def parse_var_decl(self):
-        vtype = self.next()[0]          # type keyword (INT, FLOAT, BOOL, etc.)
-        name = self.expect('ID')[1]     # variable name
+        vtype = TOKEN_KINDS[self.advance()]  # type keyword (INT, FLOAT, BOOL, etc.)
+        name = self.expect(Tok.ID)           # variable name
         init = None
-        if self.peek()[0] == 'ASSIGN':
-            self.next()
+        if self.peek_kind() == Tok.ASSIGN:
+            self.advance()
             init = self.parse_expr()
-        self.expect('SEMI')
+        self.expect(Tok.SEMI)
         return VarDecl(vtype, name, init)
 
     # ---------------- Array Declaration ----------------
     def parse_array_decl(self):
-        vtype = self.next()[0]          # type keyword
-        name = self.expect('ID')[1]     # array name
+        vtype = TOKEN_KINDS[self.advance()]  # type keyword
+        name = self.expect(Tok.ID)           # array name
         dims = []
-        while self.peek()[0] == 'LBRACKET':
-            self.next()
-            dims.append(self.expect('NUMBER')[1])
-            self.expect('RBRACKET')
-        self.expect('SEMI')
+        while self.peek_kind() == Tok.LBRACKET:
+            self.advance()
+            dims.append(self.expect(Tok.NUMBER))
+            self.expect(Tok.RBRACKET)
+        self.expect(Tok.SEMI)
         return ArrayDecl(vtype, name, dims)
 
     # ---------------- Assignment to variable ----------------
     def parse_assignment(self):
-        name = self.expect('ID')[1]
-        self.expect('ASSIGN')
+        name = self.expect(Tok.ID)
+        self.expect(Tok.ASSIGN)
         expr = self.parse_expr()
-        self.expect('SEMI')
+        self.expect(Tok.SEMI)
         return Assignment(name, expr)
 
     # Assignment without trailing semicolon (used in for-loop init/update)
     def parse_assignment_no_semi(self):
-        name = self.expect('ID')[1]
-        self.expect('ASSIGN')
+        name = self.expect(Tok.ID)
+        self.expect(Tok.ASSIGN)
         expr = self.parse_expr()
         return Assignment(name, expr)
 
     # ---------------- Assignment to array element ----------------
     def parse_assignment_array(self):
-        name = self.expect('ID')[1]
+        start = self.here()
+        name = self.expect(Tok.ID)
         indices = []
-        while self.peek()[0] == 'LBRACKET':
-            self.next()
+        while self.peek_kind() == Tok.LBRACKET:
+            self.advance()
             indices.append(self.parse_expr())
-            self.expect('RBRACKET')
-        self.expect('ASSIGN')
+            self.expect(Tok.RBRACKET)
+        self.expect(Tok.ASSIGN)
         expr = self.parse_expr()
-        self.expect('SEMI')
-        return Assignment(ArrayRef(name, indices), expr)
+        self.expect(Tok.SEMI)
+        return Assignment(self.located(ArrayRef(name, indices), start), expr)
@@ -1,121 +1,165 @@
 from ast_nodes import *
+from lexer import TOKEN_KINDS, Tok
+
+# ---------------- Operator tables ----------------
+# Binary operators: token kind -> binding power (higher binds tighter).  All
+# of them are left-associative.  Prefix operators bind tighter than any
+# binary operator.  A new operator needs only an entry here (and a lexer
+# token plus an interpreter case for what it does).
+BINARY_OPS = {
+    Tok.OR: 1,
+    Tok.AND: 2,
+    Tok.EQ: 3, Tok.NE: 3,
+    Tok.GT: 4, Tok.LT: 4, Tok.GE: 4, Tok.LE: 4,
+    Tok.PLUS: 5, Tok.MINUS: 5,
+    Tok.MULT: 6, Tok.DIV: 6, Tok.MOD: 6,
+}
+PREFIX_OPS = frozenset((Tok.PLUSPLUS, Tok.MINUSMINUS, Tok.MINUS, Tok.NOT))
+INCDEC_OPS = (Tok.PLUSPLUS, Tok.MINUSMINUS)
+
+# Entries of the operator stack in parse_expr
+_BINARY, _PREFIX, _PAREN, _CALL, _INDEX = range(5)
 
 class ExpressionParser:
+    # ParserWithParams turns this on: `name(` starts a function call
+    SUPPORTS_CALLS = False
+
     def parse_expr_stmt(self):
         expr = self.parse_expr()
-        self.expect('SEMI')
+        self.expect(Tok.SEMI)
         return ExprStmt(expr)
 
+    # ---------------- Expression (precedence climbing) ----------------
     def parse_expr(self):
-        return self.parse_logic_or()
+        """Parse an expression with an explicit operator stack.
 
-    # ---------------- Logic OR ----------------
-    def parse_logic_or(self):
-        node = self.parse_logic_and()
-        while self.peek()[0] == 'OR':
-            op = self.next()[0]
-            right = self.parse_logic_and()
-            node = BinaryOp(op, node, right)
-        return node
+        Parentheses, call arguments and array indices push a frame on the
+        stack instead of recursing, so nesting depth is not limited by the
+        Python stack.  Variables and numbers are handled inline; other
+        primaries go through parse_primary().
+        """
+        peek_kind = self.peek_kind
+        tokens = self.tokens
+        position = tokens.position
+        ops = []        # pending operators and open frames, with their (line, col)
+        operands = []   # left operands of the pending binary operators
+        while True:
+            # ---- operand position ----
+            kind = peek_kind()
+            where = position(self.pos)
+            if kind == Tok.ID:
+                nxt = peek_kind(1)
+                if nxt == Tok.LBRACKET:
+                    ops.append((_INDEX, tokens.value(self.pos), [], where))
+                    self.pos += 2
+                    continue
+                if nxt == Tok.LPAREN and self.SUPPORTS_CALLS:
+                    name = tokens.value(self.pos)
+                    self.pos += 2
+                    if peek_kind() != Tok.RPAREN:
+                        ops.append((_CALL, name, [], where))
+                        continue
+                    self.pos += 1
+                    node = FunctionCall(name, [])
+                elif nxt in INCDEC_OPS:
+                    var = VarRef(tokens.value(self.pos))
+                    var.line, var.col = where
+                    node = UnaryOp(TOKEN_KINDS[nxt], var, postfix=True)
+                    self.pos += 2
+                else:
+                    node = VarRef(tokens.value(self.pos))
+                    self.pos += 1
+            elif kind == Tok.NUMBER:
+                node = Number(tokens.value(self.pos))
+                self.pos += 1
+            elif kind in PREFIX_OPS:
+                ops.append((_PREFIX, kind, where))
+                self.pos += 1
+                continue
+            elif kind == Tok.LPAREN:
+                ops.append((_PAREN,))
+                self.pos += 1
+                continue
+            else:
+                node = self.parse_primary()
+            node.line, node.col = where
 
-    # ---------------- Logic AND ----------------
-    def parse_logic_and(self):
-        node = self.parse_equality()
-        while self.peek()[0] == 'AND':
-            op = self.next()[0]
-            right = self.parse_equality()
-            node = BinaryOp(op, node, right)
-        return node
+            # ---- operator position: reduce, close frames ----
+            while True:
+                while ops and ops[-1][0] == _PREFIX:
+                    _, op, where = ops.pop()
+                    node = UnaryOp(TOKEN_KINDS[op], node, postfix=False)
+                    node.line, node.col = where
+                kind = peek_kind()
+                bp = BINARY_OPS.get(kind)
+                if bp is not None:
+                    while ops and ops[-1][0] == _BINARY and ops[-1][2] >= bp:
+                        _, op, _, where = ops.pop()
+                        node = BinaryOp(TOKEN_KINDS[op], operands.pop(), node)
+                        node.line, node.col = where
+                    ops.append((_BINARY, kind, bp, position(self.pos)))
+                    operands.append(node)
+                    self.pos += 1
+                    break
 
-    # ---------------- Equality (==, !=) ----------------
-    def parse_equality(self):
-        node = self.parse_relational()
-        while self.peek()[0] in ('EQ','NE'):
-            op = self.next()[0]
-            right = self.parse_relational()
-            node = BinaryOp(op, node, right)
-        return node
+                # end of the innermost (sub)expression
+                while ops and ops[-1][0] == _BINARY:
+                    _, op, _, where = ops.pop()
+                    node = BinaryOp(TOKEN_KINDS[op], operands.pop(), node)
+                    node.line, node.col = where
+                if not ops:
+                    return node
+                frame = ops[-1]
+                if frame[0] == _PAREN:
+                    self.expect(Tok.RPAREN)
+                    ops.pop()
+                    continue
+                if frame[0] == _CALL:
+                    frame[2].append(node)
+                    if kind == Tok.COMMA:
+                        self.pos += 1
+                        break
+                    self.expect(Tok.RPAREN)
+                    ops.pop()
+                    node = FunctionCall(frame[1], frame[2])
+                else:
+                    frame[2].append(node)
+                    self.expect(Tok.RBRACKET)
+                    if peek_kind() == Tok.LBRACKET:
+                        self.pos += 1
+                        break
+                    ops.pop()
+                    node = ArrayRef(frame[1], frame[2])
+                node.line, node.col = frame[3]
 
-    # ---------------- Relational (>, <, >=, <=) ----------------
-    def parse_relational(self):
-        node = self.parse_additive()
-        while self.peek()[0] in ('GT','LT','GE','LE'):
-            op = self.next()[0]
-            right = self.parse_additive()
-            node = BinaryOp(op, node, right)
-        return node
+    # ---------------- Primary (literals, variables) ----------------
+    def parse_primary(self):
+        kind = self.peek_kind()
 
-    # ---------------- Additive (+, -) ----------------
-    def parse_additive(self):
-        node = self.parse_term()
-        while self.peek()[0] in ('PLUS','MINUS'):
-            op = self.next()[0]
-            right = self.parse_term()
-            node = BinaryOp(op, node, right)
-        return node
-
-    # ---------------- Term (*, /) ----------------
-    def parse_term(self):
-        node = self.parse_factor()
-        while self.peek()[0] in ('MULT','DIV'):
-            op = self.next()[0]
-            right = self.parse_factor()
-            node = BinaryOp(op, node, right)
-        return node
-
-    # ---------------- Factor (literals, variables, parentheses, unary) ----------------
-    def parse_factor(self):
-        tok = self.peek()
-        
         # Number literal
-        if tok[0] == 'NUMBER':
-            self.next()
-            return Number(tok[1])
-        
+        if kind == Tok.NUMBER:
+            return Number(self.expect(Tok.NUMBER))
+
         # String literal
-        if tok[0] == 'STRING_LIT':
-            self.next()
-            return String(tok[1][1:-1])
-        
+        if kind == Tok.STRING_LIT:
+            return String(self.expect(Tok.STRING_LIT)[1:-1])
+
         # Char literal
-        if tok[0] == 'CHAR_LIT':
-            self.next()
-            return Char(tok[1][1])
-        
+        if kind == Tok.CHAR_LIT:
+            return Char(self.expect(Tok.CHAR_LIT)[1])
+
         # Boolean literal
-        if tok[0] in ('TRUE', 'FALSE'):
-            self.next()
-            return Bool(tok[0] == 'TRUE')
-        
-        # Identifier / variable / array
-        if tok[0] == 'ID':
-            self.next()
-            name = tok[1]
-            # Array reference
-            if self.peek()[0] == 'LBRACKET':
-                indices = []
-                while self.peek()[0] == 'LBRACKET':
-                    self.next()
-                    indices.append(self.parse_expr())
-                    self.expect('RBRACKET')
-                return ArrayRef(name, indices)
-            # Postfix unary operators
-            if self.peek()[0] in ('PLUSPLUS','MINUSMINUS'):
-                op_tok = self.next()
-                return UnaryOp(op_tok[0], VarRef(name), postfix=True)
+        if kind in (Tok.TRUE, Tok.FALSE):
+            self.advance()
+            return Bool(kind == Tok.TRUE)
+
+        # Variable, with optional postfix ++ / --
+        if kind == Tok.ID:
+            name = self.expect(Tok.ID)
+            if self.peek_kind() in INCDEC_OPS:
+                op = TOKEN_KINDS[self.advance()]
+                return UnaryOp(op, VarRef(name), postfix=True)
             return VarRef(name)
-        
-        # Parentheses
-        if tok[0] == 'LPAREN':
-            self.next()
-            node = self.parse_expr()
-            self.expect('RPAREN')
-            return node
-        
-        # Prefix unary operators
-        if tok[0] in ('PLUSPLUS','MINUSMINUS'):
-            op_tok = self.next()
-            node = self.parse_factor()
-            return UnaryOp(op_tok[0], node, postfix=False)
-        
+
+        tok = self.peek()
         raise SyntaxError(f"Unexpected token {tok[0]} at line {tok[3]}")
@@ -2,61 +2,97 @@ from .statements import StatementParser
 from .expressions import ExpressionParser
 from .declarations import DeclarationParser
 from ast_nodes import *
+from lexer import TOKEN_KINDS, Tok
+from token_stream import TokenStream, TokenRing
 
 class Parser(StatementParser, ExpressionParser, DeclarationParser):
     def __init__(self, tokens):
-        self.tokens = list(tokens)
+        self.tokens = tokens if isinstance(tokens, (TokenStream, TokenRing)) else TokenStream(tokens)
+        self.kinds = self.tokens.kinds
         self.pos = 0
 
     # ---------------- Token Helpers ----------------
+    # Kinds are compared as Tok.* integer codes; peek()/next() still hand out
+    # (kind, value, offset, line) tuples for error messages and old callers.
     def peek(self):
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else ('EOF','',-1,-1)
+        return self.tokens[self.pos]
+
+    def peek_kind(self, ahead=0):
+        try:
+            return self.kinds[self.pos + ahead]
+        except IndexError:
+            return Tok.EOF
+
+    def advance(self):
+        kind = self.peek_kind()
+        self.pos += 1
+        return kind
 
     def next(self):
         tok = self.peek()
         self.pos += 1
         return tok
 
+    def here(self):
+        """(line, col) of the current token.
+
+        Taken before a construct is parsed: a TokenRing may have dropped its
+        first token by the time the node exists.
+        """
+        return self.tokens.position(self.pos)
+
+    def located(self, node, where):
+        """Give `node` the position `where` (from here()) and return it."""
+        node.line, node.col = where
+        return node
+
     def expect(self, kind):
-        tok = self.peek()
-        if tok[0] != kind:
-            raise SyntaxError(f"Expected {kind} but got {tok[0]} at line {tok[3]}")
-        return self.next()
+        if self.peek_kind() != kind:
+            tok = self.peek()
+            raise SyntaxError(f"Expected {TOKEN_KINDS[kind]} but got {tok[0]} at line {tok[3]}")
+        self.pos += 1
+        return self.tokens.value(self.pos - 1)
 
     # ---------------- Program ----------------
     def parse_program(self):
-        funcs = []
-        while self.peek()[0] != 'EOF':
-            funcs.append(self.parse_function())
-        return Program(funcs)
+        start = self.here()
+        return self.located(Program(list(self.parse_functions())), start)
+
+    def parse_functions(self):
+        """Yield the program's functions one at a time, as they are parsed."""
+        while self.peek_kind() != Tok.EOF:
+            yield self.parse_function()
 
     # ---------------- Function Parsing ----------------
     def parse_function(self):
+        start = self.here()
         # Return type
-        ret_type = self.next()[0]
+        ret_type = TOKEN_KINDS[self.advance()]
         # Function name
-        name = self.expect('ID')[1]
-        self.expect('LPAREN')
+        name = self.expect(Tok.ID)
+        self.expect(Tok.LPAREN)
 
         # --- Parameters ---
         params = []
-        while self.peek()[0] != 'RPAREN':
-            p_type = self.next()[0]
-            p_name = self.expect('ID')[1]
+        while self.peek_kind() != Tok.RPAREN:
+            p_type = TOKEN_KINDS[self.advance()]
+            p_name = self.expect(Tok.ID)
             params.append((p_type, p_name))
-            if self.peek()[0] == 'COMMA':
-                self.next()
-        self.expect('RPAREN')
+            if self.peek_kind() == Tok.COMMA:
+                self.advance()
+        self.expect(Tok.RPAREN)
 
         # --- Function body ---
         body = self.parse_block()
-        return FunctionDecl(name, body, params=params)
+        return self.located(FunctionDecl(name, body, params=params, ret_type=ret_type), start)
 
     # ---------------- Block Parsing ----------------
     def parse_block(self):
-        self.expect('LBRACE')
+        start = self.here()
+        self.expect(Tok.LBRACE)
         stmts = []
-        while self.peek()[0] != 'RBRACE':
-            stmts.append(self.parse_statement())
-        self.expect('RBRACE')
-        return Block(stmts)
+        while self.peek_kind() != Tok.RBRACE:
+            where = self.here()
+            stmts.append(self.located(self.parse_statement(), where))
+        self.expect(Tok.RBRACE)
+        return self.located(Block(stmts), start)
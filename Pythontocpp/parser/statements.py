@@ -1,179 +1,189 @@
 from .expressions import ExpressionParser
 from .declarations import DeclarationParser
 from ast_nodes import *
+from lexer import TOKEN_KINDS, Tok
+
+TYPE_KINDS = frozenset((Tok.INT, Tok.FLOAT, Tok.DOUBLE, Tok.LONG, Tok.CHAR, Tok.STRING, Tok.BOOL))
 
 class StatementParser(ExpressionParser, DeclarationParser):
 
     # ---------------- Statement ----------------
     def parse_statement(self):
-        tok = self.peek()
+        kind = self.peek_kind()
 
         # Variable or array declaration
-        if tok[0] in ('INT','FLOAT','DOUBLE','LONG','CHAR','STRING','BOOL'):
-            nxt = self.tokens[self.pos+2] if self.pos+2 < len(self.tokens) else ('EOF','','',-1)
-            if nxt[0] == 'LBRACKET':
+        if kind in TYPE_KINDS:
+            if self.peek_kind(2) == Tok.LBRACKET:
                 return self.parse_array_decl()
             return self.parse_var_decl()
 
         # Control statements
-        if tok[0] == 'PRINT':
+        if kind == Tok.PRINT:
             return self.parse_print_stmt()
-        if tok[0] == 'RETURN':
+        if kind == Tok.RETURN:
             return self.parse_return_stmt()
-        if tok[0] == 'IF':
+        if kind == Tok.IF:
             return self.parse_if_stmt()
-        if tok[0] == 'WHILE':
+        if kind == Tok.WHILE:
             return self.parse_while_stmt()
-        if tok[0] == 'FOR':
+        if kind == Tok.FOR:
             return self.parse_for_stmt()
-        if tok[0] == 'BREAK':
-            self.next()
-            self.expect('SEMI')
+        if kind == Tok.BREAK:
+            self.advance()
+            self.expect(Tok.SEMI)
             return BreakStmt()
-        if tok[0] == 'CONTINUE':
-            self.next()
-            self.expect('SEMI')
+        if kind == Tok.CONTINUE:
+            self.advance()
+            self.expect(Tok.SEMI)
             return ContinueStmt()
-        if tok[0] == 'SWITCH':
+        if kind == Tok.SWITCH:
             return self.parse_switch_stmt()
 
         # Assignment / expression
-        if tok[0] == 'ID':
-            nxt = self.tokens[self.pos+1] if self.pos+1 < len(self.tokens) else ('EOF','','',-1)
-            if nxt[0] == 'ASSIGN':
+        if kind == Tok.ID:
+            nxt = self.peek_kind(1)
+            if nxt == Tok.ASSIGN:
                 return self.parse_assignment()
-            if nxt[0] == 'LBRACKET':
+            if nxt == Tok.LBRACKET:
                 return self.parse_assignment_array()
-            if nxt[0] in ('PLUSPLUS','MINUSMINUS'):
-                var_tok = self.next()
-                op_tok = self.next()
-                self.expect('SEMI')
-                return UnaryOp(op_tok[0], VarRef(var_tok[1]), postfix=True)
+            if nxt == Tok.PLUSPLUS or nxt == Tok.MINUSMINUS:
+                name = self.expect(Tok.ID)
+                op = TOKEN_KINDS[self.advance()]
+                self.expect(Tok.SEMI)
+                return UnaryOp(op, VarRef(name), postfix=True)
             return self.parse_expr_stmt()
 
         return self.parse_expr_stmt()
 
     # ---------------- Block ----------------
     def parse_block(self):
-        self.expect('LBRACE')
+        start = self.here()
+        self.expect(Tok.LBRACE)
         stmts = []
-        while self.peek()[0] != 'RBRACE':
-            stmts.append(self.parse_statement())
-        self.expect('RBRACE')
-        return Block(stmts)
+        while self.peek_kind() != Tok.RBRACE:
+            where = self.here()
+            stmts.append(self.located(self.parse_statement(), where))
+        self.expect(Tok.RBRACE)
+        return self.located(Block(stmts), start)
 
     # ---------------- Print/Return ----------------
     def parse_print_stmt(self):
-        self.expect('PRINT')
-        self.expect('LPAREN')
+        self.expect(Tok.PRINT)
+        self.expect(Tok.LPAREN)
         expr = self.parse_expr()
-        self.expect('RPAREN')
-        self.expect('SEMI')
+        self.expect(Tok.RPAREN)
+        self.expect(Tok.SEMI)
         return PrintStmt(expr)
 
     def parse_return_stmt(self):
-        self.expect('RETURN')
+        self.expect(Tok.RETURN)
         expr = self.parse_expr()
-        self.expect('SEMI')
+        self.expect(Tok.SEMI)
         return ReturnStmt(expr)
 
     # ---------------- Control Flow ----------------
     def parse_if_stmt(self):
-        self.expect('IF')
-        self.expect('LPAREN')
+        self.expect(Tok.IF)
+        self.expect(Tok.LPAREN)
         cond = self.parse_expr()
-        self.expect('RPAREN')
+        self.expect(Tok.RPAREN)
         then_block = self.parse_block()
 
         else_block = None
-        if self.peek()[0] == 'ELSE':
-            self.next()
-            if self.peek()[0] == 'IF':
-                else_block = Block([self.parse_if_stmt()])  # else-if chain
+        if self.peek_kind() == Tok.ELSE:
+            self.advance()
+            if self.peek_kind() == Tok.IF:
+                where = self.here()
+                else_block = self.located(Block([self.located(self.parse_if_stmt(), where)]), where)  # else-if chain
             else:
                 else_block = self.parse_block()
         return IfStmt(cond, then_block, else_block)
 
     def parse_while_stmt(self):
-        self.expect('WHILE')
-        self.expect('LPAREN')
+        self.expect(Tok.WHILE)
+        self.expect(Tok.LPAREN)
         cond = self.parse_expr()
-        self.expect('RPAREN')
+        self.expect(Tok.RPAREN)
         body = self.parse_block()
         return WhileStmt(cond, body)
 
     # ---------------- For loop ----------------
     def parse_for_stmt(self):
-        self.expect('FOR')
-        self.expect('LPAREN')
+        self.expect(Tok.FOR)
+        self.expect(Tok.LPAREN)
 
         # Initialization
-        if self.peek()[0] in ('INT','FLOAT','DOUBLE','LONG','CHAR','STRING','BOOL'):
-            init = self.parse_var_decl()
-        elif self.peek()[0] != 'SEMI':
-            init = self.parse_assignment_no_semi()
-            self.expect('SEMI')
+        where = self.here()
+        if self.peek_kind() in TYPE_KINDS:
+            init = self.located(self.parse_var_decl(), where)
+        elif self.peek_kind() != Tok.SEMI:
+            init = self.located(self.parse_assignment_no_semi(), where)
+            self.expect(Tok.SEMI)
         else:
             init = None
-            self.next()
+            self.advance()
 
         # Condition
-        if self.peek()[0] != 'SEMI':
+        if self.peek_kind() != Tok.SEMI:
             cond = self.parse_expr()
         else:
             cond = None
-        self.expect('SEMI')
+        self.expect(Tok.SEMI)
 
         # Update
-        if self.peek()[0] != 'RPAREN':
-            tok = self.peek()
-            if tok[0] == 'ID' and self.tokens[self.pos+1][0] == 'ASSIGN':
-                update = self.parse_assignment_no_semi()
+        if self.peek_kind() != Tok.RPAREN:
+            if self.peek_kind() == Tok.ID and self.peek_kind(1) == Tok.ASSIGN:
+                where = self.here()
+                update = self.located(self.parse_assignment_no_semi(), where)
             else:
                 update = self.parse_expr()
         else:
             update = None
 
-        self.expect('RPAREN')
+        self.expect(Tok.RPAREN)
         body = self.parse_block()
         return ForStmt(init, cond, update, body)
 
     # ---------------- Expression Statement ----------------
     def parse_expr_stmt(self):
         expr = self.parse_expr()
-        self.expect('SEMI')
+        self.expect(Tok.SEMI)
         return ExprStmt(expr)
 
     # ---------------- Switch Statement ----------------
     def parse_switch_stmt(self):
-        self.expect('SWITCH')
-        self.expect('LPAREN')
+        self.expect(Tok.SWITCH)
+        self.expect(Tok.LPAREN)
         expr = self.parse_expr()
-        self.expect('RPAREN')
-        self.expect('LBRACE')
+        self.expect(Tok.RPAREN)
+        self.expect(Tok.LBRACE)
 
         cases = []
         default_case = None
 
-        while self.peek()[0] != 'RBRACE':
-            tok = self.peek()
-            if tok[0] == 'CASE':
-                self.next()
+        while self.peek_kind() != Tok.RBRACE:
+            kind = self.peek_kind()
+            start = self.here()
+            if kind == Tok.CASE:
+                self.advance()
                 value = self.parse_expr()
-                self.expect('COLON')
+                self.expect(Tok.COLON)
                 stmts = []
-                while self.peek()[0] not in ('CASE','DEFAULT','RBRACE'):
-                    stmts.append(self.parse_statement())
-                cases.append(CaseStmt(value, Block(stmts)))
-            elif tok[0] == 'DEFAULT':
-                self.next()
-                self.expect('COLON')
+                while self.peek_kind() not in (Tok.CASE, Tok.DEFAULT, Tok.RBRACE):
+                    where = self.here()
+                    stmts.append(self.located(self.parse_statement(), where))
+                cases.append(self.located(CaseStmt(value, self.located(Block(stmts), start)), start))
+            elif kind == Tok.DEFAULT:
+                self.advance()
+                self.expect(Tok.COLON)
                 stmts = []
-                while self.peek()[0] != 'RBRACE':
-                    stmts.append(self.parse_statement())
-                default_case = DefaultStmt(Block(stmts))
+                while self.peek_kind() != Tok.RBRACE:
+                    where = self.here()
+                    stmts.append(self.located(self.parse_statement(), where))
+                default_case = self.located(DefaultStmt(self.located(Block(stmts), start)), start)
             else:
+                tok = self.peek()
                 raise SyntaxError(f"Unexpected token {tok[0]} in switch at line {tok[3]}")
 
-        self.expect('RBRACE')
+        self.expect(Tok.RBRACE)
         return SwitchStmt(expr, cases, default_case)
@@ -0,0 +1,211 @@
+from contextlib import contextmanager
+from ast_nodes import *
+from limits import deep_recursion
+
+# Name resolution, run once after parsing.
+#
+# Every parameter and local of a function gets a fixed index into that
+# function's frame, a plain list the interpreter allocates per call, and the
+# index is stored on the nodes that use the name: VarDecl, ArrayDecl,
+# Assignment (to a plain variable), VarRef and ArrayRef all get `slot`, and
+# FunctionDecl gets `frame_size`.  Scoping follows C: parameters live in the
+# function body's scope, every block opens a scope, a for statement's init
+# declaration is scoped to the loop, and an inner scope may shadow an outer
+# name.  Scopes that are closed hand their slots back, so sibling blocks
+# share frame space.  Using an undeclared name or declaring a name twice in
+# one scope is a CompileError, reported before anything runs, and so is a
+# `break` outside a loop or switch or a `continue` outside a loop.
+#
+# This pass, like the type checker and the optimizer, recurses once per
+# level of nesting; all three run under nesting_guard().
+
+CONSTANT_NAMES = frozenset(('TRUE', 'FALSE'))   # VarRefs the interpreter answers itself
+
+class CompileError(Exception):
+    def __init__(self, message, node=None):
+        self.message = message
+        self.line = getattr(node, 'line', None)
+        self.col = getattr(node, 'col', None)
+        if self.line is not None:
+            message = f"{message} at line {self.line}, col {self.col}"
+        super().__init__(message)
+
+@contextmanager
+def nesting_guard():
+    """Run a pass over the AST under the engines' raised recursion limit (see
+    limits.py); a program nested deeper than that is a CompileError."""
+    with deep_recursion():
+        try:
+            yield
+        except RecursionError:
+            raise CompileError("Program nested too deeply") from None
+
+def case_value(expr):
+    """The value of a literal case label, or raise CompileError."""
+    if isinstance(expr, (Number, Char, String)):
+        return expr.value
+    if isinstance(expr, UnaryOp) and expr.op == 'MINUS' and isinstance(expr.operand, Number):
+        return -expr.operand.value
+    raise CompileError("case value must be a constant", expr)
+
+class Resolver:
+    def __init__(self):
+        self.scopes = []       # name -> slot, innermost last
+        self.next_slot = 0
+        self.frame_size = 0
+        self.targets = []      # enclosing loops and switches, innermost last
+
+    # ---------------- Scopes ----------------
+    def declare(self, name, node):
+        scope = self.scopes[-1]
+        if name in scope:
+            raise CompileError(f"Variable '{name}' redeclared", node)
+        slot = scope[name] = self.next_slot
+        self.next_slot += 1
+        self.frame_size = max(self.frame_size, self.next_slot)
+        return slot
+
+    def lookup(self, name, node):
+        for scope in reversed(self.scopes):
+            slot = scope.get(name)
+            if slot is not None:
+                return slot
+        if name in CONSTANT_NAMES:
+            return None
+        raise CompileError(f"Variable '{name}' not declared", node)
+
+    def scoped(self, visit, node):
+        """Run `visit(node)` in a new scope and give its slots back afterwards."""
+        first = self.next_slot
+        self.scopes.append({})
+        try:
+            visit(node)
+        finally:
+            self.scopes.pop()
+            self.next_slot = first
+
+    # ---------------- Functions ----------------
+    def resolve_function(self, fn):
+        self.scopes = [{}]
+        self.targets = []
+        self.next_slot = self.frame_size = 0
+        for _, name in fn.params:
+            self.declare(name, fn)
+        # the body's statements share the parameters' scope
+        self.statements(fn.body)
+        fn.frame_size = self.frame_size
+
+    # ---------------- Statements ----------------
+    def statements(self, block):
+        for stmt in block.stmts:
+            self.stmt(stmt)
+
+    def block(self, block):
+        if block is not None:
+            self.scoped(self.statements, block)
+
+    def stmt(self, stmt):
+        if stmt is None:
+            return
+        getattr(self, 'stmt_' + type(stmt).__name__, self.expr)(stmt)
+
+    def stmt_VarDecl(self, stmt):
+        # the initializer cannot see the variable it initializes
+        self.expr(stmt.init)
+        stmt.slot = self.declare(stmt.name, stmt)
+
+    def stmt_ArrayDecl(self, stmt):
+        stmt.slot = self.declare(stmt.name, stmt)
+
+    def stmt_Assignment(self, stmt):
+        self.expr(stmt.expr)
+        if isinstance(stmt.name, ArrayRef):
+            self.expr(stmt.name)
+        else:
+            stmt.slot = self.lookup(stmt.name, stmt)
+
+    def stmt_PrintStmt(self, stmt):
+        self.expr(stmt.expr)
+
+    stmt_ReturnStmt = stmt_ExprStmt = stmt_PrintStmt
+
+    def stmt_Block(self, stmt):
+        self.block(stmt)
+
+    def stmt_IfStmt(self, stmt):
+        self.expr(stmt.cond)
+        self.block(stmt.then_block)
+        self.block(stmt.else_block)
+
+    def stmt_WhileStmt(self, stmt):
+        self.expr(stmt.cond)
+        self.target(stmt, self.block, stmt.body)
+
+    def stmt_ForStmt(self, stmt):
+        self.scoped(self._for, stmt)
+
+    def _for(self, stmt):
+        self.stmt(stmt.init)
+        self.expr(stmt.cond)
+        self.stmt(stmt.update)
+        self.target(stmt, self.block, stmt.body)
+
+    def stmt_SwitchStmt(self, stmt):
+        self.expr(stmt.expr)
+        self.target(stmt, self._cases, stmt)
+
+    def _cases(self, stmt):
+        for case in stmt.cases:
+            self.expr(case.value)
+            self.block(case.body)
+        if stmt.default is not None:
+            self.block(stmt.default.body)
+
+    def target(self, stmt, visit, node):
+        """Run `visit(node)` with `stmt` as the innermost loop or switch."""
+        self.targets.append(stmt)
+        try:
+            visit(node)
+        finally:
+            self.targets.pop()
+
+    def stmt_BreakStmt(self, stmt):
+        if not self.targets:
+            raise CompileError("break outside a loop or switch", stmt)
+
+    def stmt_ContinueStmt(self, stmt):
+        if not any(isinstance(target, (WhileStmt, ForStmt)) for target in self.targets):
+            raise CompileError("continue outside a loop", stmt)
+
+    # ---------------- Expressions ----------------
+    def expr(self, expr):
+        if isinstance(expr, VarRef):
+            expr.slot = self.lookup(expr.name, expr)
+        elif isinstance(expr, ArrayRef):
+            expr.slot = self.lookup(expr.name, expr)
+            for index in expr.indices:
+                self.expr(index)
+        elif isinstance(expr, BinaryOp):
+            self.expr(expr.left)
+            self.expr(expr.right)
+        elif isinstance(expr, UnaryOp):
+            self.expr(expr.operand)
+        elif isinstance(expr, FunctionCall):
+            for arg in expr.args:
+                self.expr(arg)
+
+def resolve_function(fn):
+    with nesting_guard():
+        Resolver().resolve_function(fn)
+    return fn
+
+def resolve(program):
+    """Resolve every function of `program` in place and return it."""
+    resolver = Resolver()
+    with nesting_guard():
+        for fn in program.functions:
+            resolver.resolve_function(fn)
+    return program
+
+def is_resolved(program):
+    return all(fn.frame_size is not None for fn in program.functions)
@@ -3,11 +3,17 @@ from fastapi import FastAPI
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from typing import List, Optional
+from collections import OrderedDict
 from compiler import compile_and_run as original_compile_and_run  # your existing compiler function
+from compiler import program_cache, ENGINES
 import uvicorn
 import os
 import io
 import sys
+import time
+import threading
+from incremental import Document
 
 app = FastAPI()
 
@@ -22,15 +28,16 @@ def get_index():
         return f.read()
 
 # ---------------- Capture output ----------------
-def compile_and_run_capture_output(source_code):
+def compile_and_run_capture_output(source_code, engine='tree', memo=None):
     """
     Runs the compiler and captures all print statements as a string.
     Ignores the return value of the program.
+    `memo` is passed on to compile_and_run.
     """
     old_stdout = sys.stdout
     sys.stdout = buffer = io.StringIO()
     try:
-        _ = original_compile_and_run(source_code)  # ignore return value
+        _ = original_compile_and_run(source_code, engine=engine, memo=memo)  # ignore return value
         printed_output = buffer.getvalue()
         return printed_output  # only prints, no return value appended
     finally:
@@ -39,15 +46,92 @@ def compile_and_run_capture_output(source_code):
 # ---------------- API to run code ----------------
 class CodeRequest(BaseModel):
     code: str
+    backend: str = 'tree'           # any engine in compiler.ENGINES, e.g. 'native'
+    memo: bool = False              # memoise pure functions; the reply then has their table counts
 
 @app.post("/run")
 def run_code(req: CodeRequest):
+    if req.backend not in ENGINES:
+        return JSONResponse(content={"error": f"Unknown backend {req.backend}; choose from {', '.join(sorted(ENGINES))}"})
     try:
-        output = compile_and_run_capture_output(req.code)
+        memo = {} if req.memo else None
+        output = compile_and_run_capture_output(req.code, req.backend, memo)
+        if memo is not None:
+            return JSONResponse(content={"output": output, "memo": memo})
         return JSONResponse(content={"output": output})
     except Exception as e:
         return JSONResponse(content={"error": str(e)})
 
+# ---------------- Compile cache statistics ----------------
+@app.get("/stats")
+def cache_stats():
+    return JSONResponse(content={"compile_cache": program_cache.stats()})
+
+# ---------------- API for live diagnostics ----------------
+class Edit(BaseModel):
+    start: int
+    end: int
+    text: str
+
+class CheckRequest(BaseModel):
+    doc_id: str
+    code: Optional[str] = None      # full text: opens (or resets) the document
+    edits: List[Edit] = []          # applied in order after `code`; offsets count code points
+    seq: Optional[int] = None       # grows with every request for doc_id; older ones are rejected
+
+class OpenDocument:
+    """A Document edited through /check, with the lock its requests take
+    and the `seq` of the last request applied to it."""
+    def __init__(self):
+        self.doc = None
+        self.lock = threading.Lock()
+        self.seq = None
+
+MAX_DOCUMENTS = 256
+documents = OrderedDict()           # doc_id -> OpenDocument
+documents_lock = threading.Lock()   # /check runs in the threadpool
+
+@app.post("/check")
+def check_code(req: CheckRequest):
+    started = time.perf_counter()
+    with documents_lock:
+        entry = documents.get(req.doc_id)
+        if entry is None:
+            if req.code is None:
+                return JSONResponse(content={"error": f"Unknown document {req.doc_id}; send its code first"})
+            entry = documents[req.doc_id] = OpenDocument()
+        documents.move_to_end(req.doc_id)
+        while len(documents) > MAX_DOCUMENTS:
+            documents.popitem(last=False)
+
+    with entry.lock:
+        if req.seq is not None and entry.seq is not None and req.seq <= entry.seq:
+            # the edits were made against an older text than the document's
+            return JSONResponse(content={"error": f"Stale request {req.seq} for {req.doc_id}; {entry.seq} is applied",
+                                         "stale": True})
+        try:
+            if req.code is not None:
+                entry.doc = Document(req.code)
+            doc = entry.doc
+            if doc is None:
+                # opened by a request that has not set its code yet
+                raise ValueError(f"Unknown document {req.doc_id}; send its code first")
+            for edit in req.edits:
+                doc.apply(edit.start, edit.end, edit.text)
+            entry.seq = req.seq
+            return JSONResponse(content={
+                "diagnostics": doc.diagnostics(),
+                "length": len(doc.text),
+                "relexed": doc.relexed,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+            })
+        except Exception as e:
+            # a bad edit leaves the document in an unknown state; make the client resend it
+            with documents_lock:
+                if documents.get(req.doc_id) is entry:
+                    del documents[req.doc_id]
+            return JSONResponse(content={"error": str(e)})
+
 # ---------------- Run the server ----------------
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
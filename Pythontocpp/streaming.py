@@ -0,0 +1,39 @@
+import mmap
+from contextlib import contextmanager
+from lexer import tokenize_batches
+from token_stream import TokenRing
+from parser.parser_functions import ParserWithParams
+
+# Streaming front end for very large source files.
+#
+# The file is memory-mapped and lexed in place in bytes mode, one window at a
+# time, and the parser reads the token generator through a TokenRing, so
+# neither the source text nor the token list is ever held in full: resident
+# memory is a lexer window, a few tokens of lookahead and the function being
+# parsed.  (Running the program still keeps every function's AST.)
+
+@contextmanager
+def map_source(path):
+    """Map `path` read-only; empty files give b'' since they cannot be mapped."""
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def tokenize_buffer(buffer):
+    """Yield (kind, value, offset, line) tokens of a UTF-8 buffer, ending with EOF."""
+    offset, line = 0, 1
+    for kinds, values, offsets, lines in tokenize_batches(buffer):
+        yield from zip(kinds, values, offsets, lines)
+        offset, line = offsets[-1], lines[-1]
+    # newlines from the last token's start (it may be a multi-line string) to the end
+    line += buffer[offset:].count(b'\n')
+    yield ('EOF', '', len(buffer), line)
+
+def parse_file(path, ring_size=8):
+    """Yield the FunctionDecls of the source file at `path` one at a time."""
+    with map_source(path) as buffer:
+        parser = ParserWithParams(TokenRing(tokenize_buffer(buffer), ring_size, buffer))
+        yield from parser.parse_functions()
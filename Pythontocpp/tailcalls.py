@@ -0,0 +1,136 @@
+from ast_nodes import *
+from optimizer import Pass, has_effects, located
+
+# Tail-call elimination, run by optimizer.optimize at -O2 before inlining.
+#
+# A function returning a call to itself from its tail, as in
+#
+#   int gcd(int a, int b) { if (b == 0) { return a; } return gcd(b, a % b); }
+#
+# has its body put in a `while (1)` loop, and each such `return f(...)` in
+# a tail becomes assignments of the arguments to the parameters: control
+# then falls off the end of the loop body and starts the function again,
+# without a call.  A tail is the last statement of the body, or the tail of
+# either branch of an if/else that is; a statement following an if whose
+# branch always returns is first moved into its else branch.  Every path
+# through the body must end in a return, since falling off the end would
+# now run the body again.  Each argument sees the old parameter values: a
+# parameter no other argument reads is assigned directly (when the
+# arguments call nothing and at most one can fail or change anything, so
+# their order cannot matter), the rest go through new variables first.
+# Tail calls to other functions are left alone.
+
+def _ends(stmts):
+    """Whether every path through `stmts` ends in a return."""
+    if not stmts:
+        return False
+    last = stmts[-1]
+    if isinstance(last, ReturnStmt):
+        return True
+    return (isinstance(last, IfStmt) and last.else_block is not None
+            and _ends(last.then_block.stmts) and _ends(last.else_block.stmts))
+
+def _reads(expr, slot):
+    return any(isinstance(node, VarRef) and node.slot == slot for node in walk(expr))
+
+def _reorderable(args):
+    """Whether `args` may be evaluated in any order: none calls anything and
+    at most one can fail or change anything."""
+    fallible = 0
+    for arg in args:
+        nodes = list(walk(arg))
+        if any(isinstance(node, (FunctionCall, MethodCall)) for node in nodes):
+            return False
+        fallible += any(has_effects(node) for node in nodes)
+    return fallible <= 1
+
+class TailCalls(Pass):
+    def optimize(self, program):
+        for fn in program.functions:
+            self.function(fn)
+        return program
+
+    def function(self, fn):
+        self.fn = fn
+        if not any(self.is_tail_call(node) for node in walk(fn.body)):
+            return
+        stmts = self.normalize(fn.body.stmts)
+        if not _ends(stmts) or not self.has_tail_call(stmts):
+            return
+        fn.body.stmts = stmts
+        self.replace_tail_calls(stmts)
+        loop = located(WhileStmt(located(Number(1), fn), located(Block(fn.body.stmts), fn.body)), fn)
+        fn.body.stmts = [loop]
+
+    def is_tail_call(self, stmt):
+        call = getattr(stmt, 'expr', None) if isinstance(stmt, ReturnStmt) else None
+        return (isinstance(call, FunctionCall) and call.name == self.fn.name
+                and len(call.args) == len(self.fn.params))
+
+    # ---------------- Tails ----------------
+    def normalize(self, stmts):
+        """`stmts` with what follows an if whose then branch always returns
+        moved into its (missing) else branch, in every tail."""
+        for i, stmt in enumerate(stmts):
+            if (isinstance(stmt, IfStmt) and stmt.else_block is None and i + 1 < len(stmts)
+                    and _ends(stmt.then_block.stmts)):
+                stmt.else_block = located(Block(stmts[i + 1:]), stmts[i + 1])
+                stmts = stmts[:i + 1]
+                break
+        last = stmts[-1] if stmts else None
+        if isinstance(last, IfStmt):
+            last.then_block.stmts = self.normalize(last.then_block.stmts)
+            if last.else_block is not None:
+                last.else_block.stmts = self.normalize(last.else_block.stmts)
+        return stmts
+
+    def has_tail_call(self, stmts):
+        last = stmts[-1]
+        if isinstance(last, IfStmt):
+            return self.has_tail_call(last.then_block.stmts) or self.has_tail_call(last.else_block.stmts)
+        return self.is_tail_call(last)
+
+    def replace_tail_calls(self, stmts):
+        last = stmts[-1]
+        if isinstance(last, IfStmt):
+            self.replace_tail_calls(last.then_block.stmts)
+            self.replace_tail_calls(last.else_block.stmts)
+        elif self.is_tail_call(last):
+            stmts[-1:] = self.rebind(last)
+            self.note(last, f"turned the tail call to {self.fn.name}() into a jump")
+
+    def rebind(self, ret):
+        """Statements giving the parameters the values of `ret`'s call's arguments."""
+        pending = [(slot, name, vtype, arg) for slot, ((vtype, name), arg)
+                   in enumerate(zip(self.fn.params, ret.expr.args))
+                   if not (isinstance(arg, VarRef) and arg.slot == slot)]     # passed on unchanged
+        direct = []
+        if _reorderable([arg for _, _, _, arg in pending]):
+            # assign a parameter directly once no other argument reads it
+            while pending:
+                ready = next((item for item in pending
+                              if not any(_reads(other, item[0]) for _, _, _, other in pending if other is not item[3])),
+                             None)
+                if ready is None:
+                    break
+                pending.remove(ready)
+                direct.append(self.assign(ready[0], ready[1], ready[3], ret))
+        evaluate, assign = [], []
+        for slot, name, vtype, arg in pending:
+            value = located(VarDecl(vtype, f"{name}_next", arg), arg)
+            value.slot = self.fn.frame_size
+            self.fn.frame_size += 1
+            evaluate.append(value)
+            ref = located(VarRef(value.name), arg)
+            ref.slot = value.slot
+            assign.append(self.assign(slot, name, ref, ret))
+        return direct + evaluate + assign
+
+    def assign(self, slot, name, value, where):
+        param = located(Assignment(name, value), where)
+        param.slot = slot
+        return param
+
+def eliminate_tail_calls(program, report=None):
+    """Turn self tail calls in a resolved `program` into loops, in place, and return it."""
+    return TailCalls(report).optimize(program)
@@ -0,0 +1,105 @@
+# The on-disk __ppcache__: the flat AST format, and when a cache file is
+# used, rewritten or ignored.
+import glob
+import os
+
+import pytest
+
+import ast_cache
+from ast_nodes import walk
+from compiler import load_file, parse_source_file, run_program
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROGRAMS = sorted(glob.glob(os.path.join(HERE, '..', 'benchmarks', 'programs', '*.cpp')))
+
+SOURCE = "int twice(int x) { return x * 2; }\nint main() { print(\"hi\"); return twice(21); }\n"
+
+class Parses:
+    """parse_source_file, counting its calls."""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        return parse_source_file(path)
+
+def positions(program):
+    return [(type(node).__name__, node.line, node.col) for node in walk(program)]
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'prog.cpp'
+    path.write_text(SOURCE, encoding='utf-8')
+    return str(path)
+
+@pytest.mark.parametrize('path', PROGRAMS, ids=os.path.basename)
+def test_round_trip(path):
+    program = parse_source_file(path)
+    copy = ast_cache.loads(ast_cache.dumps(program))
+    assert ast_cache.dumps(copy) == ast_cache.dumps(program)
+    assert positions(copy) == positions(program)
+
+def test_reused_while_unchanged(source):
+    parse = Parses()
+    first = ast_cache.load_or_parse(source, parse)
+    assert os.path.exists(ast_cache.cache_path(source))
+    second = ast_cache.load_or_parse(source, parse)
+    assert parse.calls == 1
+    assert ast_cache.dumps(second) == ast_cache.dumps(first)
+
+def test_touched_but_same_content(source):
+    parse = Parses()
+    ast_cache.load_or_parse(source, parse)
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    ast_cache.load_or_parse(source, parse)
+    assert parse.calls == 1
+
+def test_edited_source(source):
+    parse = Parses()
+    ast_cache.load_or_parse(source, parse)
+    st = os.stat(source)
+    # an edit of the same size, so the hash has to tell
+    with open(source, 'w', encoding='utf-8') as f:
+        f.write(SOURCE.replace('21', '12'))
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    program = ast_cache.load_or_parse(source, parse)
+    assert parse.calls == 2
+    assert program.functions[1].body.stmts[1].expr.args[0].value == 12
+    ast_cache.load_or_parse(source, parse)
+    assert parse.calls == 2
+
+@pytest.mark.parametrize('damage', ('truncate', 'magic', 'fingerprint', 'payload'))
+def test_invalid_files_are_ignored(source, damage, monkeypatch):
+    parse = Parses()
+    ast_cache.load_or_parse(source, parse)
+    path = ast_cache.cache_path(source)
+    with open(path, 'rb') as f:
+        data = f.read()
+    if damage == 'truncate':
+        data = data[:ast_cache._HEADER.size - 1]
+    elif damage == 'magic':
+        data = b'XXXX' + data[4:]
+    elif damage == 'payload':
+        data = data[:ast_cache._HEADER.size] + b'\0' * 8
+    else:
+        monkeypatch.setattr(ast_cache, 'BUILD_FINGERPRINT', bytes(16))
+    with open(path, 'wb') as f:
+        f.write(data)
+    assert ast_cache.load(source) is None
+    ast_cache.load_or_parse(source, parse)
+    assert parse.calls == 2
+    assert ast_cache.load(source) is not None
+
+def test_changed_while_parsing(source):
+    parsed_stat = os.stat(source)
+    program = parse_source_file(source)
+    with open(source, 'a', encoding='utf-8') as f:
+        f.write('\n')
+    ast_cache.store(source, program, parsed_stat)
+    assert not os.path.exists(ast_cache.cache_path(source))
+
+def test_load_file(source, capsys):
+    results = [run_program(load_file(source, use_cache), 'tree') for use_cache in (True, True, False)]
+    assert results == [42, 42, 42]
+    assert capsys.readouterr().out == "hi\n" * 3
@@ -0,0 +1,86 @@
+# The in-memory LRU cache of parsed programs: hits and misses, eviction by
+# count and by source size, variants, failed compiles and invalidation when
+# the compiler version changes.
+import pytest
+
+import compile_cache
+import compiler
+from compile_cache import CompileCache
+
+class Compiles:
+    """A compile function that records the sources it was called with."""
+    def __init__(self):
+        self.sources = []
+
+    def __call__(self, source):
+        self.sources.append(source)
+        return f"program of {source}"
+
+def test_hits_and_misses():
+    cache, compile = CompileCache(), Compiles()
+    assert cache.get_or_compile('a', compile) == "program of a"
+    assert cache.get_or_compile('a', compile) == "program of a"
+    assert cache.get_or_compile('b', compile) == "program of b"
+    assert compile.sources == ['a', 'b']
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['source_bytes']) == (1, 2, 2, 2)
+    assert stats['hit_rate'] == 1 / 3
+
+def test_variants_are_separate():
+    cache, compile = CompileCache(), Compiles()
+    for variant in ('O0', 'O2', 'O0'):
+        cache.get_or_compile('a', compile, variant)
+    assert compile.sources == ['a', 'a']
+
+def test_least_recently_used_goes_first():
+    cache, compile = CompileCache(max_entries=2), Compiles()
+    for source in ('a', 'b', 'a', 'c', 'a', 'b'):
+        cache.get_or_compile(source, compile)
+    # 'b' was evicted by 'c', then 'c' by 'b'; 'a' stayed in use
+    assert compile.sources == ['a', 'b', 'c', 'b']
+    assert cache.stats()['evictions'] == 2
+
+def test_evicted_by_source_size():
+    cache, compile = CompileCache(max_source_bytes=10), Compiles()
+    for source in ('aaaa', 'bbbb', 'cccc', 'x' * 11, 'cccc', 'aaaa'):
+        cache.get_or_compile(source, compile)
+    # 'x' * 11 alone is over the limit and is never stored
+    assert compile.sources == ['aaaa', 'bbbb', 'cccc', 'x' * 11, 'aaaa']
+    assert cache.stats()['source_bytes'] == 8
+
+def test_failed_compiles_are_not_cached():
+    cache = CompileCache()
+    calls = []
+
+    def failing(source):
+        calls.append(source)
+        raise SyntaxError("bad")
+
+    for _ in range(2):
+        with pytest.raises(SyntaxError):
+            cache.get_or_compile('a', failing)
+    assert calls == ['a', 'a'] and cache.stats()['entries'] == 0
+
+def test_new_compiler_version(monkeypatch):
+    cache, compile = CompileCache(), Compiles()
+    cache.get_or_compile('a', compile)
+    monkeypatch.setattr(compile_cache, 'COMPILER_VERSION', compile_cache.COMPILER_VERSION + '.1')
+    cache.get_or_compile('a', compile)
+    assert compile.sources == ['a', 'a']
+
+def test_clear():
+    cache, compile = CompileCache(), Compiles()
+    cache.get_or_compile('a', compile)
+    cache.clear()
+    cache.get_or_compile('a', compile)
+    assert compile.sources == ['a', 'a'] and cache.stats()['source_bytes'] == 1
+
+def test_compile_and_run(monkeypatch):
+    cache = CompileCache()
+    monkeypatch.setattr(compiler, 'program_cache', cache)
+    source = "int main() { return 6 * 7; }"
+    results = [compiler.compile_and_run(source, opt_level=level) for level in (0, 2, 0, 2)]
+    report = []
+    results.append(compiler.compile_and_run(source, report=report))
+    assert results == [42] * 5
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (2, 2)
@@ -0,0 +1,307 @@
+# Differential tests: every engine at every optimization level against the
+# tree walker at -O0, on the benchmark programs, generated programs and
+# small programs aimed at control flow, tail calls and runtime errors.
+# Both the output and the result (or the error) must agree.  Programs that
+# overflow 64-bit ints are checked on the native engine against its own -O0,
+# and the MEMO_CASES run memoised, also comparing the memo table stats.
+import contextlib
+import glob
+import io
+import os
+import shutil
+import sys
+
+import pytest
+
+from compiler import ENGINES, compile_source, run_program
+from interpreter.interpreter import RuntimeErrorWithLine
+from limits import MAX_CALL_DEPTH
+from optimizer import OPTIMIZATION_LEVELS
+from transpile import native
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCHMARKS = os.path.join(HERE, '..', 'benchmarks')
+sys.path.insert(0, BENCHMARKS)
+from program_gen import DEFAULT_MIX, generate_program
+
+CASES = {
+    'break_continue': """
+        int main() {
+            int total = 0;
+            int i = 0;
+            for (i = 0; i < 20; i++) {
+                if (i % 3 == 0) { continue; }
+                if (i == 17) { break; }
+                int j = 0;
+                while (1) {
+                    j++;
+                    if (j > i) { break; }
+                    if (j % 2 == 0) { continue; }
+                    total = total + j;
+                }
+            }
+            print(total);
+            return i;
+        }""",
+    'switch': """
+        int classify(int n) {
+            int r = 0;
+            switch (n % 5) {
+                case 0:
+                    r = 10;
+                case 1:
+                    r = r + 1;
+                    break;
+                case 3:
+                    return 30;
+                default:
+                    r = -1;
+            }
+            return r;
+        }
+        int main() {
+            int total = 0;
+            int i = 0;
+            for (i = -6; i < 12; i++) {
+                int c = classify(i);
+                print(c);
+                total = total * 3 + c;
+                if (c == 30) { continue; }
+                switch (c) { case 11: break; default: total++; }
+            }
+            return total;
+        }""",
+    'tail_calls': f"""
+        int sum(int n, int acc) {{
+            if (n == 0) {{ return acc; }}
+            return sum(n - 1, acc + n);
+        }}
+        int even(int n) {{
+            if (n == 0) {{ return 1; }}
+            return odd(n - 1);
+        }}
+        int odd(int n) {{
+            if (n == 0) {{ return 0; }}
+            return even(n - 1);
+        }}
+        int main() {{
+            print(sum({MAX_CALL_DEPTH - 10}, 0));
+            print(even(101));
+            return sum(100, 7);
+        }}""",
+    'inlining': """
+        int square(int x) { return x * x; }
+        int clamp(int v, int hi) { if (v > hi) { v = hi; } return v; }
+        int show(int v) { print(v); return v; }
+        int main() {
+            int a[3];
+            int i = 0;
+            int total = 0;
+            for (i = 0; i < 3; i++) { a[i] = square(i + 1); }
+            total = clamp(a[2], 5) + square(show(a[1])) + show(total);
+            print(clamp(total, 100));
+            return total;
+        }""",
+    'hoist_from_empty_loop': """
+        int main() {
+            int v[2];
+            v[0] = 4000000000;
+            v[1] = 0;
+            int a = v[0];
+            int n = v[1];
+            int s = 0;
+            int i = 0;
+            for (i = 0; i < n; i++) { s = s + a * a; }
+            while (i < n) { s = s - a * a; i++; }
+            print(s);
+            return s + 1;
+        }""",
+    'floats_and_strings': """
+        int main() {
+            double x = 7.0 / 2;
+            string s = "ab";
+            char c = 'z';
+            int i = 0;
+            for (i = 0; i < 3; i++) { s = s + c; }
+            print(x);
+            print(-7 / 2);
+            print(-7 % 3);
+            print(7 % -3);
+            print(s);
+            return s == "abzzz";
+        }""",
+    'division_by_zero': """
+        int main() {
+            int zero = 0;
+            print(1);
+            return 10 / zero;
+        }""",
+    'index_out_of_bounds': """
+        int main() {
+            int a[4];
+            int i = 0;
+            for (i = 0; i < 5; i++) { a[i] = i; print(a[i]); }
+            return 0;
+        }""",
+    'stack_overflow': """
+        int down(int n) { return down(n + 1) + 1; }
+        int main() { print(1); return down(0); }""",
+}
+
+# Programs whose ints outgrow 64 bits, which the native engine stops with
+# "integer overflow"; at every level it must fail as it does at -O0.
+OVERFLOWS = {
+    'overflow_mul': """
+        int fact(int n) {
+            if (n <= 1) { return 1; }
+            return n * fact(n - 1);
+        }
+        int main() {
+            print(fact(20));
+            print(fact(25));
+            return 0;
+        }""",
+    'overflow_step': """
+        int main() {
+            int big[1];
+            big[0] = 9223372036854775807;
+            int x = big[0] - 1;
+            x++;
+            print(x);
+            x++;
+            print(x);
+            return 0;
+        }""",
+    'overflow_before_inlined_call': """
+        int show(int v) { print(v); return v; }
+        int main() {
+            int v[1];
+            v[0] = 4000000000;
+            int a = v[0];
+            int x = a * a + show(7);
+            print(x);
+            return 0;
+        }""",
+    'overflow_neg': """
+        int main() {
+            int small = 0 - 9223372036854775807 - 1;
+            print(small);
+            print(small / 2);
+            return -small;
+        }""",
+}
+
+# Programs with pure functions, run only with memoisation (see memo.py):
+# unmemoised, fib(35) alone would take minutes on the tree walker.
+MEMO_CASES = {
+    'memo_fib': """
+        int fib(int n) {
+            if (n < 2) { return n; }
+            return fib(n - 1) + fib(n - 2);
+        }
+        int main() {
+            print(fib(35));
+            return fib(30);
+        }""",
+    'memo_binom': """
+        int binom(int n, int k) {
+            if (k == 0 || k == n) { return 1; }
+            return binom(n - 1, k - 1) + binom(n - 1, k);
+        }
+        int main() {
+            print(binom(30, 15));
+            return binom(20, 3);
+        }""",
+    'memo_deep': f"""
+        int deep(int n) {{
+            if (n == 0) {{ return 0; }}
+            return deep(n - 1) + 1;
+        }}
+        int main() {{
+            int a = deep({MAX_CALL_DEPTH - 1000});
+            return a + deep({MAX_CALL_DEPTH - 1000});
+        }}""",
+    'memo_failing': """
+        int inverse(int n) { return 1000 / n; }
+        int main() {
+            print(inverse(8) + inverse(8));
+            print(inverse(0));
+            return 0;
+        }""",
+}
+
+def generated(seed):
+    mix = dict(DEFAULT_MIX, print=1)
+    return generate_program(functions=12, statements=6, depth=3, mix=mix, seed=seed)
+
+SOURCES = {os.path.splitext(os.path.basename(path))[0]: open(path, encoding='utf-8').read()
+           for path in sorted(glob.glob(os.path.join(BENCHMARKS, 'programs', '*.cpp')))}
+SOURCES.update({f"generated_{seed}": generated(seed) for seed in range(3)})
+SOURCES.update(CASES)
+SOURCES.update(OVERFLOWS)
+
+def outcome(source, engine, level, memo=None):
+    """(printed output, main()'s result or None, (error message, line) or None);
+    `memo` as for compile_and_run."""
+    program = compile_source(source, opt_level=level)
+    out = io.StringIO()
+    result = error = None
+    with contextlib.redirect_stdout(out):
+        try:
+            result = run_program(program, engine, memo)
+        except RuntimeErrorWithLine as e:
+            error = e.message, e.line
+    return out.getvalue(), result, error
+
+_expected = {}
+
+def expected(name, engine='tree'):
+    """The outcome every engine must match: the tree walker's at -O0, or the
+    native engine's own for the OVERFLOWS."""
+    reference = 'native' if engine == 'native' and name in OVERFLOWS else 'tree'
+    if (name, reference) not in _expected:
+        _expected[name, reference] = outcome(SOURCES[name], reference, 0)
+    return _expected[name, reference]
+
+no_compiler = pytest.mark.skipif(shutil.which(native.CXX) is None, reason=f"no {native.CXX}")
+ENGINE_PARAMS = [pytest.param(engine, marks=no_compiler if engine == 'native' else ())
+                 for engine in ENGINES]
+
+def test_errors_are_covered():
+    errors = {name: expected(name)[2] for name in ('division_by_zero', 'index_out_of_bounds', 'stack_overflow')}
+    assert all(errors.values()), errors
+
+@no_compiler
+@pytest.mark.parametrize('name', OVERFLOWS)
+def test_native_overflow(name):
+    assert expected(name)[2] is None
+    message, line = expected(name, 'native')[2]
+    assert message.startswith("integer overflow")
+
+@pytest.mark.parametrize('name', SOURCES)
+@pytest.mark.parametrize('level', OPTIMIZATION_LEVELS)
+@pytest.mark.parametrize('engine', ENGINE_PARAMS)
+def test_engine_agrees(engine, level, name):
+    assert outcome(SOURCES[name], engine, level) == expected(name, engine)
+
+_memo_expected = {}
+
+def memo_expected(name):
+    """The tree walker's outcome and memo stats at -O0 for MEMO_CASES[name]."""
+    if name not in _memo_expected:
+        stats = {}
+        _memo_expected[name] = outcome(MEMO_CASES[name], 'tree', 0, stats), stats
+    return _memo_expected[name]
+
+def test_memo_stats():
+    # fib(35) misses once on each of 0..35 and hits on every fib(n - 2)
+    # but the innermost; fib(30) is one more hit
+    assert memo_expected('memo_fib')[1] == {'fib': {'hits': 34, 'calls': 70, 'entries': 36}}
+    assert memo_expected('memo_deep')[1]['deep']['hits'] == 1
+
+@pytest.mark.parametrize('name', MEMO_CASES)
+@pytest.mark.parametrize('level', OPTIMIZATION_LEVELS)
+@pytest.mark.parametrize('engine', ENGINE_PARAMS)
+def test_memo_agrees(engine, level, name):
+    stats = {}
+    assert (outcome(MEMO_CASES[name], engine, level, stats), stats) == memo_expected(name)
@@ -0,0 +1,75 @@
+# Differential tests: a Document after random edits against a fresh
+# Document of the same text, comparing diagnostics and the position of
+# every node of the reused and re-parsed functions.
+import random
+
+import pytest
+
+from ast_nodes import walk
+from incremental import Document
+
+SOURCE = """int square(int x) {
+    return x * x;
+}
+
+int fib(int n) {
+    if (n < 2) { return n; }
+    return fib(n - 1) + fib(n - 2);
+}
+/* a comment
+   between functions */
+int sum(int n) {
+    int total = 0;
+    int i = 0;
+    for (i = 0; i < n; i++) { total = total + square(i); }
+    return total;
+}
+int main() { print(fib(10)); return sum(4); }
+"""
+
+SNIPPETS = ['\n', '\n\n', ' ', 'x', '1', ';', '{', '}', '(', ')', 'int y = 2;\n', '// note\n',
+            '/*', '*/', '"', 'int f() { return 1; }\n', 'return 0;']
+
+def snapshot(doc):
+    positions = [[(type(node).__name__, node.line, node.col) for node in walk(fn)]
+                 for fn in doc.functions()]
+    return doc.diagnostics(), positions
+
+def check(doc):
+    assert snapshot(doc) == snapshot(Document(doc.text)), f"differs from a fresh parse of {doc.text!r}"
+
+def random_edit(rnd, text):
+    start = rnd.randrange(len(text) + 1)
+    end = min(len(text), start + rnd.choice((0, 0, 1, 3, 12)))
+    return start, end, rnd.choice(SNIPPETS) if rnd.random() < 0.7 else ''
+
+def test_newline_above_a_function():
+    doc = Document(SOURCE)
+    doc.apply(0, 0, '\n')
+    check(doc)
+    fib = [fn for fn in doc.functions() if fn.name == 'fib'][0]
+    assert fib.line == 6
+
+@pytest.mark.parametrize('seed', range(10))
+def test_random_edits(seed):
+    rnd = random.Random(seed)
+    doc = Document(SOURCE)
+    for _ in range(300):
+        if len(doc.text) > 2 * len(SOURCE):
+            doc = Document(SOURCE)
+        doc.apply(*random_edit(rnd, doc.text))
+        check(doc)
+
+def test_edits_in_batches():
+    rnd = random.Random('batches')
+    doc = Document(SOURCE)
+    for _ in range(40):
+        edits = []
+        text = doc.text
+        for _ in range(rnd.randint(1, 4)):
+            start, end, new = random_edit(rnd, text)
+            edits.append({'start': start, 'end': end, 'text': new})
+            text = text[:start] + new + text[end:]
+        doc.apply_edits(edits)
+        assert doc.text == text
+        check(doc)
@@ -0,0 +1,104 @@
+# Differential tests: the table-driven lexer against tokenize_charwise, the
+# reference scanner, on edge cases, random inputs and the sample programs.
+import glob
+import os
+import random
+
+import pytest
+
+import lexer
+from lexer import tokenize, tokenize_charwise
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROGRAMS = sorted(glob.glob(os.path.join(HERE, '..', 'benchmarks', 'programs', '*.cpp')))
+
+EDGE_CASES = [
+    '', 'int', '1.2.3', '1..2', '1.', '3.14x', '"abc', '"a\\"b"', '"multi\nline" x',
+    "'a'", "''", "'\\n'", "'\\'", "'ab'", "'", '/* never closed\n\n', '/*/', '/**/x',
+    'a // c\nb', 'a/b', 'a/', '!', '!=', '&&&', '|', 'x\r\ny', '#include', 'café = 1;',
+    'été', '1²', '1é', '٣ + 1', 'x y', '"é"', "'é'", 'a_1 _b __',
+    'for(int i=0;i<=10;i++){a[i]=i*2;}', 'true false TRUE', '++--+-', '\t\t\n\n\n@',
+    'a==b<=c>=d!=e&&f||g', '===', '<<=', 'x+++y', '----',
+]
+
+def run_lexer(fn, code):
+    try:
+        return list(fn(code)), None
+    except Exception as e:
+        return None, (type(e).__name__, str(e))
+
+def without_offsets(result):
+    tokens, error = result
+    return [tok[:2] + tok[3:] for tok in tokens] if tokens is not None else None, error
+
+def check(code):
+    expected = run_lexer(tokenize_charwise, code)
+    actual = run_lexer(tokenize, code)
+    assert actual == expected, f"lexers disagree on {code!r}"
+    # bytes mode: offsets count bytes, so they only agree on ASCII sources;
+    # it also takes '\r' as whitespace, so CRLF must lex like LF
+    code = code.replace('\r', '')
+    expected = run_lexer(tokenize_charwise, code)
+    actual = run_lexer(tokenize, code.encode())
+    crlf = run_lexer(tokenize, code.replace('\n', '\r\n').encode())
+    if '"' not in code and "'" not in code:
+        assert without_offsets(crlf) == without_offsets(actual), f"bytes lexer treats CRLF differently in {code!r}"
+    if not code.isascii():
+        expected, actual = without_offsets(expected), without_offsets(actual)
+    assert actual == expected, f"lexers disagree on {code!r} as bytes"
+
+def fuzz_cases(n, seed=0):
+    rng = random.Random(seed)
+    alphabet = list('abz_09 .\t\n"\'\\/*+-=<>!&|;,(){}[]:#') + ['é', '²', '٣', '\r']
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(n)]
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+@pytest.mark.parametrize('code', EDGE_CASES)
+def test_edge_cases(code):
+    check(code)
+
+def test_fuzz():
+    for code in fuzz_cases(5000):
+        check(code)
+
+@pytest.mark.parametrize('path', PROGRAMS, ids=os.path.basename)
+def test_programs(path):
+    check(read(path))
+
+@pytest.mark.parametrize('size', (1, 2, 3, 5, 8, 13))
+def test_windows(size, monkeypatch):
+    """Tiny windows, so tokens straddle every cut."""
+    monkeypatch.setattr(lexer, '_WINDOW', size)
+    for code in EDGE_CASES + fuzz_cases(300, seed=size) + [read(PROGRAMS[0])]:
+        check(code)
+
+class Recorded(bytes):
+    """Bytes that remember the longest slice taken of them."""
+    longest = 0
+
+    def __getitem__(self, index):
+        part = super().__getitem__(index)
+        if isinstance(index, slice):
+            self.longest = max(self.longest, len(part))
+        return part
+
+@pytest.mark.parametrize('size', (1, 2, 3, 5, 8, 13))
+def test_decoded_fallback(size, monkeypatch):
+    """Sources the reference scanner takes over from the first byte, so
+    offsets count characters and must match it exactly, however the
+    windows cut multi-byte characters, CRLFs and tokens."""
+    monkeypatch.setattr(lexer, '_WINDOW', size)
+    for code in EDGE_CASES + fuzz_cases(300, seed=size) + ['é /* ' + 'é' * 40 + ' */ "' + '€' * 30 + '" x']:
+        code = 'é ' + code.replace('\r', '')
+        expected = run_lexer(tokenize_charwise, code)
+        assert run_lexer(tokenize, code.encode()) == expected, f"lexers disagree on {code!r} as bytes"
+        assert run_lexer(tokenize, code.replace('\n', '\r\n').encode()) == expected, f"... on {code!r} with CRLFs"
+
+def test_decoded_window_by_window(monkeypatch):
+    monkeypatch.setattr(lexer, '_WINDOW', 64)
+    code = Recorded(('é = 1;\n' + 'x = "ü" + y; // ß\n' * 500).encode())
+    assert list(tokenize(code)) == list(tokenize_charwise(code.decode()))
+    assert code.longest <= 64
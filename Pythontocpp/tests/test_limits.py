@@ -0,0 +1,60 @@
+# limits.deep_recursion() from several threads at once: the recursion limit
+# is process-wide, so it must stay raised until the last thread leaves.
+import os
+import subprocess
+import sys
+import threading
+
+import limits
+from limits import RECURSION_LIMIT, deep_recursion
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_restored_by_the_last_one_out():
+    before = sys.getrecursionlimit()
+    inside, leave = threading.Event(), threading.Event()
+
+    def other():
+        with deep_recursion():
+            inside.set()
+            leave.wait()
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    inside.wait()
+    assert sys.getrecursionlimit() == RECURSION_LIMIT
+    with deep_recursion():
+        leave.set()
+        thread.join()
+        assert sys.getrecursionlimit() == RECURSION_LIMIT
+    assert sys.getrecursionlimit() == before
+    assert limits._active == 0
+
+# Deep guest recursion in threads whose calls start and finish at different
+# times.  Run in a child process: restoring the limit under another thread
+# kills the interpreter rather than raising.
+THREADED = """
+import sys, threading
+from compiler import compile_and_run
+
+SOURCE = "int down(int n) { if (n == 0) { return 0; } return down(n - 1) + 1; } " \\
+         "int main() { return down(%d); }"
+before = sys.getrecursionlimit()
+results = []
+
+def run(depth):
+    results.append(compile_and_run(SOURCE % depth, use_cache=False, engine='tree', opt_level=0))
+
+for _ in range(5):
+    threads = [threading.Thread(target=run, args=(3000 - 500 * i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+print(sorted(results), sys.getrecursionlimit() == before)
+"""
+
+def test_threads_recursing_deeply():
+    done = subprocess.run([sys.executable, '-c', THREADED], cwd=ROOT, capture_output=True, text=True, timeout=300)
+    assert done.returncode == 0, done.stderr
+    assert done.stdout.split('\n')[0] == f"{sorted([3000, 2500, 2000, 1500] * 5)} True"
@@ -0,0 +1,50 @@
+# Deeply nested programs: the parser is iterative, and the passes over the
+# AST run under limits.RECURSION_LIMIT, past which nesting is a CompileError.
+import pytest
+
+import limits
+from token_stream import TokenStream
+from parser.parser_functions import ParserWithParams
+from resolver import CompileError, resolve
+from typechecker import typecheck
+from optimizer import optimize
+
+def nested(depth):
+    """A program returning 1 + (1 + (... (1))), `depth` levels deep."""
+    return 'int main() { int x = ' + '1 + (' * depth + '1' + ')' * depth + '; return x; }'
+
+def parse(source):
+    return ParserWithParams(TokenStream.from_source(source)).parse_program()
+
+@pytest.mark.parametrize('depth', (500, 3000, 20000))
+def test_resolve(depth):
+    program = resolve(parse(nested(depth)))
+    assert program.functions[0].frame_size == 1
+
+def test_resolve_too_deep(monkeypatch):
+    monkeypatch.setattr(limits, 'RECURSION_LIMIT', 1000)
+    with pytest.raises(CompileError, match="nested too deeply"):
+        resolve(parse(nested(3000)))
+
+@pytest.mark.parametrize('depth', (500, 3000, 20000))
+def test_typecheck(depth):
+    program = typecheck(resolve(parse(nested(depth))))
+    assert program.functions[0].body.stmts[0].init.impl is not None
+
+def test_typecheck_too_deep(monkeypatch):
+    program = resolve(parse(nested(3000)))
+    monkeypatch.setattr(limits, 'RECURSION_LIMIT', 1000)
+    with pytest.raises(CompileError, match="nested too deeply"):
+        typecheck(program)
+
+@pytest.mark.parametrize('depth', (500, 3000, 20000))
+def test_optimize(depth):
+    program = optimize(typecheck(resolve(parse(nested(depth)))), 2, report=[])
+    ret = program.functions[0].body.stmts[-1]
+    assert ret.expr.value == depth + 1
+
+def test_optimize_too_deep(monkeypatch):
+    program = typecheck(resolve(parse(nested(3000))))
+    monkeypatch.setattr(limits, 'RECURSION_LIMIT', 1000)
+    with pytest.raises(CompileError, match="nested too deeply"):
+        optimize(program, 1)
@@ -0,0 +1,76 @@
+# Parallel parsing against serial parsing: the same Program, positions
+# included, and the same error when the source does not parse.
+import glob
+import marshal
+import os
+
+import pytest
+
+import ast_cache
+import parallel
+from ast_nodes import walk
+from parallel import _parse_serial, parse_parallel, split_functions
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROGRAMS = sorted(glob.glob(os.path.join(HERE, '..', 'benchmarks', 'programs', '*.cpp')))
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+# Braces the splitter must not count, functions sharing a line and
+# non-ASCII text
+TRICKY = """int a() { print("}"); print('{'); return 1; } int b() { // }
+    /* { */ return 2; }
+int c(int n) {
+  if (n) { return "é{" == "é{"; }
+  return 0;
+}
+int main() { return a() + b() + c(1); }
+"""
+
+def flat(program):
+    """ast_cache's (ops, consts) for `program`; the marshalled bytes may
+    differ in which equal constants they share."""
+    return marshal.loads(ast_cache.dumps(program))
+
+def positions(program):
+    return [(type(node).__name__, node.line, node.col) for node in walk(program)]
+
+def serial_forbidden(code):
+    raise AssertionError("fell back to serial parsing")
+
+def check(code, monkeypatch, workers=2):
+    expected = _parse_serial(code)
+    monkeypatch.setattr(parallel, '_parse_serial', serial_forbidden)
+    actual = parse_parallel(code, workers, threshold=0)
+    assert flat(actual) == flat(expected)
+    assert positions(actual) == positions(expected)
+
+def test_split_functions():
+    cuts = split_functions(TRICKY)
+    assert [TRICKY[offset - 1] for offset, _ in cuts] == ['}'] * 3
+    assert [line for _, line in cuts] == [1, 2, 6]
+    assert [TRICKY[:offset].count('\n') + 1 for offset, _ in cuts] == [1, 2, 6]
+
+def test_tricky(monkeypatch):
+    check(TRICKY, monkeypatch)
+
+@pytest.mark.parametrize('workers', (2, 3))
+def test_programs(workers, monkeypatch):
+    check('\n'.join(map(read, PROGRAMS)), monkeypatch, workers)
+
+ERRORS = [
+    'int a() { return 1; }\nint b() { return 2 }\nint c() { return @; }\n',
+    'int a() { return 1; }\nint b() { return "open; }\nint c() { return 3; }\n',
+    'int a() { return 1; }\nint b() { return 2; }\n}\nint c() { return 3; }\n',
+    'int a() { return 1; }\nint b() { return 2; }\nint c() { return 3;\n',
+]
+
+@pytest.mark.parametrize('code', ERRORS)
+def test_errors(code):
+    with pytest.raises(SyntaxError) as serial:
+        _parse_serial(code)
+    with pytest.raises(SyntaxError) as parallel:
+        parse_parallel(code, 2, threshold=0)
+    assert str(parallel.value) == str(serial.value)
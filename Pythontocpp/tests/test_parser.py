@@ -0,0 +1,131 @@
+# The expression parser: precedence, associativity, prefix operators, call
+# and index frames, node positions and syntax errors, plus random
+# expressions printed with as few parentheses as the operator table allows.
+import random
+
+import pytest
+
+from ast_nodes import ArrayRef, BinaryOp, FunctionCall, Number, UnaryOp, VarRef
+from lexer import OPERATORS, TOKEN_KINDS
+from parser.expressions import BINARY_OPS
+from parser.parser_functions import ParserWithParams
+from token_stream import TokenStream
+
+SYMBOLS = {kind: symbol for symbol, kind in OPERATORS.items()}
+BINDING = {TOKEN_KINDS[kind]: bp for kind, bp in BINARY_OPS.items()}
+
+def show(node):
+    """The expression as an s-expression, postfix operators marked with ++/--."""
+    if isinstance(node, BinaryOp):
+        return f"({SYMBOLS[node.op]} {show(node.left)} {show(node.right)})"
+    if isinstance(node, UnaryOp):
+        if node.postfix:
+            return f"({show(node.operand)}{SYMBOLS[node.op]})"
+        return f"({SYMBOLS[node.op]} {show(node.operand)})"
+    if isinstance(node, FunctionCall):
+        return f"{node.name}({', '.join(map(show, node.args))})"
+    if isinstance(node, ArrayRef):
+        return node.name + ''.join(f"[{show(index)}]" for index in node.indices)
+    if isinstance(node, Number):
+        return repr(node.value)
+    assert isinstance(node, VarRef), node
+    return node.name
+
+def parse_expr(source):
+    return ParserWithParams(TokenStream.from_source(source + ';')).parse_expr()
+
+def parse(source):
+    return ParserWithParams(TokenStream.from_source(source)).parse_program()
+
+EXPRESSIONS = [
+    ('1 + 2 * 3', '(+ 1 (* 2 3))'),
+    ('1 * 2 + 3', '(+ (* 1 2) 3)'),
+    ('a - b - c', '(- (- a b) c)'),
+    ('a / b * c % d', '(% (* (/ a b) c) d)'),
+    ('a % b + c % d', '(+ (% a b) (% c d))'),
+    ('a < b == c > d', '(== (< a b) (> c d))'),
+    ('a == b != c', '(!= (== a b) c)'),
+    ('a || b && c', '(|| a (&& b c))'),
+    ('a && b || c && d', '(|| (&& a b) (&& c d))'),
+    ('a + b < c * d && e', '(&& (< (+ a b) (* c d)) e)'),
+    ('(a + b) * c', '(* (+ a b) c)'),
+    ('a - (b - c)', '(- a (- b c))'),
+    ('((a))', 'a'),
+    ('-a * b', '(* (- a) b)'),
+    ('- - a', '(- (- a))'),
+    ('!a && !b', '(&& (! a) (! b))'),
+    ('!!a', '(! (! a))'),
+    ('1 - -2', '(- 1 (- 2))'),
+    ('-(a + b)', '(- (+ a b))'),
+    ('++a + --b', '(+ (++ a) (-- b))'),
+    ('x++ + y--', '(+ (x++) (y--))'),
+    ('-x[2]', '(- x[2])'),
+    ('f()', 'f()'),
+    ('f(1, g(2), h()) + 3', '(+ f(1, g(2), h()) 3)'),
+    ('f((1), (2 + 3) * 4)', 'f(1, (* (+ 2 3) 4))'),
+    ('x[i][j + 1] % 2', '(% x[i][(+ j 1)] 2)'),
+    ('x[f(y[0])]', 'x[f(y[0])]'),
+    ('2.5 * a', '(* 2.5 a)'),
+]
+
+@pytest.mark.parametrize('source, expected', EXPRESSIONS)
+def test_expressions(source, expected):
+    assert show(parse_expr(source)) == expected
+
+def test_positions():
+    # binary operators sit at the operator, the rest at their first token
+    expr = parse_expr('f(a,\n  -b[1]) * (c\n % 2)')
+    assert (expr.line, expr.col) == (2, 10)
+    call, mod = expr.left, expr.right
+    assert (call.line, call.col) == (1, 1)
+    neg = call.args[1]
+    assert (neg.line, neg.col) == (2, 3)
+    assert (neg.operand.line, neg.operand.col) == (2, 4)
+    assert (mod.line, mod.col) == (3, 2)
+    assert (mod.left.line, mod.left.col) == (2, 13)
+
+ERRORS = [
+    ('int main() { return 1 + ; }', "Unexpected token SEMI at line 1"),
+    ('int main() { return (1 + 2; }', "Expected RPAREN but got SEMI at line 1"),
+    ('int main() { return f(1, ; }', "Unexpected token SEMI at line 1"),
+    ('int main() { return f(1 2); }', "Expected RPAREN but got NUMBER at line 1"),
+    ('int main() { return a[1; }', "Expected RBRACKET but got SEMI at line 1"),
+    ('int main() {\n  int x = 1\n  return x; }', "Expected SEMI but got RETURN at line 3"),
+    ('int main() {\n  return\n}', "Unexpected token RBRACE at line 3"),
+    ("int main() {\n  return 1 +\n", "Unexpected token EOF at line 3"),
+]
+
+@pytest.mark.parametrize('source, message', ERRORS)
+def test_errors(source, message):
+    with pytest.raises(SyntaxError) as raised:
+        parse(source)
+    assert str(raised.value) == message
+
+def random_expr(rng, depth):
+    """(source with minimal parentheses, s-expression, binding power of the
+    outermost binary operator or None)."""
+    if depth == 0 or rng.random() < 0.2:
+        leaf = rng.choice('abc') if rng.random() < 0.7 else str(depth)
+        return leaf, leaf, None
+    if rng.random() < 0.2:
+        op = rng.choice('-!')
+        source, expected, inner = random_expr(rng, depth - 1)
+        if inner is not None:
+            source = f"({source})"
+        return f"{op} {source}", f"({op} {expected})", None
+    op = rng.choice(list(BINDING))
+    bp = BINDING[op]
+    (left, left_expected, left_bp), (right, right_expected, right_bp) = (
+        random_expr(rng, depth - 1) for _ in range(2))
+    # left-associative: a right operand of the same binding power needs them too
+    if left_bp is not None and left_bp < bp:
+        left = f"({left})"
+    if right_bp is not None and right_bp <= bp:
+        right = f"({right})"
+    return f"{left} {SYMBOLS[op]} {right}", f"({SYMBOLS[op]} {left_expected} {right_expected})", bp
+
+def test_random_expressions():
+    rng = random.Random(0)
+    for _ in range(500):
+        source, expected, _ = random_expr(rng, 5)
+        assert show(parse_expr(source)) == expected, source
@@ -0,0 +1,65 @@
+# Name resolution: the CompileErrors it reports, with their positions, and
+# the frame slots it hands out under C's scoping rules.
+import pytest
+
+from ast_nodes import ArrayDecl, ArrayRef, Assignment, VarDecl, VarRef, walk
+from parser.parser_functions import ParserWithParams
+from resolver import CompileError, resolve
+from token_stream import TokenStream
+
+def parse(source):
+    return ParserWithParams(TokenStream.from_source(source)).parse_program()
+
+def slots(source, name='main'):
+    """frame_size of function `name` and the slot of each use or declaration of
+    each variable, in walk() order."""
+    fn = [fn for fn in resolve(parse(source)).functions if fn.name == name][0]
+    used = {}
+    for node in walk(fn.body):
+        if isinstance(node, (VarDecl, ArrayDecl, Assignment, VarRef, ArrayRef)) and isinstance(node.name, str):
+            used.setdefault(node.name, []).append(node.slot)
+    return fn.frame_size, used
+
+ERRORS = [
+    ("int main() {\n  return x;\n}", "Variable 'x' not declared", 2, 10),
+    ("int main() {\n  y = 1;\n  return 0;\n}", "Variable 'y' not declared", 2, 3),
+    ("int main() { int a[2]; return b[0]; }", "Variable 'b' not declared", 1, 31),
+    ("int main() { int x = x; return x; }", "Variable 'x' not declared", 1, 22),
+    ("int main() { if (1) { int t = 1; } return t; }", "Variable 't' not declared", 1, 43),
+    ("int main() { for (int i = 0; i < 3; i++) { } return i; }", "Variable 'i' not declared", 1, 53),
+    ("int main() {\n  int x = 1;\n  int x = 2;\n  return x;\n}", "Variable 'x' redeclared", 3, 3),
+    ("int f(int n) { int n = 1; return n; }", "Variable 'n' redeclared", 1, 16),
+    ("int f(int n, int n) { return n; }", "Variable 'n' redeclared", 1, 1),
+    ("int main() {\n  break;\n}", "break outside a loop or switch", 2, 3),
+    ("int main() { if (1) { continue; } return 0; }", "continue outside a loop", 1, 23),
+    ("int main() { switch (1) { case 1: continue; } return 0; }", "continue outside a loop", 1, 35),
+]
+
+@pytest.mark.parametrize('source, message, line, col', ERRORS)
+def test_errors(source, message, line, col):
+    with pytest.raises(CompileError) as raised:
+        resolve(parse(source))
+    error = raised.value
+    assert (error.message, error.line, error.col) == (message, line, col)
+    assert str(error) == f"{message} at line {line}, col {col}"
+
+def test_shadowing():
+    size, used = slots("int main() { int x = 1; if (x) { int x = x + 1; print(x); } return x; }")
+    # walk() visits a declaration before its initializer, which reads the outer x
+    assert used['x'] == [0, 0, 1, 0, 1, 0] and size == 2
+
+def test_sibling_blocks_share_slots():
+    size, used = slots("int main() { if (1) { int a = 1; print(a); } else { int b = 2; print(b); } "
+                       "int c = 3; return c; }")
+    assert used == {'a': [0, 0], 'b': [0, 0], 'c': [0, 0]} and size == 1
+
+def test_parameters_and_loops():
+    size, used = slots("int f(int n, int m) { int s = 0; for (int i = 0; i < n; i++) { int t = i * m; "
+                       "s = s + t; } while (s > 0) { int u = 1; s = s - u; } return s; }", 'f')
+    assert used['n'] == [0] and used['m'] == [1]
+    assert set(used['i']) == {3} and used['t'] == [4, 4] and used['u'] == [3, 3]
+    assert size == 5
+
+def test_break_and_continue_inside():
+    resolve(parse("int main() { while (1) { switch (2) { case 2: continue; default: break; } break; } "
+                  "for (int i = 0; i < 2; i++) { if (i) { continue; } break; } return 0; }"))
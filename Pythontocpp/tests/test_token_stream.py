@@ -0,0 +1,80 @@
+# TokenStream and TokenRing against the lexer's plain token tuples, and the
+# parser fed through each of them against one another.
+import glob
+import os
+
+import pytest
+
+import ast_cache
+from ast_nodes import walk
+from lexer import Tok, tokenize
+from parser.parser_functions import ParserWithParams
+from streaming import parse_file
+from token_stream import EOF_TOKEN, TokenRing, TokenStream
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROGRAMS = sorted(glob.glob(os.path.join(HERE, '..', 'benchmarks', 'programs', '*.cpp')))
+
+SOURCE = 'int main() {\n  int x = 1;\n\n  /* two\n lines */ x = x + "s\\"";\n  return x;\n}\n'
+
+def column(source, offset):
+    return offset - source.rfind('\n', 0, offset)
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def test_stream_matches_tokens():
+    tokens = list(tokenize(SOURCE))
+    for stream in (TokenStream(tokens, source=SOURCE), TokenStream.from_source(SOURCE)):
+        assert list(stream)[:len(tokens)] == tokens
+        for i, (_, value, offset, line) in enumerate(tokens):
+            assert (stream.value(i), stream.offset(i), stream.line(i)) == (value, offset, line)
+            assert stream.position(i) == (line, column(SOURCE, offset))
+    assert stream[len(stream) - 1] == ('EOF', '', len(SOURCE), 8)
+
+def test_stream_past_the_end():
+    stream = TokenStream(tokenize('a b'))
+    assert (stream.kind(2), stream.value(2), stream.offset(2), stream.line(2)) == (Tok.EOF, '', -1, -1)
+    assert stream[5] == EOF_TOKEN and stream.position(5) == (-1, -1)
+
+def test_stream_line_offset():
+    stream = TokenStream.from_source(SOURCE)
+    before = [stream.position(i) for i in range(len(stream))]
+    stream.line_offset = 10
+    assert [stream.position(i) for i in range(len(stream))] == [(line + 10, col) for line, col in before]
+    assert stream.line(0) == 11
+
+def test_ring_matches_tokens():
+    tokens = list(tokenize(SOURCE))
+    ring = TokenRing(iter(tokens), size=4, source=SOURCE)
+    for i, tok in enumerate(tokens):
+        ring.kind(i + 2)   # look ahead as far as the parser does
+        assert ring[max(i - 1, 0)] == tokens[max(i - 1, 0)]
+        assert ring[i] == tok
+        assert ring.position(i) == (tok[3], column(SOURCE, tok[2]))
+    assert ring.kind(len(tokens)) == Tok.EOF and ring[len(tokens)] == EOF_TOKEN
+
+def test_ring_window():
+    ring = TokenRing(tokenize('a b c d e f g h i j'), size=4)
+    assert ring.value(6) == 'g'
+    assert ring.value(3) == 'd'
+    with pytest.raises(RuntimeError, match="already left"):
+        ring.value(2)
+    with pytest.raises(ValueError, match="power of two"):
+        TokenRing([], size=6)
+
+def lines(functions):
+    return [(type(node).__name__, node.line) for fn in functions for node in walk(fn)]
+
+@pytest.mark.parametrize('path', PROGRAMS, ids=os.path.basename)
+def test_parses_agree(path, tmp_path):
+    """The same functions from a TokenStream, a TokenRing over the mapped
+    file and a plain token list, which has no source to take columns from."""
+    source = read(path)
+    expected = ParserWithParams(TokenStream.from_source(source)).parse_program().functions
+    copy = tmp_path / 'copy.cpp'
+    copy.write_bytes(source.encode())
+    assert ast_cache.dumps(list(parse_file(str(copy), ring_size=4))) == ast_cache.dumps(expected)
+    listed = ParserWithParams(list(tokenize(source))).parse_program().functions
+    assert lines(listed) == lines(expected)
@@ -0,0 +1,233 @@
+from array import array
+from bisect import bisect_right
+from itertools import compress
+from operator import ne
+from lexer import TOKEN_KINDS, KIND_CODES, Tok, tokenize_batches
+
+EOF_TOKEN = ('EOF', '', -1, -1)
+
+class _InternTable(dict):
+    """(type, value) -> index into TokenStream.values; new values are appended."""
+    def __init__(self, values):
+        super().__init__()
+        self.values = values
+
+    def __missing__(self, key):
+        index = self[key] = len(self.values)
+        self.values.append(key[1])
+        return index
+
+class TokenStream:
+    """Struct-of-arrays token storage for the parser.
+
+    kinds   array('B') of codes from lexer.TOKEN_KINDS
+    offsets array('I') of source offsets
+    value_ids array('I') indexing the interned `values` side table
+    Line numbers are not stored per token: only the token indices where the
+    line changes are kept (with the offset where that line starts), and
+    line(i)/position(i) are answered with bisect.  Columns need `source`;
+    without it a line's first token counts as column 1.
+    Reads past the end behave like the old list-based peek and give EOF.
+    `line_offset` is added to every line, so a stream lexed with lines
+    relative to some start can be moved without touching its arrays.
+    """
+    def __init__(self, tokens=(), source=None):
+        self.source = source
+        self.line_offset = 0
+        self.kinds = array('B')
+        self.offsets = array('I')
+        self.value_ids = array('I')
+        self.values = []
+        self._interned = _InternTable(self.values)
+        self._line_starts = array('I')   # token index where a new line begins
+        self._line_numbers = array('I')  # ... and that line's number
+        self._line_offsets = array('I')  # ... and the offset where the line starts
+        self._last_line = 1
+        self._span_first = self._span_end = self._span_shift = 0   # see position()
+        if tokens:
+            self.extend(tokens)
+
+    @classmethod
+    def from_source(cls, code):
+        """Lex `code` straight into a stream and terminate it with EOF."""
+        stream = cls(source=code)
+        for batch in tokenize_batches(code):
+            stream.extend_batch(*batch)
+        stream.append('EOF', '', len(code), code.count('\n') + 1)
+        return stream
+
+    # ---------------- Building ----------------
+    def append(self, kind, value, offset, line):
+        index = len(self.kinds)
+        self.kinds.append(KIND_CODES[kind])
+        self.offsets.append(offset)
+        self.value_ids.append(self._interned[type(value), value])
+        if line != self._last_line:
+            self._line_starts.append(index)
+            self._line_numbers.append(line)
+            self._line_offsets.append(self._line_start(offset))
+            self._last_line = line
+
+    def extend(self, tokens):
+        for kind, value, offset, line in tokens:
+            self.append(kind, value, offset, line)
+
+    def extend_batch(self, kinds, values, offsets, lines):
+        """Append parallel lists as produced by lexer.tokenize_batches."""
+        base = len(self.kinds)
+        self.kinds.extend(map(KIND_CODES.__getitem__, kinds))
+        self.offsets.extend(offsets)
+        self.value_ids.extend(map(self._interned.__getitem__, zip(map(type, values), values)))
+        previous = [self._last_line]
+        previous += lines[:-1]
+        changed = list(compress(range(base, base + len(lines)), map(ne, lines, previous)))
+        if changed:
+            local = [i - base for i in changed]
+            self._line_starts.extend(changed)
+            self._line_numbers.extend(map(lines.__getitem__, local))
+            self._line_offsets.extend(map(self._line_start, map(offsets.__getitem__, local)))
+            self._last_line = lines[-1]
+
+    def _line_start(self, offset):
+        """Offset of the start of the line holding `offset`."""
+        if self.source is None:
+            return offset
+        return self.source.rfind('\n', 0, offset) + 1
+
+    # ---------------- Access ----------------
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind(self, i):
+        return self.kinds[i] if i < len(self.kinds) else Tok.EOF
+
+    def value(self, i):
+        return self.values[self.value_ids[i]] if i < len(self.kinds) else ''
+
+    def offset(self, i):
+        return self.offsets[i] if i < len(self.kinds) else -1
+
+    def line(self, i):
+        if i >= len(self.kinds):
+            return -1
+        j = bisect_right(self._line_starts, i) - 1
+        return (self._line_numbers[j] if j >= 0 else 1) + self.line_offset
+
+    def position(self, i):
+        """(line, col) of token i, both 1-based; (-1, -1) past the end."""
+        # the parser asks for nearby tokens, so remember the span of tokens on
+        # the last line looked up; this also hands out one int object per
+        # line, which every node on it keeps a reference to
+        if not self._span_first <= i < self._span_end or self._span_shift != self.line_offset:
+            if i >= len(self.kinds):
+                return (-1, -1)
+            starts = self._line_starts
+            j = bisect_right(starts, i) - 1
+            self._span_first = starts[j] if j >= 0 else 0
+            self._span_end = starts[j + 1] if j + 1 < len(starts) else len(self.kinds)
+            self._span_shift = self.line_offset
+            self._span_line = (self._line_numbers[j] if j >= 0 else 1) + self.line_offset
+            self._span_start = self._line_offsets[j] if j >= 0 else 0
+        return (self._span_line, self.offsets[i] - self._span_start + 1)
+
+    def __getitem__(self, i):
+        """The (kind, value, offset, line) tuple the list-based parser used."""
+        if i >= len(self.kinds):
+            return EOF_TOKEN
+        return (TOKEN_KINDS[self.kinds[i]], self.values[self.value_ids[i]],
+                self.offsets[i], self.line(i))
+
+    def __iter__(self):
+        for i in range(len(self.kinds)):
+            yield self[i]
+
+class TokenRing:
+    """Bounded lookahead over a token iterator, for streaming parses.
+
+    Indexed like a TokenStream by absolute token position, but only the
+    last `size` tokens are kept: tokens are pulled from the iterator as the
+    parser looks ahead and overwrite the oldest slot.  The parser looks at
+    most two tokens ahead and one behind (expect() reads back the value it
+    just consumed), so a handful of slots is enough.
+    Reads past the end of the iterator give EOF, like TokenStream.
+    """
+    def __init__(self, tokens, size=8, source=None):
+        if size & (size - 1):
+            raise ValueError(f"ring size must be a power of two, got {size}")
+        self._tokens = iter(tokens)
+        self._mask = size - 1
+        self.size = size
+        self.source = source   # str or bytes-like, only used for columns
+        self.filled = 0        # number of tokens pulled so far
+        self._kinds = [Tok.EOF] * size
+        self._items = [EOF_TOKEN] * size
+        self._cols = [-1] * size
+        self._line = 1
+        self._line_offset = 0  # where the current line starts
+        self.kinds = _RingKinds(self)
+
+    def _fill(self, i):
+        """Pull tokens until position `i` is buffered; False if the input ends first."""
+        if i < self.filled - self.size:
+            raise RuntimeError(f"token {i} has already left the {self.size}-token window")
+        for tok in self._tokens:
+            slot = self.filled & self._mask
+            self._kinds[slot] = KIND_CODES[tok[0]]
+            self._items[slot] = tok
+            if tok[3] != self._line:
+                self._line = tok[3]
+                self._line_offset = self._line_start(tok[2])
+            self._cols[slot] = tok[2] - self._line_offset + 1
+            self.filled += 1
+            if self.filled > i:
+                return True
+        return False
+
+    def __len__(self):
+        return self.filled
+
+    def kind(self, i):
+        if i < self.filled - self.size or i >= self.filled:
+            if not self._fill(i):
+                return Tok.EOF
+        return self._kinds[i & self._mask]
+
+    def __getitem__(self, i):
+        """The (kind, value, offset, line) tuple at position i."""
+        if i < self.filled - self.size or i >= self.filled:
+            if not self._fill(i):
+                return EOF_TOKEN
+        return self._items[i & self._mask]
+
+    def _line_start(self, offset):
+        source = self.source
+        if source is None:
+            return offset
+        return source.rfind('\n' if isinstance(source, str) else b'\n', 0, offset) + 1
+
+    def position(self, i):
+        """(line, col) of token i, both 1-based; (-1, -1) past the end."""
+        if i < self.filled - self.size or i >= self.filled:
+            if not self._fill(i):
+                return (-1, -1)
+        slot = i & self._mask
+        return (self._items[slot][3], self._cols[slot])
+
+    def value(self, i):
+        return self[i][1]
+
+    def offset(self, i):
+        return self[i][2]
+
+    def line(self, i):
+        return self[i][3]
+
+class _RingKinds:
+    """`ring.kinds[i]`, so the parser's fast path works on a TokenRing too."""
+    __slots__ = ('kind',)
+
+    def __init__(self, ring):
+        self.kind = ring.kind
+
+    def __getitem__(self, i):
+        return self.kind(i)
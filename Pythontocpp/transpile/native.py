@@ -0,0 +1,83 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+from resolver import CompileError
+from memo import pure_functions
+from interpreter.interpreter import RuntimeErrorWithLine
+from .to_cpp import CppEmitter, INT, DOUBLE
+
+# Runs programs as native executables: the C++ from to_cpp.py is built with
+# the local g++ and the binary is kept, named by the SHA-256 of the C++
+# source and the compiler command, in CACHE_DIR.  A program seen before
+# therefore runs without compiling.  Binaries are built under a temporary
+# name and os.replace()d into place, so concurrent runs only ever see
+# complete files.
+#
+# $CXX picks the compiler and $PYTHONTOCPP_NATIVE_CACHE the cache directory.
+
+CXX = os.environ.get('CXX', 'g++')
+CXXFLAGS = ('-O2', '-std=c++17')
+CACHE_DIR = os.environ.get('PYTHONTOCPP_NATIVE_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'pythontocpp', 'native'))
+
+def build(source):
+    """Path of an executable built from the C++ `source`, compiling it unless cached."""
+    command = (CXX,) + CXXFLAGS
+    key = hashlib.sha256('\0'.join(command + (source,)).encode('utf-8')).hexdigest()
+    binary = os.path.join(CACHE_DIR, key)
+    if os.path.exists(binary):
+        return binary
+    if shutil.which(CXX) is None:
+        raise RuntimeError(f"The native backend needs a C++ compiler; '{CXX}' was not found")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=CACHE_DIR) as work:
+        cpp = os.path.join(work, 'program.cpp')
+        with open(cpp, 'w', encoding='utf-8') as f:
+            f.write(source)
+        built = os.path.join(work, 'program')
+        result = subprocess.run([*command, '-o', built, cpp], capture_output=True, text=True)
+        if result.returncode != 0:
+            errors = [line for line in result.stderr.splitlines() if 'error' in line]
+            raise CompileError(f"g++ rejected the generated C++: {(errors or result.stderr.splitlines() or ['?'])[0]}")
+        os.replace(built, binary)
+    return binary
+
+class NativeBackend:
+    """Runs a program as a native executable; a drop-in for InterpreterWithFunctions."""
+    def __init__(self, program, memo=False):
+        emitter = CppEmitter(program, pure_functions(program) if memo else ())
+        self.stats = {}     # memo table counts of the last run, by function name
+        self.source = emitter.emit_program()
+        if 'main' not in emitter.functions:
+            raise RuntimeError("No main() function found")
+        self.result_type = emitter.return_type('main')
+        self.binary = build(self.source)
+
+    def memo_stats(self):
+        return self.stats
+
+    def run(self):
+        result = subprocess.run([self.binary], capture_output=True, text=True)
+        # print() output goes wherever sys.stdout points, as with the interpreter
+        sys.stdout.write(result.stdout)
+        status = result.stderr
+        self.stats = {}
+        while status.startswith('memo:'):
+            line, _, status = status.partition('\n')
+            name, hits, calls, entries = line[len('memo:'):].split(':')
+            self.stats[name] = {'hits': int(hits), 'calls': int(calls), 'entries': int(entries)}
+        if result.returncode != 0 or not status.startswith('return:'):
+            if status.startswith('error:'):
+                line, col, message = status[len('error:'):].rstrip('\n').split(':', 2)
+                raise RuntimeErrorWithLine(message, SimpleNamespace(line=int(line) or None, col=int(col) or None))
+            raise RuntimeErrorWithLine(f"Native program failed with exit status {result.returncode}: {status.strip()}")
+        value = status[len('return:'):]
+        if self.result_type == INT:
+            return int(value)
+        if self.result_type == DOUBLE:
+            return float(value)
+        return value
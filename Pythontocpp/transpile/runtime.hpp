@@ -0,0 +1,210 @@
+// Runtime of the C++ that transpile/to_cpp.py generates; pasted at the top
+// of every translation unit.  It gives the guest program the interpreter's
+// behaviour where C++ differs: flooring / and %, checked array indices,
+// division and integer overflow, a call depth limit, and Python's formatting
+// of printed doubles.
+//
+// A failing check writes "error:<line>:<col>:<message>" to stderr and exits
+// with status 1; on success main() writes "return:<value>" instead, after a
+// "memo:<function>:<hits>:<calls>:<entries>" line per memoised function.
+#include <climits>
+#include <cmath>
+#include <cstdio>
+#include <cstdlib>
+#include <iostream>
+#include <map>
+#include <string>
+#include <tuple>
+#include <vector>
+
+static const long long PP_MAX_CALL_DEPTH = PP_DEPTH_LIMIT;
+static long long pp_depth = 0;
+
+[[noreturn]] static void pp_fail(int line, int col, const char *message) {
+    std::cout.flush();
+    std::cerr << "error:" << line << ':' << col << ':' << message << std::endl;
+    std::exit(1);
+}
+
+[[noreturn]] static void pp_fail(int line, int col, const std::string &message) {
+    pp_fail(line, col, message.c_str());
+}
+
+// One per guest call, alive for the call's duration.
+struct pp_Frame {
+    pp_Frame(int line, int col) {
+        if (++pp_depth > PP_MAX_CALL_DEPTH)
+            pp_fail(line, col, "Stack overflow: more than " + std::to_string(PP_MAX_CALL_DEPTH) + " nested calls");
+    }
+    ~pp_Frame() { --pp_depth; }
+};
+
+// ---------------- Memoisation ----------------
+// Results of a pure function by argument tuple (see memo.py), kept until
+// there are PP_MEMO_MAX_ENTRIES of them.
+template <typename R, typename... Args>
+struct pp_Memo {
+    typedef std::tuple<Args...> Key;
+    const char *name;
+    std::map<Key, R> values;
+    long long hits = 0, calls = 0;
+
+    explicit pp_Memo(const char *name) : name(name) {}
+
+    // the stored result for `key`, or nullptr; counts a call
+    const R *find(const Key &key) {
+        ++calls;
+        auto it = values.find(key);
+        if (it == values.end())
+            return nullptr;
+        ++hits;
+        return &it->second;
+    }
+
+    R store(const Key &key, R value) {
+        if ((long long)values.size() < PP_MEMO_MAX_ENTRIES)
+            values.emplace(key, value);
+        return value;
+    }
+
+    void report() const {
+        std::cerr << "memo:" << name << ':' << hits << ':' << calls << ':' << values.size() << '\n';
+    }
+};
+
+// ---------------- Arithmetic ----------------
+// The interpreter's integers grow without bound; these are 64-bit, so a
+// result that does not fit stops the program instead of wrapping.
+[[noreturn]] static void pp_overflow(int line, int col) {
+    pp_fail(line, col, "integer overflow: the native engine's integers are 64-bit");
+}
+
+static inline long long pp_iadd(long long l, long long r, int line, int col) {
+    long long sum;
+    if (__builtin_add_overflow(l, r, &sum))
+        pp_overflow(line, col);
+    return sum;
+}
+
+static inline long long pp_isub(long long l, long long r, int line, int col) {
+    long long difference;
+    if (__builtin_sub_overflow(l, r, &difference))
+        pp_overflow(line, col);
+    return difference;
+}
+
+static inline long long pp_imul(long long l, long long r, int line, int col) {
+    long long product;
+    if (__builtin_mul_overflow(l, r, &product))
+        pp_overflow(line, col);
+    return product;
+}
+
+static inline long long pp_ineg(long long v, int line, int col) {
+    if (v == LLONG_MIN)
+        pp_overflow(line, col);
+    return -v;
+}
+
+// ++ (step 1) or -- (step -1) of `target`, giving the old value if postfix
+static inline long long pp_istep(long long &target, long long step, bool postfix, int line, int col) {
+    long long old = target;
+    target = pp_iadd(old, step, line, col);
+    return postfix ? old : target;
+}
+
+static inline long long pp_idiv(long long l, long long r, int line, int col) {
+    if (r == 0)
+        pp_fail(line, col, "integer division or modulo by zero");
+    if (l == LLONG_MIN && r == -1)
+        pp_overflow(line, col);
+    long long q = l / r;
+    if ((l % r != 0) && ((l < 0) != (r < 0)))
+        --q;
+    return q;
+}
+
+static inline long long pp_imod(long long l, long long r, int line, int col) {
+    if (r == 0)
+        pp_fail(line, col, "integer division or modulo by zero");
+    if (r == -1)
+        return 0;   // LLONG_MIN % -1 traps
+    long long m = l % r;
+    if (m != 0 && ((m < 0) != (r < 0)))
+        m += r;
+    return m;
+}
+
+static inline double pp_fdiv(double l, double r, int line, int col) {
+    if (r == 0)
+        pp_fail(line, col, "float division by zero");
+    return l / r;
+}
+
+static inline double pp_fmod(double l, double r, int line, int col) {
+    if (r == 0)
+        pp_fail(line, col, "float modulo");
+    double m = std::fmod(l, r);
+    if (m != 0 && ((m < 0) != (r < 0)))
+        m += r;
+    return m;
+}
+
+// ---------------- Arrays ----------------
+static inline long long pp_at(long long i, long long size, int line, int col) {
+    if (i < 0 || i >= size)
+        pp_fail(line, col, "Array index " + std::to_string(i) + " out of bounds");
+    return i;
+}
+
+// ---------------- Printing ----------------
+// Python's repr() of a float: the shortest digits that read back as the same
+// double, positional between 1e-4 and 1e16, scientific outside.
+static std::string pp_repr(double value) {
+    if (std::isnan(value))
+        return "nan";
+    if (std::isinf(value))
+        return value < 0 ? "-inf" : "inf";
+    char buffer[32];
+    for (int precision = 1; precision <= 17; ++precision) {
+        std::snprintf(buffer, sizeof buffer, "%.*e", precision - 1, value);
+        if (std::strtod(buffer, nullptr) == value)
+            break;
+    }
+    std::string text(buffer);
+    std::size_t e = text.find('e');
+    int exponent = std::atoi(text.c_str() + e + 1);
+    std::string sign = text[0] == '-' ? "-" : "";
+    std::string digits;
+    for (std::size_t i = sign.size(); i < e; ++i)
+        if (text[i] != '.')
+            digits += text[i];
+    if (exponent < -4 || exponent >= 16) {
+        std::string mantissa = digits.substr(0, 1);
+        if (digits.size() > 1)
+            mantissa += "." + digits.substr(1);
+        std::string power = std::to_string(exponent < 0 ? -exponent : exponent);
+        if (power.size() < 2)
+            power = "0" + power;
+        return sign + mantissa + "e" + (exponent < 0 ? "-" : "+") + power;
+    }
+    if (exponent < 0)
+        return sign + "0." + std::string(-exponent - 1, '0') + digits;
+    if ((int)digits.size() <= exponent + 1)
+        return sign + digits + std::string(exponent + 1 - digits.size(), '0') + ".0";
+    return sign + digits.substr(0, exponent + 1) + "." + digits.substr(exponent + 1);
+}
+
+static inline void pp_print(long long value) { std::cout << value << '\n'; }
+static inline void pp_print(int value) { pp_print((long long)value); }
+static inline void pp_print(bool value) { pp_print((long long)value); }
+static inline void pp_print(double value) { std::cout << pp_repr(value) << '\n'; }
+static inline void pp_print(char value) { std::cout << value << '\n'; }
+static inline void pp_print(const std::string &value) { std::cout << value << '\n'; }
+
+static inline void pp_result(long long value) { std::cerr << "return:" << value; }
+static inline void pp_result(int value) { pp_result((long long)value); }
+static inline void pp_result(bool value) { pp_result((long long)value); }
+static inline void pp_result(double value) { std::cerr << "return:" << pp_repr(value); }
+static inline void pp_result(char value) { std::cerr << "return:" << value; }
+static inline void pp_result(const std::string &value) { std::cerr << "return:" << value; }
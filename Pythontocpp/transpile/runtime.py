@@ -0,0 +1,42 @@
+from interpreter.interpreter import RuntimeErrorWithLine
+from operators import divide as _div
+
+# Helpers the Python that transpile/to_python.py generates calls into, for
+# the few operations that have no direct Python spelling.
+
+def _and(l, r):
+    """&& once both operands are evaluated, as the interpreter does it."""
+    return 1 if l and r else 0
+
+def _or(l, r):
+    return 1 if l or r else 0
+
+def _oob(i):
+    raise RuntimeErrorWithLine(f"Array index {i} out of bounds")
+
+def _at(a, i):
+    """`i`, checked as an index into `a`."""
+    if i < 0 or i >= len(a):
+        raise RuntimeErrorWithLine(f"Array index {i} out of bounds")
+    return i
+
+def _load(a, i):
+    if i < 0 or i >= len(a):
+        raise RuntimeErrorWithLine(f"Array index {i} out of bounds")
+    return a[i]
+
+def _step(a, i, delta, postfix):
+    """++ (delta 1) or -- (delta -1) on a[i]; returns the expression's value."""
+    if i < 0 or i >= len(a):
+        raise RuntimeErrorWithLine(f"Array index {i} out of bounds")
+    old = a[i]
+    a[i] = new = old + delta
+    return old if postfix else new
+
+def _new_array(dims, default=0):
+    if len(dims) == 1:
+        return [default] * dims[0]
+    return [_new_array(dims[1:], default) for _ in range(dims[0])]
+
+def _fail(error_type, message):
+    raise error_type(message)
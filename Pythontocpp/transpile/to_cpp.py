@@ -0,0 +1,467 @@
+import os
+from ast_nodes import *
+from resolver import CompileError, resolve, is_resolved, case_value, nesting_guard
+from limits import MAX_CALL_DEPTH
+from memo import MEMO_MAX_ENTRIES
+
+# Translation of a Program to a self-contained C++17 translation unit.
+#
+# Every guest function becomes `f_<name>` and every local `<name>_<slot>`, as
+# in to_python.py.  The dialect only declares the types of variables and
+# parameters, so expressions are typed bottom-up from them, and a function
+# returns the join of the types of its `return` expressions (found by
+# emitting the program until the return types stop changing).  Guest types
+# map onto four C++ types: long long, double, char and std::string.
+# Arrays are flat std::vectors indexed through bounds checks.
+#
+# Where C++ and the interpreter disagree, the interpreter wins: / and %
+# floor, && and || evaluate both operands, and operands and arguments with
+# side effects are evaluated left to right (through an immediately invoked
+# lambda, which g++ inlines).  switch/break/continue are C's, as in the VM.
+# The helpers for all of this are in runtime.hpp, which is pasted in front
+# of the generated code.  Integers are 64-bit, where the interpreter's grow
+# without bound: integer arithmetic is checked, and a result that does not
+# fit stops the program with an error rather than wrapping.
+
+INT, DOUBLE, CHAR, STRING = 'long long', 'double', 'char', 'std::string'
+
+DECLARED_TYPES = {'INT': INT, 'LONG': INT, 'LONG LONG': INT, 'BOOL': INT,
+                  'FLOAT': DOUBLE, 'DOUBLE': DOUBLE, 'CHAR': CHAR, 'STRING': STRING}
+DEFAULTS = {INT: '0', DOUBLE: '0.0', CHAR: "'\\0'", STRING: 'std::string()'}
+
+OPERATORS = {'PLUS': '+', 'MINUS': '-', 'MULT': '*',
+             'EQ': '==', 'NE': '!=', 'LT': '<', 'LE': '<=', 'GT': '>', 'GE': '>='}
+COMPARISONS = frozenset(('EQ', 'NE', 'LT', 'LE', 'GT', 'GE'))
+CHECKED = {'PLUS': 'pp_iadd', 'MINUS': 'pp_isub', 'MULT': 'pp_imul'}   # on integers
+OVERFLOW = "integer overflow: the native engine's integers are 64-bit"
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runtime.hpp'), encoding='utf-8') as f:
+    RUNTIME = f.read()
+
+def _escape(text):
+    """The body of a C++ literal spelling the UTF-8 bytes of `text`."""
+    out = []
+    for byte in text.encode('utf-8'):
+        ch = chr(byte)
+        if ch in '\\"\'':
+            out.append('\\' + ch)
+        elif 32 <= byte < 127 and ch != '?':   # '?' could start a trigraph
+            out.append(ch)
+        else:
+            out.append(f'\\{byte:03o}')
+    return ''.join(out)
+
+def _arithmetic(left, right):
+    return DOUBLE if DOUBLE in (left, right) else INT
+
+class Expr:
+    """Emitted C++ for an expression, its type, and whether evaluating it
+    may be observed (a call, an increment, or a check that can fail)."""
+    __slots__ = ('code', 'ctype', 'impure')
+
+    def __init__(self, code, ctype, impure=False):
+        self.code = code
+        self.ctype = ctype
+        self.impure = impure
+
+class _Local:
+    __slots__ = ('ctype', 'dims')
+
+    def __init__(self, ctype, dims=None):
+        self.ctype = ctype
+        self.dims = dims    # array dimensions, or None for a scalar
+
+class CppEmitter:
+    def __init__(self, program, memo=()):
+        if not is_resolved(program):
+            resolve(program)
+        self.program = program
+        self.functions = {fn.name: fn for fn in program.functions}
+        self.memo = frozenset(memo)     # names of the functions to memoise (see memo.py)
+        # name -> C++ type, None until known; declared return types are used as given
+        self.returns = {fn.name: DECLARED_TYPES.get(fn.ret_type) for fn in program.functions}
+        self.lines = []
+        self.indent = 0
+        self.where = None
+        self.locals = {}
+        self.loops = []          # enclosing loops and switches: True for a loop
+
+    # ---------------- Output ----------------
+    def line(self, text):
+        self.lines.append('    ' * self.indent + text if text else '')
+
+    def position(self, node=None):
+        """`line, col` arguments for runtime checks failing at `node`."""
+        node = node or self.where
+        return f"{node.line or 0}, {node.col or 0}"
+
+    def emit_program(self):
+        # every pass can type more calls; the types only ever widen
+        with nesting_guard():
+            while True:
+                before = dict(self.returns)
+                source = self.translation_unit()
+                if self.returns == before:
+                    return source
+
+    def translation_unit(self):
+        self.lines = []
+        self.line(f"#define PP_DEPTH_LIMIT {MAX_CALL_DEPTH}")
+        self.line(f"#define PP_MEMO_MAX_ENTRIES {MEMO_MAX_ENTRIES}")
+        self.lines.append(RUNTIME.rstrip('\n'))
+        self.line('')
+        for fn in self.program.functions:
+            self.line(f"static {self.signature(fn)};")
+        for fn in self.program.functions:
+            if fn.name in self.memo:
+                types = [self.return_type(fn.name)] + [DECLARED_TYPES.get(vtype, INT) for vtype, _ in fn.params]
+                self.line(f"static pp_Memo<{', '.join(types)}> pp_memo_{fn.name}(\"{fn.name}\");")
+        for fn in self.program.functions:
+            self.function(fn)
+        if 'main' in self.functions:
+            self.line('')
+            self.line("int main() {")
+            self.line("    std::ios::sync_with_stdio(false);")
+            self.line("    auto result = f_main(0, 0);")
+            self.line("    std::cout.flush();")
+            for name in sorted(self.memo):
+                self.line(f"    pp_memo_{name}.report();")
+            self.line("    pp_result(result);")
+            self.line("    return 0;")
+            self.line("}")
+        return '\n'.join(self.lines) + '\n'
+
+    def return_type(self, name):
+        return self.returns[name] or INT
+
+    def signature(self, fn):
+        # every call also passes the position of the calling statement, for
+        # the stack overflow error
+        params = [f"{DECLARED_TYPES.get(vtype, INT)} {name}_{slot}" for slot, (vtype, name) in enumerate(fn.params)]
+        return f"{self.return_type(fn.name)} f_{fn.name}({', '.join(params + ['int pp_line', 'int pp_col'])})"
+
+    # ---------------- Functions ----------------
+    def function(self, fn):
+        self.where = fn
+        self.fn = fn
+        self.locals = {slot: _Local(DECLARED_TYPES.get(vtype, INT)) for slot, (vtype, _) in enumerate(fn.params)}
+        self.line('')
+        self.line(f"static {self.signature(fn)} {{")
+        self.indent += 1
+        if fn.name in self.memo:
+            # the arguments as passed: the body may assign to its parameters
+            params = ', '.join(f"{name}_{slot}" for slot, (_, name) in enumerate(fn.params))
+            self.line(f"auto pp_key = std::make_tuple({params});")
+            self.line(f"if (auto pp_hit = pp_memo_{fn.name}.find(pp_key))")
+            self.line("    return *pp_hit;")
+        self.line("pp_Frame pp_frame(pp_line, pp_col);")
+        self.block(fn.body)
+        # falling off the end returns None to the interpreter
+        self.line(f"return {self.result(DEFAULTS[self.return_type(fn.name)])};")
+        self.indent -= 1
+        self.line("}")
+        self.where = None
+
+    def result(self, code):
+        """What a `return` of `code` returns, stored first in a memoised function."""
+        if self.fn.name in self.memo:
+            return f"pp_memo_{self.fn.name}.store(pp_key, {code})"
+        return code
+
+    def returned(self, ctype):
+        """Widen the current function's return type to cover `ctype`."""
+        current = self.returns[self.fn.name]
+        if ctype is None or current == ctype:
+            return
+        if current is None:
+            self.returns[self.fn.name] = ctype
+        elif STRING in (current, ctype):
+            self.returns[self.fn.name] = STRING
+        else:
+            self.returns[self.fn.name] = _arithmetic(current, ctype)
+
+    # ---------------- Statements ----------------
+    def body(self, block):
+        self.indent += 1
+        self.block(block)
+        self.indent -= 1
+
+    def block(self, block):
+        for stmt in block.stmts:
+            self.stmt(stmt)
+
+    def stmt(self, stmt):
+        if stmt is None:
+            return
+        handler = getattr(self, 'stmt_' + type(stmt).__name__, None)
+        if handler is None:
+            return   # statements the interpreter ignores as well
+        outer, self.where = self.where, stmt
+        handler(stmt)
+        self.where = outer
+
+    def simple(self, stmt):
+        """C++ for a declaration, assignment or expression statement, without
+        the ';', so that it also fits the head of a for loop."""
+        outer, self.where = self.where, stmt
+        try:
+            if isinstance(stmt, VarDecl):
+                ctype = DECLARED_TYPES.get(stmt.vtype, INT)
+                self.locals[stmt.slot] = _Local(ctype)
+                value = DEFAULTS[ctype] if stmt.init is None else self.expr(stmt.init).code
+                return f"{ctype} {stmt.name}_{stmt.slot} = {value}"
+            if isinstance(stmt, Assignment):
+                value = self.expr(stmt.expr)
+                if isinstance(stmt.name, ArrayRef):
+                    # C++17 evaluates the right of = first, as the interpreter does
+                    return f"{self.element(stmt.name).code} = {value.code}"
+                return f"{stmt.name}_{stmt.slot} = {value.code}"
+            if isinstance(stmt, ExprStmt):
+                stmt = stmt.expr
+            return self.expr(stmt).code
+        finally:
+            self.where = outer
+
+    def stmt_VarDecl(self, stmt):
+        self.line(self.simple(stmt) + ';')
+
+    stmt_Assignment = stmt_ExprStmt = stmt_UnaryOp = stmt_VarDecl
+
+    def stmt_ArrayDecl(self, stmt):
+        ctype = DECLARED_TYPES.get(stmt.vtype, INT)
+        self.locals[stmt.slot] = _Local(ctype, tuple(stmt.dims))
+        size = 1
+        for dim in stmt.dims:
+            size *= dim
+        self.line(f"std::vector<{ctype}> {stmt.name}_{stmt.slot}({size});")
+
+    def stmt_PrintStmt(self, stmt):
+        self.line(f"pp_print({self.expr(stmt.expr).code});")
+
+    def stmt_ReturnStmt(self, stmt):
+        value = self.expr(stmt.expr)
+        self.returned(value.ctype)
+        self.line(f"return {self.result(value.code)};")
+
+    def stmt_IfStmt(self, stmt):
+        self.line(f"if ({self.expr(stmt.cond).code}) {{")
+        self.body(stmt.then_block)
+        else_block = stmt.else_block
+        while else_block is not None:
+            chained = else_block.stmts[0] if len(else_block.stmts) == 1 else None
+            if isinstance(chained, IfStmt):
+                outer, self.where = self.where, chained
+                self.line(f"}} else if ({self.expr(chained.cond).code}) {{")
+                self.body(chained.then_block)
+                self.where = outer
+                else_block = chained.else_block
+            else:
+                self.line("} else {")
+                self.body(else_block)
+                break
+        self.line("}")
+
+    def loop(self, body):
+        self.loops.append(True)
+        self.body(body)
+        self.loops.pop()
+        self.line("}")
+
+    def stmt_WhileStmt(self, stmt):
+        self.line(f"while ({self.expr(stmt.cond).code}) {{")
+        self.loop(stmt.body)
+
+    def stmt_ForStmt(self, stmt):
+        init = self.simple(stmt.init) if stmt.init is not None else ''
+        cond = self.expr(stmt.cond).code if stmt.cond is not None else ''
+        update = self.simple(stmt.update) if stmt.update is not None else ''
+        self.line(f"for ({init}; {cond}; {update}) {{")
+        self.loop(stmt.body)
+
+    def stmt_SwitchStmt(self, stmt):
+        subject = self.expr(stmt.expr)
+        if subject.ctype not in (INT, CHAR):
+            raise CompileError(f"the native backend cannot switch on a {subject.ctype}", stmt)
+        self.line(f"switch ({subject.code}) {{")
+        self.loops.append(False)
+        seen = set()
+        for case in stmt.cases:
+            value = case_value(case.value)
+            if value in seen:
+                raise CompileError(f"duplicate case value {value!r}", case)
+            seen.add(value)
+            if isinstance(value, str) and len(value.encode('utf-8')) == 1:
+                label = f"'{_escape(value)}'"
+            elif isinstance(value, int):
+                label = str(value)
+            else:
+                raise CompileError(f"the native backend cannot use {value!r} as a case value", case)
+            # braces keep each case's declarations out of the others' way
+            self.line(f"case {label}: {{")
+            self.body(case.body)
+            self.line("}")
+        if stmt.default is not None:
+            self.line("default: {")
+            self.body(stmt.default.body)
+            self.line("}")
+        self.loops.pop()
+        self.line("}")
+
+    def stmt_BreakStmt(self, stmt):
+        if not self.loops:
+            raise CompileError("break outside a loop or switch", stmt)
+        self.line("break;")
+
+    def stmt_ContinueStmt(self, stmt):
+        if True not in self.loops:
+            raise CompileError("continue outside a loop", stmt)
+        self.line("continue;")
+
+    # ---------------- Expressions ----------------
+    def expr(self, expr):
+        if expr is None:
+            return Expr('0', INT)
+        handler = getattr(self, 'expr_' + type(expr).__name__, None)
+        if handler is None:
+            return self.fail(f"Unknown expression {expr} of type {type(expr)}")
+        return handler(expr)
+
+    def fail(self, message):
+        return Expr(f'(pp_fail({self.position()}, "{_escape(message)}"), 0LL)', INT, True)
+
+    def in_order(self, operands, combine, ctype):
+        """Combine the operands' code with `combine`, evaluating the operands
+        left to right if more than one of them is impure."""
+        impure = [operand.impure for operand in operands]
+        if impure.count(True) < 2:
+            return Expr(combine(*(operand.code for operand in operands)), ctype, any(impure))
+        temps = [f"pp{i}" for i in range(len(operands))]
+        decls = ' '.join(f"{operand.ctype or 'auto'} {temp} = {operand.code};"
+                         for temp, operand in zip(temps, operands))
+        return Expr(f"[&] {{ {decls} return {combine(*temps)}; }}()", ctype, True)
+
+    def expr_Number(self, expr):
+        value = expr.value
+        if isinstance(value, float):
+            return Expr(repr(value), DOUBLE)
+        if not -2**63 <= value < 2**63:
+            return self.fail(OVERFLOW)   # folded by the optimizer
+        if value == -2**63:
+            return Expr("LLONG_MIN", INT)   # 9223372036854775808LL does not fit
+        return Expr(str(value) if -2**31 <= value < 2**31 else f"{value}LL", INT)
+
+    def expr_String(self, expr):
+        return Expr(f'std::string("{_escape(expr.value)}")', STRING)
+
+    def expr_Char(self, expr):
+        if len(expr.value.encode('utf-8')) != 1:
+            raise CompileError(f"the native backend cannot store {expr.value!r} in a char", expr)
+        return Expr(f"'{_escape(expr.value)}'", CHAR)
+
+    def expr_VarRef(self, expr):
+        if expr.slot is None:   # TRUE / FALSE
+            return Expr('1' if expr.name == 'TRUE' else '0', INT)
+        return Expr(f"{expr.name}_{expr.slot}", self.locals[expr.slot].ctype)
+
+    def element(self, ref):
+        """The element of array `ref`, through bounds-checked indices."""
+        local = self.locals[ref.slot]
+        if local.dims is None or len(ref.indices) != len(local.dims):
+            raise CompileError(f"the native backend needs all {len(local.dims or ())} indices of '{ref.name}'", ref)
+        indices = [self.expr(index) for index in ref.indices]
+        where = self.position()
+        def combine(*codes):
+            flat = None
+            for code, dim in zip(codes, local.dims):
+                checked = f"pp_at({code}, {dim}, {where})"
+                flat = checked if flat is None else f"({flat}) * {dim} + {checked}"
+            return f"{ref.name}_{ref.slot}[{flat}]"
+        element = self.in_order(indices, combine, local.ctype)
+        element.impure = True   # the bounds check can fail
+        return element
+
+    expr_ArrayRef = element
+
+    def expr_BinaryOp(self, expr):
+        left, right = self.expr(expr.left), self.expr(expr.right)
+        op = expr.op
+        if op in COMPARISONS:
+            symbol = OPERATORS[op]
+            return self.in_order((left, right), lambda l, r: f"({l} {symbol} {r})", INT)
+        if op in ('AND', 'OR'):
+            symbol = '&&' if op == 'AND' else '||'
+            if right.impure:
+                # both operands are evaluated, as the interpreter does
+                left.impure = True
+            return self.in_order((left, right), lambda l, r: f"({l} {symbol} {r})", INT)
+        if op == 'PLUS' and STRING in (left.ctype, right.ctype):
+            return self.in_order((left, right), lambda l, r: f"({l} + {r})", STRING)
+        if op == 'PLUS' and left.ctype == right.ctype == CHAR:
+            return self.in_order((left, right), lambda l, r: f"(std::string(1, {l}) + {r})", STRING)
+        ctype = _arithmetic(left.ctype, right.ctype)
+        if op in CHECKED and ctype == INT:
+            helper, where = CHECKED[op], self.position()
+            result = self.in_order((left, right), lambda l, r: f"{helper}({l}, {r}, {where})", ctype)
+            result.impure = True
+            return result
+        if op in OPERATORS:
+            symbol = OPERATORS[op]
+            return self.in_order((left, right), lambda l, r: f"({l} {symbol} {r})", ctype)
+        if op in ('DIV', 'MOD'):
+            helper = {('DIV', INT): 'pp_idiv', ('DIV', DOUBLE): 'pp_fdiv',
+                      ('MOD', INT): 'pp_imod', ('MOD', DOUBLE): 'pp_fmod'}[op, ctype]
+            where = self.position()
+            result = self.in_order((left, right), lambda l, r: f"{helper}({l}, {r}, {where})", ctype)
+            result.impure = True
+            return result
+        return self.fail(f"Unknown binary operator {op}")
+
+    def expr_UnaryOp(self, expr):
+        op = expr.op
+        if op in ('PLUSPLUS', 'MINUSMINUS'):
+            operand = expr.operand
+            if isinstance(operand, VarRef):
+                target = self.expr_VarRef(operand)
+            elif isinstance(operand, ArrayRef):
+                target = self.element(operand)
+            else:
+                return self.fail(f"Invalid unary operation {op}")
+            if target.ctype == INT:
+                step = 1 if op == 'PLUSPLUS' else -1
+                postfix = 'true' if expr.postfix else 'false'
+                return Expr(f"pp_istep({target.code}, {step}, {postfix}, {self.position()})", INT, True)
+            symbol = '++' if op == 'PLUSPLUS' else '--'
+            code = f"{target.code}{symbol}" if expr.postfix else f"{symbol}{target.code}"
+            return Expr(code, target.ctype, True)
+        operand = self.expr(expr.operand)
+        if op == 'NOT':
+            return Expr(f"(!{operand.code})", INT, operand.impure)
+        if op == 'MINUS' and _arithmetic(operand.ctype, INT) == INT:
+            return Expr(f"pp_ineg({operand.code}, {self.position()})", INT, True)
+        if op in ('MINUS', 'PLUS'):
+            symbol = '-' if op == 'MINUS' else '+'
+            return Expr(f"({symbol}{operand.code})", _arithmetic(operand.ctype, INT), operand.impure)
+        return self.fail(f"Unknown unary operator {op}")
+
+    def expr_Cast(self, expr):
+        value = self.expr(expr.expr)
+        ctype = INT if expr.ctype == 'int' else DOUBLE
+        return Expr(f"static_cast<{ctype}>({value.code})", ctype, value.impure)
+
+    def expr_FunctionCall(self, expr):
+        fn = self.functions.get(expr.name)
+        if fn is None:
+            return self.fail(f"Function '{expr.name}' not defined")
+        if len(fn.params) != len(expr.args):
+            return self.fail(f"Function '{expr.name}' expects {len(fn.params)} args, got {len(expr.args)}")
+        args = [self.expr(arg) for arg in expr.args]
+        where = self.position()
+        call = self.in_order(args, lambda *codes: f"f_{expr.name}({', '.join(codes + (where,))})",
+                             self.returns[expr.name])
+        call.impure = True
+        return call
+
+def emit_cpp(program, memo=()):
+    """Translate `program` to the source of a C++17 program, memoising the
+    functions named in `memo`."""
+    return CppEmitter(program, memo).emit_program()
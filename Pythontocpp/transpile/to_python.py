@@ -0,0 +1,465 @@
+import operator
+import sys
+from ast_nodes import *
+from resolver import CompileError, resolve, is_resolved, case_value, nesting_guard
+from interpreter.interpreter import RuntimeErrorWithLine
+from limits import MAX_CALL_DEPTH
+from interpreter.closures import DEFAULT_VALUES
+from memo import pure_functions, table_stats
+
+# Ahead-of-time translation of a Program to Python source.
+#
+# Every guest function becomes a Python function `f_<name>` and every local
+# a Python local `<name>_<slot>` (slots come from resolver.py, so shadowed
+# names get distinct locals).  C loops become `while` loops; a `for` loop's
+# update is repeated before each `continue` that skips it.  A `switch`
+# becomes a lookup of the case's index in a constant dict, then a run-once
+# `while True:` loop whose body holds one `if <index> <= i:` per case, in
+# order, so execution falls through from one case into the next and
+# `break` leaves the switch.  A `continue` inside a switch sets `_cont` and
+# breaks out, and the code after the switch continues the loop.
+#
+# Semantics are the VM's (see vm/codegen.py): C switch/break/continue, &&
+# and || evaluating both operands, `/` flooring for two ints, and bounds
+# checks on every array access.  ++/-- on an array element evaluates its
+# indices once, as C does, where the interpreters evaluate them twice.
+#
+# The generated source is compiled with compile() and run in CPython's own
+# bytecode, so CPython's nesting limits apply: a program with expressions
+# nested some 200 levels deep, or 20 nested loops, is a CompileError here
+# while the other engines run it.  Each line ends in a `# line:col` comment naming the guest
+# statement it came from, and PythonModule.position() maps a generated line
+# back to that statement for runtime errors.
+
+FILENAME = '<pythontocpp>'
+
+BINARY = {'PLUS': '+', 'MINUS': '-', 'MULT': '*', 'MOD': '%',
+          'EQ': '==', 'NE': '!=', 'LT': '<', 'LE': '<=', 'GT': '>', 'GE': '>='}
+COMPARISONS = frozenset(('EQ', 'NE', 'LT', 'LE', 'GT', 'GE'))
+
+def _simple(expr):
+    """Whether evaluating `expr` twice, or not at all, is unobservable."""
+    return isinstance(expr, (Number, String, Char, VarRef))
+
+class _Switch:
+    """A switch being emitted: whether a `continue` inside it needs `_cont`."""
+    __slots__ = ('uses_cont',)
+
+    def __init__(self):
+        self.uses_cont = False
+
+class PythonModule:
+    """Generated source plus the guest statement behind each of its lines."""
+    def __init__(self, source, positions):
+        self.source = source
+        self.positions = positions    # generated line (1-based) -> node or None
+
+    def position(self, lineno):
+        if 0 < lineno <= len(self.positions):
+            return self.positions[lineno - 1]
+        return None
+
+class PythonEmitter:
+    def __init__(self, program, memo=()):
+        if not is_resolved(program):
+            resolve(program)
+        self.program = program
+        self.functions = {fn.name: fn for fn in program.functions}
+        self.memo = frozenset(memo)     # names of the functions to memoise (see memo.py)
+        self.fn = None
+        self.lines = []
+        self.positions = []
+        self.indent = 0
+        self.where = None
+        self.tables = []        # switch dispatch dicts, emitted at the top
+        self.loops = []         # enclosing loops: ForStmt / WhileStmt / _Switch
+
+    # ---------------- Output ----------------
+    def line(self, text, at=None):
+        """Add a line of code, or insert it before line `at`."""
+        where = self.where
+        note = f"  # {where.line}:{where.col}" if text and where is not None and where.line is not None else ''
+        at = len(self.lines) if at is None else at
+        self.lines.insert(at, '    ' * self.indent + text + note if text else '')
+        self.positions.insert(at, where)
+
+    def module(self):
+        body_lines, body_positions = self.lines, self.positions
+        self.lines, self.positions = [], []
+        self.line("from transpile.runtime import _div, _and, _or, _oob, _at, _load, _step, _new_array, _fail")
+        for i, table in enumerate(self.tables):
+            self.line(f"_SWITCH{i} = {table!r}")
+        if self.memo:
+            self.line("from memo import MemoTable, MISSING as _MISSING")
+            for name in sorted(self.memo):
+                self.line(f"_MEMO_{name} = MemoTable({name!r})")
+        return PythonModule('\n'.join(self.lines + body_lines) + '\n', self.positions + body_positions)
+
+    # ---------------- Functions ----------------
+    def emit_program(self):
+        for fn in self.program.functions:
+            self.function(fn)
+        return self.module()
+
+    def function(self, fn):
+        self.where = fn
+        self.fn = fn
+        params = [f"{name}_{slot}" for slot, (_, name) in enumerate(fn.params)]
+        self.line('')
+        self.line(f"def f_{fn.name}({', '.join(params)}):")
+        if fn.name not in self.memo:
+            self.body(fn.body)
+        else:
+            # the arguments as passed: the body may assign to its parameters.
+            # Without a position, a stack overflow in the lookup is reported
+            # at the call, as it is without memoisation.
+            self.indent += 1
+            self.where = None
+            self.line(f"_key = ({', '.join(params)}{',' if len(params) == 1 else ''})")
+            self.line(f"_hit = _MEMO_{fn.name}.lookup(_key)")
+            self.line("if _hit is not _MISSING:")
+            self.line("    return _hit")
+            self.where = fn
+            self.block(fn.body)
+            self.line(f"return _MEMO_{fn.name}.store(_key, None)")
+            self.indent -= 1
+        self.where = None
+
+    # ---------------- Statements ----------------
+    def body(self, block):
+        """An indented suite for `block`."""
+        self.indent += 1
+        size = len(self.lines)
+        self.block(block)
+        if len(self.lines) == size:
+            self.line("pass")
+        self.indent -= 1
+
+    def block(self, block):
+        for stmt in block.stmts:
+            self.stmt(stmt)
+
+    def stmt(self, stmt):
+        if stmt is None:
+            return
+        handler = getattr(self, 'stmt_' + type(stmt).__name__, None)
+        if handler is None:
+            return   # statements the interpreter ignores as well
+        outer, self.where = self.where, stmt
+        handler(stmt)
+        self.where = outer
+
+    def stmt_VarDecl(self, stmt):
+        value = repr(DEFAULT_VALUES.get(stmt.vtype)) if stmt.init is None else self.expr(stmt.init)
+        self.line(f"{stmt.name}_{stmt.slot} = {value}")
+
+    def stmt_ArrayDecl(self, stmt):
+        dims, default = stmt.dims, DEFAULT_VALUES.get(stmt.vtype)
+        if len(dims) == 1:
+            self.line(f"{stmt.name}_{stmt.slot} = [{default!r}] * {dims[0]}")
+        else:
+            self.line(f"{stmt.name}_{stmt.slot} = _new_array({tuple(dims)!r}, {default!r})")
+
+    def stmt_Assignment(self, stmt):
+        if not isinstance(stmt.name, ArrayRef):
+            self.line(f"{stmt.name}_{stmt.slot} = {self.expr(stmt.expr)}")
+            return
+        ref = stmt.name
+        array = f"{ref.name}_{ref.slot}"
+        if len(ref.indices) == 1:
+            self.line(f"{array}[{self.checked_index(array, ref.indices[0])}] = {self.expr(stmt.expr)}")
+            return
+        # the value is evaluated before the indices
+        self.line(f"_v = {self.expr(stmt.expr)}")
+        row = array
+        for index in ref.indices[:-1]:
+            row = f"_load({row}, {self.expr(index)})"
+        self.line(f"_r = {row}")
+        self.line(f"_r[_at(_r, {self.expr(ref.indices[-1])})] = _v")
+
+    def stmt_PrintStmt(self, stmt):
+        self.line(f"print({self.expr(stmt.expr)})")
+
+    def stmt_ReturnStmt(self, stmt):
+        if self.fn.name in self.memo:
+            self.line(f"return _MEMO_{self.fn.name}.store(_key, {self.expr(stmt.expr)})")
+        else:
+            self.line(f"return {self.expr(stmt.expr)}")
+
+    def stmt_ExprStmt(self, stmt):
+        self.discard(stmt.expr)
+
+    def stmt_UnaryOp(self, stmt):
+        self.discard(stmt)
+
+    def discard(self, expr):
+        if (isinstance(expr, UnaryOp) and expr.op in ('PLUSPLUS', 'MINUSMINUS')
+                and isinstance(expr.operand, VarRef)):
+            self.line(f"{self.var(expr.operand)} {'+' if expr.op == 'PLUSPLUS' else '-'}= 1")
+            return
+        self.line(self.expr(expr))
+
+    def stmt_IfStmt(self, stmt):
+        self.line(f"if {self.cond(stmt.cond)}:")
+        self.body(stmt.then_block)
+        else_block = stmt.else_block
+        while else_block is not None:
+            chained = else_block.stmts[0] if len(else_block.stmts) == 1 else None
+            if isinstance(chained, IfStmt):
+                # else-if chains come out of the parser as an else block holding one IfStmt
+                outer, self.where = self.where, chained
+                self.line(f"elif {self.cond(chained.cond)}:")
+                self.body(chained.then_block)
+                self.where = outer
+                else_block = chained.else_block
+            else:
+                self.line("else:")
+                self.body(else_block)
+                break
+
+    def loop(self, stmt, body):
+        self.loops.append(stmt)
+        self.body(body)
+        self.loops.pop()
+
+    def stmt_WhileStmt(self, stmt):
+        self.line(f"while {self.cond(stmt.cond)}:")
+        self.loop(stmt, stmt.body)
+
+    def stmt_ForStmt(self, stmt):
+        self.stmt(stmt.init)
+        self.line(f"while {self.cond(stmt.cond) if stmt.cond is not None else 'True'}:")
+        self.loops.append(stmt)
+        self.indent += 1
+        self.block(stmt.body)
+        self.update(stmt)
+        self.indent -= 1
+        self.loops.pop()
+
+    def update(self, loop):
+        """The update of `loop` if it is a for loop."""
+        if isinstance(loop, ForStmt) and loop.update is not None:
+            outer, self.where = self.where, loop
+            if isinstance(loop.update, (Assignment, UnaryOp, ExprStmt)):
+                self.stmt(loop.update)
+            else:
+                self.discard(loop.update)
+            self.where = outer
+
+    def stmt_SwitchStmt(self, stmt):
+        table, index = {}, 0
+        for index, case in enumerate(stmt.cases):
+            value = case_value(case.value)
+            if value in table:
+                raise CompileError(f"duplicate case value {value!r}", case)
+            table[value] = index
+        bodies = [case.body for case in stmt.cases]
+        if stmt.default is not None:
+            bodies.append(stmt.default.body)
+        default = len(stmt.cases)      # past the last body if there is no default
+        number = len(self.tables)
+        self.tables.append(table)
+
+        var = f"_case{len([l for l in self.loops if isinstance(l, _Switch)])}"
+        self.line(f"{var} = _SWITCH{number}.get({self.expr(stmt.expr)}, {default})")
+        init_at = len(self.lines)
+        self.line("while True:")
+        switch = _Switch()
+        self.loops.append(switch)
+        self.indent += 1
+        for i, body in enumerate(bodies):
+            self.line(f"if {var} <= {i}:" if i else f"if {var} == 0:")
+            self.body(body)
+        self.line("break")
+        self.indent -= 1
+        self.loops.pop()
+        if switch.uses_cont:
+            self.line("_cont = 0", at=init_at)
+            self.line("if _cont:")
+            self.indent += 1
+            self.stmt_ContinueStmt(None)
+            self.indent -= 1
+
+    def stmt_BreakStmt(self, stmt):
+        if not self.loops:
+            raise CompileError("break outside a loop or switch", stmt)
+        self.line("break")
+
+    def stmt_ContinueStmt(self, stmt):
+        if not any(not isinstance(loop, _Switch) for loop in self.loops):
+            raise CompileError("continue outside a loop", stmt)
+        inner = self.loops[-1]
+        if isinstance(inner, _Switch):
+            inner.uses_cont = True
+            self.line("_cont = 1")
+            self.line("break")
+            return
+        self.update(inner)
+        self.line("continue")
+
+    # ---------------- Expressions ----------------
+    def var(self, ref):
+        return f"{ref.name}_{ref.slot}"
+
+    def expr(self, expr):
+        """Python for the value of `expr`."""
+        if expr is None:
+            return '0'
+        handler = getattr(self, 'expr_' + type(expr).__name__, None)
+        if handler is None:
+            return self.fail(RuntimeErrorWithLine, f"Unknown expression {expr} of type {type(expr)}")
+        return handler(expr)
+
+    def cond(self, expr):
+        """Python for `expr` used only for its truth."""
+        if isinstance(expr, BinaryOp) and expr.op in COMPARISONS:
+            return f"{self.expr(expr.left)} {BINARY[expr.op]} {self.expr(expr.right)}"
+        if isinstance(expr, UnaryOp) and expr.op == 'NOT':
+            return f"not {self.expr(expr.operand)}"
+        return self.expr(expr)
+
+    def fail(self, error_type, message):
+        return f"_fail({error_type.__name__}, {message!r})"
+
+    def expr_Number(self, expr):
+        return repr(expr.value)
+
+    expr_String = expr_Char = expr_Number
+
+    def expr_VarRef(self, expr):
+        if expr.slot is None:   # TRUE / FALSE
+            return '1' if expr.name == 'TRUE' else '0'
+        return self.var(expr)
+
+    def checked_index(self, array, index):
+        """Python for `index` checked against `array`, a local's name."""
+        if _simple(index):
+            i = self.expr(index)
+            return f"{i} if 0 <= {i} < len({array}) else _oob({i})"
+        return f"_at({array}, {self.expr(index)})"
+
+    def expr_ArrayRef(self, expr):
+        array = self.var(expr)
+        if len(expr.indices) == 1:
+            return f"{array}[{self.checked_index(array, expr.indices[0])}]"
+        for index in expr.indices:
+            array = f"_load({array}, {self.expr(index)})"
+        return array
+
+    def expr_BinaryOp(self, expr):
+        left, right = self.expr(expr.left), self.expr(expr.right)
+        op = expr.op
+        if op in COMPARISONS:
+            return f"(1 if {left} {BINARY[op]} {right} else 0)"
+        if op in BINARY:
+            return f"({left} {BINARY[op]} {right})"
+        if op == 'DIV':
+            # typechecker.py knows whether this is an int or a float division
+            if expr.impl is operator.floordiv:
+                return f"({left} // {right})"
+            if expr.impl is operator.truediv:
+                return f"({left} / {right})"
+            return f"_div({left}, {right})"
+        if op in ('AND', 'OR'):
+            if _simple(expr.right):
+                return f"(1 if {left} {op.lower()} {right} else 0)"
+            return f"_{op.lower()}({left}, {right})"
+        return self.fail(RuntimeErrorWithLine, f"Unknown binary operator {op}")
+
+    def expr_UnaryOp(self, expr):
+        op = expr.op
+        if op in ('PLUSPLUS', 'MINUSMINUS'):
+            delta = 1 if op == 'PLUSPLUS' else -1
+            operand = expr.operand
+            if isinstance(operand, VarRef):
+                name = self.var(operand)
+                sign = '+' if delta > 0 else '-'
+                if expr.postfix:
+                    return f"({name}, ({name} := {name} {sign} 1))[0]"
+                return f"({name} := {name} {sign} 1)"
+            if isinstance(operand, ArrayRef):
+                array = self.var(operand)
+                for index in operand.indices[:-1]:
+                    array = f"_load({array}, {self.expr(index)})"
+                return f"_step({array}, {self.expr(operand.indices[-1])}, {delta}, {bool(expr.postfix)})"
+            return self.fail(RuntimeErrorWithLine, f"Invalid unary operation {op}")
+        operand = self.expr(expr.operand)
+        if op == 'MINUS':
+            return f"(-{operand})"
+        if op == 'PLUS':
+            return f"(+{operand})"
+        if op == 'NOT':
+            return f"(0 if {operand} else 1)"
+        return self.fail(RuntimeErrorWithLine, f"Unknown unary operator {op}")
+
+    def expr_Cast(self, expr):
+        return f"{'int' if expr.ctype == 'int' else 'float'}({self.expr(expr.expr)})"
+
+    def expr_FunctionCall(self, expr):
+        fn = self.functions.get(expr.name)
+        if fn is None:
+            return self.fail(RuntimeError, f"Function '{expr.name}' not defined")
+        if len(fn.params) != len(expr.args):
+            return self.fail(RuntimeError,
+                             f"Function '{expr.name}' expects {len(fn.params)} args, got {len(expr.args)}")
+        return f"f_{expr.name}({', '.join(self.expr(arg) for arg in expr.args)})"
+
+def emit_python(program, memo=()):
+    """Translate `program` to a PythonModule, memoising the functions named in `memo`."""
+    with nesting_guard():
+        return PythonEmitter(program, memo).emit_program()
+
+def _depth():
+    frame, depth = sys._getframe(), 0
+    while frame is not None:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+class PythonBackend:
+    """Runs a program as generated Python; a drop-in for InterpreterWithFunctions."""
+    def __init__(self, program, memo=False):
+        self.memoised = sorted(pure_functions(program)) if memo else []
+        self.module = emit_python(program, self.memoised)
+        if 'main' not in {fn.name for fn in program.functions}:
+            raise RuntimeError("No main() function found")
+        try:
+            self.code = compile(self.module.source, FILENAME, 'exec')
+        except (SyntaxError, RecursionError, MemoryError) as e:
+            # CPython's own nesting limits: 200 parentheses, 20 nested blocks
+            message = e.msg if isinstance(e, SyntaxError) else str(e) or type(e).__name__
+            raise CompileError(f"Program nested too deeply for the python engine: {message}") from None
+        self.memo_tables = {}
+
+    def memo_stats(self):
+        return table_stats(self.memo_tables)
+
+    def run(self):
+        namespace = {'__name__': 'pythontocpp_program'}
+        exec(self.code, namespace)
+        # each run starts with empty tables
+        self.memo_tables = {name: namespace[f"_MEMO_{name}"] for name in self.memoised}
+        # one Python frame per guest call, main() included
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(_depth() + MAX_CALL_DEPTH - 1)
+        try:
+            result = namespace['f_main']()
+        except RecursionError as e:
+            raise RuntimeErrorWithLine(f"Stack overflow: more than {MAX_CALL_DEPTH} nested calls",
+                                       self.failed_at(e)) from None
+        except RuntimeErrorWithLine as e:
+            raise RuntimeErrorWithLine(e.message, self.failed_at(e)) from None
+        except Exception as e:
+            raise RuntimeErrorWithLine(str(e), self.failed_at(e)) from e
+        finally:
+            sys.setrecursionlimit(limit)
+        return 0 if result is None else result
+
+    def failed_at(self, error):
+        """The guest statement of the innermost generated frame in `error`'s traceback."""
+        position = None
+        tb = error.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == FILENAME:
+                position = self.module.position(tb.tb_lineno) or position
+            tb = tb.tb_next
+        return position
@@ -0,0 +1,251 @@
+import operator
+from ast_nodes import *
+from resolver import CompileError, resolve, is_resolved, nesting_guard
+from lexer import OPERATORS
+from operators import BINARY_OPS
+
+# Static type checking, run after name resolution.
+#
+# Every expression gets one of four types from the declared types of the
+# variables, parameters and functions it uses: 'int' (int, long and bool),
+# 'float' (float and double), 'char' and 'string'.  A call to a function
+# that does not exist, or with the wrong number of arguments, has no type
+# (ANY) and still fails when it runs, as before.
+#
+# Programs the interpreter could only run into a TypeError are rejected with
+# a CompileError: arithmetic on text (except + joining strings and chars),
+# comparing numbers with text, non-int array indices, storing text in a
+# number or a number in text.  Where an int meets a float variable,
+# parameter or return type (or the other way round) the value is wrapped in
+# a Cast, so a variable always holds a value of its declared type.
+#
+# Each BinaryOp gets `impl`, the operator function for its operand types:
+# for example floordiv for an int /, truediv for a float /, and add for both
+# + on numbers and string concatenation.  The engines call it without
+# looking at the values.
+
+INT, FLOAT, CHAR, STRING = 'int', 'float', 'char', 'string'
+ANY = None
+
+DECLARED_TYPES = {'INT': INT, 'LONG': INT, 'LONG LONG': INT, 'BOOL': INT,
+                  'FLOAT': FLOAT, 'DOUBLE': FLOAT, 'CHAR': CHAR, 'STRING': STRING}
+NUMBERS = frozenset((INT, FLOAT))
+TEXT = frozenset((CHAR, STRING))
+
+CASTS = {INT: int, FLOAT: float}
+
+ARITHMETIC = {
+    INT: {'PLUS': operator.add, 'MINUS': operator.sub, 'MULT': operator.mul,
+          'DIV': operator.floordiv, 'MOD': operator.mod},
+    FLOAT: {'PLUS': operator.add, 'MINUS': operator.sub, 'MULT': operator.mul,
+            'DIV': operator.truediv, 'MOD': operator.mod},
+}
+COMPARISONS = frozenset(('EQ', 'NE', 'LT', 'LE', 'GT', 'GE'))
+SYMBOLS = {kind: symbol for symbol, kind in OPERATORS.items()}
+
+def _describe(ctype):
+    return 'a value of unknown type' if ctype is ANY else f"a {ctype}" if ctype != INT else "an int"
+
+class TypeChecker:
+    def __init__(self, functions):
+        self.functions = functions      # name -> FunctionDecl, for calls
+        self.fn = None
+        self.types = {}                 # slot -> (type, number of dimensions or 0)
+
+    # ---------------- Functions ----------------
+    def check_function(self, fn):
+        self.fn = fn
+        self.types = {slot: (DECLARED_TYPES.get(vtype, ANY), 0) for slot, (vtype, _) in enumerate(fn.params)}
+        self.block(fn.body)
+        return fn
+
+    def coerce(self, expr, target, what, where):
+        """`expr`, converted if needed to be stored as `target` in `what`."""
+        ctype = self.expr(expr)
+        if ctype is ANY or target is ANY or ctype == target:
+            return expr
+        if ctype in NUMBERS and target in NUMBERS:
+            cast = Cast(expr, target)
+            cast.line, cast.col = expr.line, expr.col
+            return cast
+        raise CompileError(f"{what} takes {_describe(target)}, not {_describe(ctype)}", where)
+
+    # ---------------- Statements ----------------
+    def block(self, block):
+        if block is None:
+            return
+        for stmt in block.stmts:
+            self.stmt(stmt)
+
+    def stmt(self, stmt):
+        if stmt is None:
+            return
+        handler = getattr(self, 'stmt_' + type(stmt).__name__, None)
+        if handler is None:
+            self.expr(stmt)
+        else:
+            handler(stmt)
+
+    def stmt_VarDecl(self, stmt):
+        ctype = DECLARED_TYPES.get(stmt.vtype, ANY)
+        if stmt.init is not None:
+            stmt.init = self.coerce(stmt.init, ctype, f"Variable '{stmt.name}'", stmt)
+        self.types[stmt.slot] = (ctype, 0)
+
+    def stmt_ArrayDecl(self, stmt):
+        self.types[stmt.slot] = (DECLARED_TYPES.get(stmt.vtype, ANY), len(stmt.dims))
+
+    def stmt_Assignment(self, stmt):
+        if isinstance(stmt.name, ArrayRef):
+            target, what = self.expr(stmt.name), f"Array '{stmt.name.name}'"
+        else:
+            target, dims = self.types.get(stmt.slot, (ANY, 0))
+            if dims:
+                raise CompileError(f"Cannot assign to array '{stmt.name}' as a whole", stmt)
+            what = f"Variable '{stmt.name}'"
+        stmt.expr = self.coerce(stmt.expr, target, what, stmt)
+
+    def stmt_PrintStmt(self, stmt):
+        self.expr(stmt.expr)
+
+    stmt_ExprStmt = stmt_PrintStmt
+
+    def stmt_ReturnStmt(self, stmt):
+        ret_type = DECLARED_TYPES.get(self.fn.ret_type, ANY)
+        if stmt.expr is not None:
+            stmt.expr = self.coerce(stmt.expr, ret_type, f"Function '{self.fn.name}'", stmt)
+
+    def stmt_IfStmt(self, stmt):
+        self.expr(stmt.cond)
+        self.block(stmt.then_block)
+        self.block(stmt.else_block)
+
+    def stmt_WhileStmt(self, stmt):
+        self.expr(stmt.cond)
+        self.block(stmt.body)
+
+    def stmt_ForStmt(self, stmt):
+        self.stmt(stmt.init)
+        self.expr(stmt.cond)
+        self.stmt(stmt.update)
+        self.block(stmt.body)
+
+    def stmt_SwitchStmt(self, stmt):
+        subject = self.expr(stmt.expr)
+        if subject not in (INT, CHAR, ANY):
+            raise CompileError(f"Cannot switch on {_describe(subject)}", stmt)
+        for case in stmt.cases:
+            value = self.expr(case.value)
+            if subject is not ANY and value is not ANY and value != subject:
+                raise CompileError(f"Case value is {_describe(value)}, but the switch is on {_describe(subject)}", case)
+            self.block(case.body)
+        if stmt.default is not None:
+            self.block(stmt.default.body)
+
+    def stmt_BreakStmt(self, stmt):
+        pass
+
+    stmt_ContinueStmt = stmt_BreakStmt
+
+    # ---------------- Expressions ----------------
+    def expr(self, expr):
+        """The static type of `expr`, checking everything below it."""
+        if expr is None:
+            return ANY
+        handler = getattr(self, 'expr_' + type(expr).__name__, None)
+        return ANY if handler is None else handler(expr)
+
+    def expr_Number(self, expr):
+        return FLOAT if isinstance(expr.value, float) else INT
+
+    def expr_String(self, expr):
+        return STRING
+
+    def expr_Char(self, expr):
+        return CHAR
+
+    def expr_Cast(self, expr):
+        self.expr(expr.expr)
+        return expr.ctype
+
+    def expr_VarRef(self, expr):
+        if expr.slot is None:   # TRUE / FALSE
+            return INT
+        ctype, dims = self.types.get(expr.slot, (ANY, 0))
+        if dims:
+            raise CompileError(f"Array '{expr.name}' used without an index", expr)
+        return ctype
+
+    def expr_ArrayRef(self, expr):
+        ctype, dims = self.types.get(expr.slot, (ANY, 0))
+        if len(expr.indices) != dims:
+            raise CompileError(f"Array '{expr.name}' needs {dims} index(es), got {len(expr.indices)}", expr)
+        for index in expr.indices:
+            index_type = self.expr(index)
+            if index_type not in (INT, ANY):
+                raise CompileError(f"Array index must be an int, not {_describe(index_type)}", index)
+        return ctype
+
+    def expr_BinaryOp(self, expr):
+        left, right = self.expr(expr.left), self.expr(expr.right)
+        op = expr.op
+        expr.impl = None
+        if op in ('AND', 'OR'):
+            expr.impl = BINARY_OPS[op]
+            return INT
+        if left is ANY or right is ANY:
+            return INT if op in COMPARISONS else ANY
+        if op in COMPARISONS:
+            if not ({left, right} <= NUMBERS or {left, right} <= TEXT):
+                raise self.mismatch(expr, left, right)
+            expr.impl = BINARY_OPS[op]
+            return INT
+        if left in NUMBERS and right in NUMBERS:
+            ctype = FLOAT if FLOAT in (left, right) else INT
+            expr.impl = ARITHMETIC[ctype].get(op)
+            if expr.impl is None:
+                raise self.mismatch(expr, left, right)
+            return ctype
+        if op == 'PLUS' and left in TEXT and right in TEXT:
+            expr.impl = operator.add
+            return STRING
+        raise self.mismatch(expr, left, right)
+
+    def mismatch(self, expr, left, right):
+        symbol = SYMBOLS.get(expr.op, expr.op)
+        return CompileError(f"Operator {symbol} cannot combine {_describe(left)} and {_describe(right)}", expr)
+
+    def expr_UnaryOp(self, expr):
+        ctype = self.expr(expr.operand)
+        if expr.op == 'NOT':
+            return INT
+        if ctype not in (INT, FLOAT, ANY):
+            raise CompileError(f"Operator {SYMBOLS.get(expr.op, expr.op)} needs a number, not {_describe(ctype)}", expr)
+        return ctype
+
+    def expr_FunctionCall(self, expr):
+        fn = self.functions.get(expr.name)
+        if fn is None or len(fn.params) != len(expr.args):
+            # fails when it runs, with the interpreter's message
+            for arg in expr.args:
+                self.expr(arg)
+            return ANY
+        expr.args = [self.coerce(arg, DECLARED_TYPES.get(vtype, ANY), f"Parameter '{name}' of {fn.name}()", arg)
+                     for arg, (vtype, name) in zip(expr.args, fn.params)]
+        return DECLARED_TYPES.get(fn.ret_type, ANY)
+
+def check_function(fn, functions=None):
+    """Type-check one resolved function; calls to functions not in `functions`
+    (name -> FunctionDecl) are left unchecked."""
+    with nesting_guard():
+        return TypeChecker(functions or {}).check_function(fn)
+
+def typecheck(program):
+    """Type-check `program` in place (resolving it first if needed) and return it."""
+    if not is_resolved(program):
+        resolve(program)
+    checker = TypeChecker({fn.name: fn for fn in program.functions})
+    with nesting_guard():
+        for fn in program.functions:
+            checker.check_function(fn)
+    return program
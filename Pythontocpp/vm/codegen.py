@@ -0,0 +1,419 @@
+from array import array
+from ast_nodes import *
+from resolver import CompileError, resolve, is_resolved, case_value, nesting_guard
+from interpreter.closures import DEFAULT_VALUES
+from .opcodes import *
+
+# Bytecode compiler: a resolved Program -> one CodeObject per function.
+#
+# Expressions compile to stack code in the order the tree walker evaluates
+# them, so side effects and errors happen in the same order.  Statements
+# leave the stack as they found it.  Every instruction also records the
+# statement it came from, which is where the VM reports a runtime error.
+#
+# `switch`, `break` and `continue` run as in C: `switch` dispatches through
+# a table from case value to code offset and falls through from one case
+# into the next, `break` leaves the innermost loop or switch, and
+# `continue` jumps to the innermost loop's next iteration.  Case values
+# must be constants.
+
+class CodeObject:
+    """The bytecode of one function."""
+    __slots__ = ('name', 'index', 'nparams', 'frame_size', 'code', 'consts', 'positions', 'free', 'blank', 'memo')
+
+    def __init__(self, name, index, nparams, frame_size, memo=None):
+        self.name = name
+        self.index = index            # operand of the CALLs to this function
+        self.nparams = nparams
+        self.frame_size = frame_size
+        self.code = array('i')
+        self.consts = []              # constant pool
+        self.positions = []           # statement of each word of code
+        self.free = []                # frames of returned calls, for reuse
+        self.blank = (None,) * frame_size   # what a returned frame is reset to
+        # MemoTable of a memoised function, whose calls keep their argument
+        # tuple in the last slot of the frame for RETURN_MEMO
+        self.memo = memo
+
+class BytecodeProgram:
+    """CodeObjects of every function, in source order and by name."""
+    def __init__(self, functions):
+        self.functions = functions
+        self.by_name = {code.name: code for code in functions}
+
+class _Loop:
+    """Pending jumps out of a loop or switch being compiled."""
+    __slots__ = ('breaks', 'continues', 'is_switch')
+
+    def __init__(self, is_switch=False):
+        self.breaks = []
+        self.continues = []
+        self.is_switch = is_switch
+
+class FunctionCompiler:
+    def __init__(self, fn, code, functions):
+        self.fn = fn
+        self.co = code
+        self.functions = functions    # name -> CodeObject of every function
+        self.const_index = {}
+        self.loops = []
+        self.where = fn
+        self.last = -1        # offset of the last instruction emitted
+        self.barrier = 0      # instructions before this one must not be fused
+
+    # ---------------- Emission ----------------
+    def emit(self, op, *args):
+        # Peephole fusion: a LOAD_LOCAL merges with a load or an index
+        # operation that follows it, unless a jump may land between the two.
+        code, last = self.co.code, self.last
+        if last >= self.barrier:
+            prev = code[last]
+            if prev == LOAD_LOCAL:
+                slot = code[last + 1]
+                if op == LOAD_LOCAL:
+                    return self.replace_last(LOAD_LOCAL2, slot, *args)
+                if op == LOAD_CONST:
+                    return self.replace_last(LOAD_LOCAL_CONST, slot, *args)
+                if op == INDEX:
+                    return self.replace_last(INDEX_LOCAL, slot)
+                if op == LOAD_LOCAL_INDEX:
+                    return self.replace_last(INDEX_LOCALS, args[0], slot)
+            elif prev == LOAD_LOCAL2 and op in (INDEX, LOAD_LOCAL_INDEX):
+                first, slot = code[last + 1], code[last + 2]
+                self.replace_last(LOAD_LOCAL, first)
+                if op == INDEX:
+                    return self.append(INDEX_LOCAL, slot)
+                return self.append(INDEX_LOCALS, args[0], slot)
+        self.append(op, *args)
+
+    def append(self, op, *args):
+        self.last = len(self.co.code)
+        self.co.code.append(op)
+        self.co.code.extend(args)
+        self.co.positions.extend([self.where] * (1 + len(args)))
+
+    def replace_last(self, op, *args):
+        del self.co.code[self.last:]
+        del self.co.positions[self.last:]
+        self.append(op, *args)
+
+    def const(self, value):
+        """Index of `value` in the constant pool, adding it if needed."""
+        key = (type(value), value) if not isinstance(value, dict) else id(value)
+        index = self.const_index.get(key)
+        if index is None:
+            index = self.const_index[key] = len(self.co.consts)
+            self.co.consts.append(value)
+        return index
+
+    def here(self):
+        """Offset of the next instruction, which a jump may now target."""
+        self.barrier = len(self.co.code)
+        return self.barrier
+
+    def jump(self, op, target=0):
+        """Emit a jump; returns the operand's offset, for patch()."""
+        self.emit(op, target)
+        return len(self.co.code) - 1
+
+    def patch(self, at, target=None):
+        self.co.code[at] = self.here() if target is None else target
+
+    def fail(self, message):
+        self.emit(FAIL, self.const(message))
+
+    # ---------------- Functions ----------------
+    def compile(self):
+        self.block(self.fn.body)
+        if self.co.memo is not None:
+            self.emit(LOAD_CONST, self.const(None))
+            self.emit(RETURN_MEMO)
+        else:
+            self.emit(RETURN_NONE)
+        return self.co
+
+    # ---------------- Statements ----------------
+    def block(self, block):
+        for stmt in block.stmts:
+            self.stmt(stmt)
+
+    def stmt(self, stmt):
+        if stmt is None:
+            return
+        handler = getattr(self, 'stmt_' + type(stmt).__name__, None)
+        if handler is None:
+            return   # statements the interpreter ignores as well
+        outer, self.where = self.where, stmt
+        handler(stmt)
+        self.where = outer
+
+    def stmt_VarDecl(self, stmt):
+        if stmt.init is None:
+            self.emit(LOAD_CONST, self.const(DEFAULT_VALUES.get(stmt.vtype)))
+        else:
+            self.expr(stmt.init)
+        self.emit(STORE_LOCAL, stmt.slot)
+
+    def stmt_ArrayDecl(self, stmt):
+        self.emit(NEW_ARRAY, self.const((tuple(stmt.dims), DEFAULT_VALUES.get(stmt.vtype))))
+        self.emit(STORE_LOCAL, stmt.slot)
+
+    def stmt_Assignment(self, stmt):
+        if isinstance(stmt.name, ArrayRef):
+            self.expr(stmt.expr)
+            self.array_element(stmt.name)
+            self.emit(STORE_INDEX)
+            return
+        value = stmt.expr
+        # x = x + 1 / x = x - 1
+        if (isinstance(value, BinaryOp) and value.op in ('PLUS', 'MINUS')
+                and isinstance(value.left, VarRef) and value.left.slot == stmt.slot
+                and isinstance(value.right, Number) and value.right.value == 1):
+            self.emit(INC_LOCAL if value.op == 'PLUS' else DEC_LOCAL, stmt.slot)
+            return
+        self.expr(value)
+        self.emit(STORE_LOCAL, stmt.slot)
+
+    def stmt_PrintStmt(self, stmt):
+        self.expr(stmt.expr)
+        self.emit(PRINT)
+
+    def stmt_ReturnStmt(self, stmt):
+        self.expr(stmt.expr)
+        self.emit(RETURN if self.co.memo is None else RETURN_MEMO)
+
+    def stmt_ExprStmt(self, stmt):
+        self.discard(stmt.expr)
+
+    def stmt_UnaryOp(self, stmt):
+        self.discard(stmt)
+
+    def discard(self, expr):
+        """Code evaluating `expr` for its effects only."""
+        if (isinstance(expr, UnaryOp) and expr.op in ('PLUSPLUS', 'MINUSMINUS')
+                and isinstance(expr.operand, VarRef)):
+            self.emit(INC_LOCAL if expr.op == 'PLUSPLUS' else DEC_LOCAL, expr.operand.slot)
+            return
+        self.expr(expr)
+        self.emit(POP)
+
+    def jump_unless(self, cond):
+        """Code testing `cond`, ending in a jump taken if it is false; returns
+        the jump's operand offset, for patch()."""
+        if isinstance(cond, BinaryOp) and cond.op in JUMP_UNLESS:
+            self.expr(cond.left)
+            self.expr(cond.right)
+            return self.jump(JUMP_UNLESS[cond.op])
+        self.expr(cond)
+        return self.jump(JUMP_IF_FALSE)
+
+    def stmt_IfStmt(self, stmt):
+        to_else = self.jump_unless(stmt.cond)
+        self.block(stmt.then_block)
+        if stmt.else_block is None:
+            self.patch(to_else)
+            return
+        to_end = self.jump(JUMP)
+        self.patch(to_else)
+        self.block(stmt.else_block)
+        self.patch(to_end)
+
+    def loop_body(self, body):
+        """Compile a loop body; returns the loop's pending breaks and continues."""
+        loop = _Loop()
+        self.loops.append(loop)
+        self.block(body)
+        self.loops.pop()
+        return loop
+
+    def jump_if(self, cond, target):
+        """Code testing `cond`, ending in a jump to `target` taken if it is true."""
+        if isinstance(cond, BinaryOp) and cond.op in JUMP_IF:
+            self.expr(cond.left)
+            self.expr(cond.right)
+            self.emit(JUMP_IF[cond.op], target)
+        else:
+            self.expr(cond)
+            self.emit(JUMP_IF_TRUE, target)
+
+    # Loops are rotated: the condition is tested at the bottom, so an
+    # iteration costs one conditional jump and no unconditional one.
+    def stmt_WhileStmt(self, stmt):
+        to_test = self.jump(JUMP)
+        top = self.here()
+        loop = self.loop_body(stmt.body)
+        self.patch(to_test)
+        for at in loop.continues:
+            self.patch(at)
+        self.jump_if(stmt.cond, top)
+        for at in loop.breaks:
+            self.patch(at)
+
+    def stmt_ForStmt(self, stmt):
+        self.stmt(stmt.init)
+        to_test = self.jump(JUMP) if stmt.cond is not None else None
+        top = self.here()
+        loop = self.loop_body(stmt.body)
+        for at in loop.continues:
+            self.patch(at)
+        if isinstance(stmt.update, (Assignment, UnaryOp, ExprStmt)):
+            self.stmt(stmt.update)
+        elif stmt.update is not None:
+            self.discard(stmt.update)
+        if to_test is None:
+            self.emit(JUMP, top)
+        else:
+            self.patch(to_test)
+            self.jump_if(stmt.cond, top)
+        for at in loop.breaks:
+            self.patch(at)
+
+    def stmt_SwitchStmt(self, stmt):
+        self.expr(stmt.expr)
+        table = {}
+        self.emit(SWITCH, self.const(table))
+        switch = _Loop(is_switch=True)
+        self.loops.append(switch)
+        for case in stmt.cases:
+            value = case_value(case.value)
+            if value in table:
+                raise CompileError(f"duplicate case value {value!r}", case)
+            table[value] = self.here()
+            self.block(case.body)
+        if stmt.default is not None:
+            table[None] = self.here()
+            self.block(stmt.default.body)
+        self.loops.pop()
+        table.setdefault(None, self.here())
+        for at in switch.breaks:
+            self.patch(at)
+
+    def stmt_BreakStmt(self, stmt):
+        if not self.loops:
+            raise CompileError("break outside a loop or switch", stmt)
+        self.loops[-1].breaks.append(self.jump(JUMP))
+
+    def stmt_ContinueStmt(self, stmt):
+        loop = next((loop for loop in reversed(self.loops) if not loop.is_switch), None)
+        if loop is None:
+            raise CompileError("continue outside a loop", stmt)
+        loop.continues.append(self.jump(JUMP))
+
+    # ---------------- Expressions ----------------
+    def expr(self, expr):
+        if expr is None:
+            self.emit(LOAD_CONST, self.const(0))
+            return
+        handler = getattr(self, 'expr_' + type(expr).__name__, None)
+        if handler is None:
+            self.fail(f"Unknown expression {expr} of type {type(expr)}")
+            return
+        handler(expr)
+
+    def expr_Number(self, expr):
+        self.emit(LOAD_CONST, self.const(expr.value))
+
+    expr_String = expr_Char = expr_Number
+
+    def expr_VarRef(self, expr):
+        if expr.slot is None:   # TRUE / FALSE
+            self.emit(LOAD_CONST, self.const(1 if expr.name == 'TRUE' else 0))
+        else:
+            self.emit(LOAD_LOCAL, expr.slot)
+
+    def array_element(self, ref):
+        """Push the innermost array holding the element `ref` names, then its index."""
+        self.emit(LOAD_LOCAL, ref.slot)
+        for index in ref.indices[:-1]:
+            self.expr(index)
+            self.emit(INDEX)
+        self.expr(ref.indices[-1])
+
+    def expr_ArrayRef(self, expr):
+        if len(expr.indices) == 1:
+            self.expr(expr.indices[0])
+            self.emit(LOAD_LOCAL_INDEX, expr.slot)
+            return
+        self.array_element(expr)
+        self.emit(INDEX)
+
+    def expr_BinaryOp(self, expr):
+        op = TYPED_OPCODES.get(expr.impl) if expr.op == 'DIV' else None
+        op = op or BINARY_OPCODES.get(expr.op)
+        if op is None:
+            self.fail(f"Unknown binary operator {expr.op}")
+            return
+        self.expr(expr.left)
+        if op in (ADD, SUB) and isinstance(expr.right, Number):
+            self.emit(ADD_CONST if op == ADD else SUB_CONST, self.const(expr.right.value))
+            return
+        self.expr(expr.right)
+        self.emit(op)
+
+    def expr_UnaryOp(self, expr):
+        if expr.op in ('PLUSPLUS', 'MINUSMINUS'):
+            self.increment(expr)
+            return
+        op = UNARY_OPCODES.get(expr.op)
+        if op is None:
+            self.fail(f"Unknown unary operator {expr.op}")
+            return
+        self.expr(expr.operand)
+        self.emit(op)
+
+    def increment(self, expr):
+        """++/-- on a variable or array element, leaving the expression's value."""
+        operand, postfix = expr.operand, bool(expr.postfix)
+        step = ADD_CONST if expr.op == 'PLUSPLUS' else SUB_CONST
+        if isinstance(operand, VarRef):
+            self.emit(LOAD_LOCAL, operand.slot)
+            if postfix:
+                self.emit(DUP)
+            self.emit(step, self.const(1))
+            if not postfix:
+                self.emit(DUP)
+            self.emit(STORE_LOCAL, operand.slot)
+        elif isinstance(operand, ArrayRef):
+            self.expr_ArrayRef(operand)
+            if postfix:
+                self.emit(DUP)
+            self.emit(step, self.const(1))
+            if not postfix:
+                self.emit(DUP)
+            self.array_element(operand)
+            self.emit(STORE_INDEX)
+        else:
+            self.fail(f"Invalid unary operation {expr.op}")
+
+    def expr_Cast(self, expr):
+        self.expr(expr.expr)
+        self.emit(TO_INT if expr.ctype == 'int' else TO_FLOAT)
+
+    def expr_FunctionCall(self, expr):
+        callee = self.functions.get(expr.name)
+        if callee is None:
+            self.fail(f"Function '{expr.name}' not defined")
+            return
+        if callee.nparams != len(expr.args):
+            self.fail(f"Function '{expr.name}' expects {callee.nparams} args, got {len(expr.args)}")
+            return
+        for arg in expr.args:
+            self.expr(arg)
+        self.emit(CALL if callee.memo is None else CALL_MEMO, callee.index)
+
+def compile_program(program, memo=None):
+    """Compile every function of `program` (resolving it first if needed).
+
+    `memo` maps the names of the functions to memoise to their MemoTables
+    (see memo.py).
+    """
+    if not is_resolved(program):
+        resolve(program)
+    memo = memo or {}
+    codes = [CodeObject(fn.name, i, len(fn.params), fn.frame_size + (fn.name in memo), memo.get(fn.name))
+             for i, fn in enumerate(program.functions)]
+    by_name = {code.name: code for code in codes}
+    with nesting_guard():
+        for fn, code in zip(program.functions, codes):
+            FunctionCompiler(fn, code, by_name).compile()
+    return BytecodeProgram(codes)
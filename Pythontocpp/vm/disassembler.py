@@ -0,0 +1,66 @@
+# Human-readable listings of the VM's bytecode.
+#   python -m vm.disassembler prog.cpp [function ...]
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from .opcodes import OPNAMES, ARG_COUNT, JUMPS, LOAD_CONST, LOAD_LOCAL_CONST, NEW_ARRAY, ADD_CONST, SUB_CONST, SWITCH, CALL, CALL_MEMO, FAIL
+
+# opcodes whose last operand is a constant-pool index
+CONST_OPERANDS = frozenset((LOAD_CONST, LOAD_LOCAL_CONST, NEW_ARRAY, ADD_CONST, SUB_CONST, SWITCH, FAIL))
+
+def instructions(co):
+    """Yield (offset, opcode, operands) for each instruction of `co`."""
+    code = co.code
+    pc = 0
+    while pc < len(code):
+        op = code[pc]
+        end = pc + 1 + ARG_COUNT[op]
+        yield pc, op, tuple(code[pc + 1:end])
+        pc = end
+
+def disassemble(co, functions=None):
+    """Listing of code object `co`: one instruction per line, with source
+    lines, jump targets marked '>>' and operands explained.
+
+    `functions`, the program's list of code objects, names CALL targets.
+    """
+    targets = {args[-1] for _, op, args in instructions(co) if op in JUMPS}
+    for _, op, args in instructions(co):
+        if op == SWITCH:
+            targets.update(co.consts[args[0]].values())
+    lines = [f"{co.name}: {co.nparams} params, frame of {co.frame_size}, "
+             f"{len(co.code)} words, {len(co.consts)} constants"]
+    last_line = None
+    for pc, op, args in instructions(co):
+        line = co.positions[pc].line
+        shown = f"{line:>5}" if line is not None and line != last_line else ' ' * 5
+        last_line = line if line is not None else last_line
+        text = f"{shown} {'>>' if pc in targets else '  '} {pc:>5} {OPNAMES[op]:<17}"
+        text += ''.join(f" {arg:>4}" for arg in args)
+        if op in CONST_OPERANDS:
+            text += f"  ({co.consts[args[-1]]!r})"
+        elif op in (CALL, CALL_MEMO) and functions is not None:
+            text += f"  ({functions[args[0]].name})"
+        lines.append(text.rstrip())
+    return '\n'.join(lines)
+
+def disassemble_program(bytecode, names=None):
+    return '\n\n'.join(disassemble(co, bytecode.functions) for co in bytecode.functions
+                       if not names or co.name in names)
+
+def main():
+    from compiler import compile_source
+    from .codegen import compile_program
+    ap = argparse.ArgumentParser(description="Print the VM bytecode of a program.")
+    ap.add_argument('source')
+    ap.add_argument('functions', nargs='*', help='only these functions (default: all)')
+    args = ap.parse_args()
+    with open(args.source, 'r', encoding='utf-8') as f:
+        program = compile_source(f.read())
+    print(disassemble_program(compile_program(program), args.functions))
+
+if __name__ == '__main__':
+    main()
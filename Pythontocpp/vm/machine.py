@@ -0,0 +1,334 @@
+from interpreter.interpreter import RuntimeErrorWithLine
+from limits import MAX_CALL_DEPTH
+from memo import MISSING, memo_tables, table_stats
+from .codegen import compile_program
+from .opcodes import *
+
+# The bytecode VM.
+#
+# One loop runs every function.  Calls do not recurse in Python: CALL saves
+# the caller's (code object, pc, frame) on a list and switches to the
+# callee, and RETURN switches back, so guest recursion depth is limited by
+# MAX_CALL_DEPTH only.  All functions share one operand stack; a call moves
+# its arguments from the top of the stack into the callee's frame.
+#
+# The dispatch is an if-chain over opcode numbers, most frequent first.
+
+def new_array(dims, default=0):
+    if len(dims) == 1:
+        return [default] * dims[0]
+    return [new_array(dims[1:], default) for _ in range(dims[0])]
+
+def _out_of_bounds(i):
+    return RuntimeErrorWithLine(f"Array index {i} out of bounds")
+
+class VM:
+    """Runs a program's bytecode; a drop-in for InterpreterWithFunctions."""
+    def __init__(self, program, memo=False):
+        # pure function name -> MemoTable, with `memo` (see memo.py)
+        self.memo_tables = memo_tables(program) if memo else {}
+        self.bytecode = compile_program(program, self.memo_tables)
+        if 'main' not in self.bytecode.by_name:
+            raise RuntimeError("No main() function found")
+
+    def run(self):
+        result = self.execute(self.bytecode.by_name['main'])
+        return 0 if result is None else result
+
+    def memo_stats(self):
+        return table_stats(self.memo_tables)
+
+    def execute(self, co):
+        functions = self.bytecode.functions
+        calls = []
+        stack = []
+        push, pop = stack.append, stack.pop
+        code, consts = co.code, co.consts
+        frame = co.free.pop() if co.free else [None] * co.frame_size
+        pc = 0
+        try:
+            while True:
+                op = code[pc]
+                pc += 1
+                if op == LOAD_LOCAL:
+                    push(frame[code[pc]])
+                    pc += 1
+                elif op == LOAD_LOCAL_CONST:
+                    push(frame[code[pc]])
+                    push(consts[code[pc + 1]])
+                    pc += 2
+                elif op == JUMP_IF_LT:
+                    r = pop()
+                    if pop() < r:
+                        pc = code[pc]
+                    else:
+                        pc += 1
+                elif op == STORE_LOCAL:
+                    frame[code[pc]] = pop()
+                    pc += 1
+                elif op == LOAD_LOCAL2:
+                    push(frame[code[pc]])
+                    push(frame[code[pc + 1]])
+                    pc += 2
+                elif op == INC_LOCAL:
+                    frame[code[pc]] += 1
+                    pc += 1
+                elif op == INDEX_LOCAL:
+                    i = frame[code[pc]]
+                    a = stack[-1]
+                    if i < 0 or i >= len(a):
+                        raise _out_of_bounds(i)
+                    stack[-1] = a[i]
+                    pc += 1
+                elif op == INDEX_LOCALS:
+                    a = frame[code[pc]]
+                    i = frame[code[pc + 1]]
+                    if i < 0 or i >= len(a):
+                        raise _out_of_bounds(i)
+                    push(a[i])
+                    pc += 2
+                elif op == LOAD_CONST:
+                    push(consts[code[pc]])
+                    pc += 1
+                elif op == ADD:
+                    r = pop()
+                    stack[-1] = stack[-1] + r
+                elif op == ADD_CONST:
+                    stack[-1] = stack[-1] + consts[code[pc]]
+                    pc += 1
+                elif op == STORE_INDEX:
+                    i = pop()
+                    a = pop()
+                    if i < 0 or i >= len(a):
+                        raise _out_of_bounds(i)
+                    a[i] = pop()
+                elif op == JUMP_UNLESS_EQ:
+                    r = pop()
+                    if pop() == r:
+                        pc += 1
+                    else:
+                        pc = code[pc]
+                elif op == JUMP_UNLESS_LT:
+                    r = pop()
+                    if pop() < r:
+                        pc += 1
+                    else:
+                        pc = code[pc]
+                elif op == SUB_CONST:
+                    stack[-1] = stack[-1] - consts[code[pc]]
+                    pc += 1
+                elif op == CALL:
+                    callee = functions[code[pc]]
+                    pc += 1
+                    if len(calls) >= MAX_CALL_DEPTH - 1:
+                        raise RuntimeErrorWithLine(f"Stack overflow: more than {MAX_CALL_DEPTH} nested calls")
+                    new = callee.free.pop() if callee.free else [None] * callee.frame_size
+                    n = callee.nparams
+                    if n:
+                        new[:n] = stack[-n:]
+                        del stack[-n:]
+                    calls.append((co, pc, frame))
+                    co, code, consts, frame, pc = callee, callee.code, callee.consts, new, 0
+                elif op == RETURN:
+                    value = pop()
+                    frame[:] = co.blank   # keeps no arrays alive while free
+                    co.free.append(frame)
+                    if not calls:
+                        return value
+                    co, pc, frame = calls.pop()
+                    code, consts = co.code, co.consts
+                    push(value)
+                elif op == MUL:
+                    r = pop()
+                    stack[-1] = stack[-1] * r
+                elif op == MOD:
+                    r = pop()
+                    stack[-1] = stack[-1] % r
+                elif op == JUMP:
+                    pc = code[pc]
+                elif op == SWITCH:
+                    table = consts[code[pc]]
+                    pc = table.get(pop(), table[None])
+                elif op == JUMP_IF_FALSE:
+                    if pop():
+                        pc += 1
+                    else:
+                        pc = code[pc]
+                elif op == LOAD_LOCAL_INDEX:
+                    a = frame[code[pc]]
+                    i = stack[-1]
+                    if i < 0 or i >= len(a):
+                        raise _out_of_bounds(i)
+                    stack[-1] = a[i]
+                    pc += 1
+                elif op == INDEX:
+                    i = pop()
+                    a = stack[-1]
+                    if i < 0 or i >= len(a):
+                        raise _out_of_bounds(i)
+                    stack[-1] = a[i]
+                elif op == SUB:
+                    r = pop()
+                    stack[-1] = stack[-1] - r
+                elif op == IDIV:
+                    r = pop()
+                    stack[-1] = stack[-1] // r
+                elif op == FDIV:
+                    r = pop()
+                    stack[-1] = stack[-1] / r
+                elif op == EQ:
+                    r = pop()
+                    stack[-1] = 1 if stack[-1] == r else 0
+                elif op == NE:
+                    r = pop()
+                    stack[-1] = 1 if stack[-1] != r else 0
+                elif op == LT:
+                    r = pop()
+                    stack[-1] = 1 if stack[-1] < r else 0
+                elif op == LE:
+                    r = pop()
+                    stack[-1] = 1 if stack[-1] <= r else 0
+                elif op == GT:
+                    r = pop()
+                    stack[-1] = 1 if stack[-1] > r else 0
+                elif op == GE:
+                    r = pop()
+                    stack[-1] = 1 if stack[-1] >= r else 0
+                elif op == AND:
+                    r = pop()
+                    stack[-1] = 1 if stack[-1] and r else 0
+                elif op == OR:
+                    r = pop()
+                    stack[-1] = 1 if stack[-1] or r else 0
+                elif op == NOT:
+                    stack[-1] = 0 if stack[-1] else 1
+                elif op == NEG:
+                    stack[-1] = -stack[-1]
+                elif op == POS:
+                    stack[-1] = +stack[-1]
+                elif op == JUMP_IF_LE:
+                    r = pop()
+                    if pop() <= r:
+                        pc = code[pc]
+                    else:
+                        pc += 1
+                elif op == JUMP_IF_GT:
+                    r = pop()
+                    if pop() > r:
+                        pc = code[pc]
+                    else:
+                        pc += 1
+                elif op == JUMP_IF_GE:
+                    r = pop()
+                    if pop() >= r:
+                        pc = code[pc]
+                    else:
+                        pc += 1
+                elif op == JUMP_IF_EQ:
+                    r = pop()
+                    if pop() == r:
+                        pc = code[pc]
+                    else:
+                        pc += 1
+                elif op == JUMP_IF_NE:
+                    r = pop()
+                    if pop() != r:
+                        pc = code[pc]
+                    else:
+                        pc += 1
+                elif op == JUMP_UNLESS_LE:
+                    r = pop()
+                    if pop() <= r:
+                        pc += 1
+                    else:
+                        pc = code[pc]
+                elif op == JUMP_UNLESS_GT:
+                    r = pop()
+                    if pop() > r:
+                        pc += 1
+                    else:
+                        pc = code[pc]
+                elif op == JUMP_UNLESS_GE:
+                    r = pop()
+                    if pop() >= r:
+                        pc += 1
+                    else:
+                        pc = code[pc]
+                elif op == JUMP_UNLESS_NE:
+                    r = pop()
+                    if pop() != r:
+                        pc += 1
+                    else:
+                        pc = code[pc]
+                elif op == JUMP_IF_TRUE:
+                    if pop():
+                        pc = code[pc]
+                    else:
+                        pc += 1
+                elif op == DEC_LOCAL:
+                    frame[code[pc]] -= 1
+                    pc += 1
+                elif op == POP:
+                    pop()
+                elif op == DUP:
+                    push(stack[-1])
+                elif op == RETURN_NONE:
+                    frame[:] = co.blank   # keeps no arrays alive while free
+                    co.free.append(frame)
+                    if not calls:
+                        return None
+                    co, pc, frame = calls.pop()
+                    code, consts = co.code, co.consts
+                    push(None)
+                elif op == CALL_MEMO:
+                    callee = functions[code[pc]]
+                    pc += 1
+                    n = callee.nparams
+                    key = tuple(stack[-n:]) if n else ()
+                    value = callee.memo.lookup(key)
+                    if value is not MISSING:
+                        if n:
+                            del stack[-n:]
+                        push(value)
+                    else:
+                        if len(calls) >= MAX_CALL_DEPTH - 1:
+                            raise RuntimeErrorWithLine(f"Stack overflow: more than {MAX_CALL_DEPTH} nested calls")
+                        new = callee.free.pop() if callee.free else [None] * callee.frame_size
+                        if n:
+                            new[:n] = stack[-n:]
+                            del stack[-n:]
+                        new[-1] = key
+                        calls.append((co, pc, frame))
+                        co, code, consts, frame, pc = callee, callee.code, callee.consts, new, 0
+                elif op == RETURN_MEMO:
+                    value = co.memo.store(frame[-1], pop())
+                    frame[:] = co.blank   # keeps no arrays alive while free
+                    co.free.append(frame)
+                    if not calls:
+                        return value
+                    co, pc, frame = calls.pop()
+                    code, consts = co.code, co.consts
+                    push(value)
+                elif op == NEW_ARRAY:
+                    push(new_array(*consts[code[pc]]))
+                    pc += 1
+                elif op == TO_FLOAT:
+                    stack[-1] = float(stack[-1])
+                elif op == TO_INT:
+                    stack[-1] = int(stack[-1])
+                elif op == DIV:
+                    # untyped: only programs that skipped typechecker.py
+                    r = pop()
+                    l = stack[-1]
+                    stack[-1] = l // r if isinstance(l, int) and isinstance(r, int) else l / r
+                elif op == PRINT:
+                    print(pop())
+                elif op == FAIL:
+                    raise RuntimeErrorWithLine(consts[code[pc]])
+                else:
+                    raise RuntimeErrorWithLine(f"Bad opcode {op} at offset {pc - 1} of {co.name}")
+        except RuntimeErrorWithLine as e:
+            # report the statement of the instruction that failed
+            raise RuntimeErrorWithLine(e.message, co.positions[pc - 1]) from None
+        except Exception as e:
+            raise RuntimeErrorWithLine(str(e), co.positions[pc - 1]) from e
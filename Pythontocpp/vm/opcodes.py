@@ -0,0 +1,117 @@
+import operator
+
+# Instruction set of the bytecode VM.
+#
+# Code is a flat array('i').  Every instruction is one opcode followed by
+# ARG_COUNT[opcode] operands (none for most).  Operands are frame slots,
+# constant-pool indices, function indices or absolute jump targets (indices
+# into the same array).
+
+# ---------------- Stack and frame ----------------
+POP = 0                 # drop the top of the stack
+DUP = 1                 # push the top of the stack again
+LOAD_CONST = 2          # k: push consts[k]
+LOAD_LOCAL = 3          # s: push frame[s]
+STORE_LOCAL = 4         # s: frame[s] = pop
+INC_LOCAL = 5           # s: frame[s] += 1
+DEC_LOCAL = 6           # s: frame[s] -= 1
+
+# ---------------- Arrays ----------------
+NEW_ARRAY = 7           # k: push a new array; consts[k] is (dimensions, element value)
+INDEX = 8               # i = pop, a = pop: push a[i]
+STORE_INDEX = 9         # i = pop, a = pop, v = pop: a[i] = v
+
+# ---------------- Operators (r = pop, l = pop, push l <op> r) ----------------
+ADD = 10
+SUB = 11
+MUL = 12
+DIV = 13
+MOD = 14
+EQ = 15
+NE = 16
+LT = 17
+LE = 18
+GT = 19
+GE = 20
+AND = 21                # both operands already evaluated, like the tree walker
+OR = 22
+NEG = 23                # unary: push -pop
+POS = 24
+NOT = 25
+
+# ---------------- Superinstructions ----------------
+ADD_CONST = 26          # k: push pop + consts[k]
+SUB_CONST = 27          # k: push pop - consts[k]
+LOAD_LOCAL_INDEX = 28   # s: i = pop, push frame[s][i]
+
+# ---------------- Control flow ----------------
+JUMP = 29               # t: continue at t
+JUMP_IF_FALSE = 30      # t: continue at t if pop is false
+JUMP_IF_TRUE = 31       # t: continue at t if pop is true
+SWITCH = 32             # k: continue at consts[k][pop], or at consts[k][None]
+CALL = 33               # f: call function f with its arguments on the stack
+RETURN = 34             # return pop to the caller
+RETURN_NONE = 35        # return None (falling off the end of a function)
+PRINT = 36              # print(pop)
+FAIL = 37               # k: raise a runtime error with the message consts[k]
+
+# ---------------- Compare and branch (r = pop, l = pop) ----------------
+JUMP_UNLESS_LT = 38     # t: continue at t unless l < r
+JUMP_UNLESS_LE = 39
+JUMP_UNLESS_GT = 40
+JUMP_UNLESS_GE = 41
+JUMP_UNLESS_EQ = 42
+JUMP_UNLESS_NE = 43
+JUMP_IF_LT = 44         # t: continue at t if l < r
+JUMP_IF_LE = 45
+JUMP_IF_GT = 46
+JUMP_IF_GE = 47
+JUMP_IF_EQ = 48
+JUMP_IF_NE = 49
+
+# ---------------- Fused loads (made by FunctionCompiler.emit) ----------------
+LOAD_LOCAL2 = 50        # a b: push frame[a], push frame[b]
+LOAD_LOCAL_CONST = 51   # s k: push frame[s], push consts[k]
+INDEX_LOCAL = 52        # s: a = pop, push a[frame[s]]
+INDEX_LOCALS = 53       # a i: push frame[a][frame[i]]
+
+# ---------------- Typed operations (chosen from typechecker.py's types) ----------------
+IDIV = 54               # push l // r, both ints
+FDIV = 55               # push l / r, either a float
+TO_INT = 56             # push int(pop)
+TO_FLOAT = 57           # push float(pop)
+
+# ---------------- Memoised calls (see memo.py) ----------------
+CALL_MEMO = 58          # f: CALL, unless f's memo table has the arguments; then push its result
+RETURN_MEMO = 59        # RETURN, storing the result in the function's memo table
+
+OPNAMES = {number: name for name, number in globals().items()
+           if name.isupper() and isinstance(number, int)}
+
+ARG_COUNT = dict.fromkeys(OPNAMES, 0)
+ARG_COUNT.update(dict.fromkeys((
+    LOAD_CONST, LOAD_LOCAL, STORE_LOCAL, INC_LOCAL, DEC_LOCAL, NEW_ARRAY,
+    ADD_CONST, SUB_CONST, LOAD_LOCAL_INDEX, INDEX_LOCAL,
+    JUMP, JUMP_IF_FALSE, JUMP_IF_TRUE, SWITCH, CALL, CALL_MEMO, FAIL,
+    JUMP_UNLESS_LT, JUMP_UNLESS_LE, JUMP_UNLESS_GT, JUMP_UNLESS_GE, JUMP_UNLESS_EQ, JUMP_UNLESS_NE,
+    JUMP_IF_LT, JUMP_IF_LE, JUMP_IF_GT, JUMP_IF_GE, JUMP_IF_EQ, JUMP_IF_NE,
+), 1))
+ARG_COUNT.update(dict.fromkeys((LOAD_LOCAL2, LOAD_LOCAL_CONST, INDEX_LOCALS), 2))
+JUMP_UNLESS = {
+    'LT': JUMP_UNLESS_LT, 'LE': JUMP_UNLESS_LE, 'GT': JUMP_UNLESS_GT,
+    'GE': JUMP_UNLESS_GE, 'EQ': JUMP_UNLESS_EQ, 'NE': JUMP_UNLESS_NE,
+}
+JUMP_IF = {
+    'LT': JUMP_IF_LT, 'LE': JUMP_IF_LE, 'GT': JUMP_IF_GT,
+    'GE': JUMP_IF_GE, 'EQ': JUMP_IF_EQ, 'NE': JUMP_IF_NE,
+}
+JUMPS = frozenset((JUMP, JUMP_IF_FALSE, JUMP_IF_TRUE, *JUMP_UNLESS.values(), *JUMP_IF.values()))
+
+BINARY_OPCODES = {
+    'PLUS': ADD, 'MINUS': SUB, 'MULT': MUL, 'DIV': DIV, 'MOD': MOD,
+    'EQ': EQ, 'NE': NE, 'LT': LT, 'LE': LE, 'GT': GT, 'GE': GE,
+    'AND': AND, 'OR': OR,
+}
+UNARY_OPCODES = {'MINUS': NEG, 'PLUS': POS, 'NOT': NOT}
+# opcodes for the operator functions typechecker.py attaches to a BinaryOp
+TYPED_OPCODES = {operator.floordiv: IDIV, operator.truediv: FDIV}